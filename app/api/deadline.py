@@ -0,0 +1,90 @@
+"""
+Request-scoped cancellation for endpoints that wait on the LLM.
+
+``cancel_on_disconnect`` runs an endpoint's work in a task that is cancelled
+as soon as the client goes away. The cancellation unwinds through the
+upstream call, which closes its connection and stops generation, and the
+request's session is rolled back and returned to the pool.
+
+``Deadline`` bounds the whole request by the route's budget in
+``REQUEST_DEADLINES``. Each stage gets a share of whatever time is left when
+it starts, so a slow early stage shortens the later ones instead of pushing
+the request past its budget.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from fastapi import HTTPException, Request
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+# Non-standard status (nginx) for requests abandoned by the client
+CLIENT_CLOSED_REQUEST = 499
+
+
+class Deadline:
+    """Time budget for one request, spent stage by stage."""
+
+    def __init__(self, route: str, budget: float | None = None):
+        self.route = route
+        if budget is None:
+            budget = settings.REQUEST_DEADLINES.get(route)
+        self.expires = None if budget is None else time.monotonic() + budget
+
+    def remaining(self) -> float | None:
+        if self.expires is None:
+            return None
+        return max(self.expires - time.monotonic(), 0.0)
+
+    @asynccontextmanager
+    async def stage(self, name: str, share: float = 1.0) -> AsyncIterator[None]:
+        """Give the enclosed work ``share`` of the remaining time, else 504."""
+        remaining = self.remaining()
+        timeout = None if remaining is None else remaining * share
+        try:
+            async with asyncio.timeout(timeout):
+                yield
+        except TimeoutError:
+            metrics.increment(
+                "requests.deadline_exceeded", route=self.route, stage=name
+            )
+            raise HTTPException(
+                status_code=504, detail=f"Request deadline exceeded ({name})"
+            )
+
+
+async def cancel_on_disconnect(
+    request: Request, route: str, handler: Callable[[], Awaitable[T]]
+) -> T:
+    """Run ``handler``, cancelling it if the client disconnects first."""
+    work = asyncio.ensure_future(handler())
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnected.cancel()
+        if not work.done():
+            work.cancel()
+            # Let it unwind (roll back, release its idempotency key) first
+            await asyncio.wait({work})
+
+    if work.cancelled():
+        metrics.increment("requests.disconnected", route=route)
+        raise HTTPException(
+            status_code=CLIENT_CLOSED_REQUEST, detail="Client closed request"
+        )
+    return work.result()
+
+
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body has already been read, so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
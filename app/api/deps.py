@@ -7,7 +7,7 @@ from jose import JWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
-from app.db.base import get_db
+from app.db.base import AsyncSessionLocal, get_db
 from app.models.user import User
 from app.services.user_service import UserService
 
@@ -49,5 +49,5 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     Get an async database session.
     """
-    async with AsyncSession() as session:
+    async with AsyncSessionLocal() as session:
         yield session
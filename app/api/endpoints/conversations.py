@@ -1,19 +1,51 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.api.fields import fields_param, project
+from app.api.idempotency import get_idempotency_key, run_idempotent
+from app.api.streaming import (
+    NDJSON_MEDIA_TYPE,
+    message_payload,
+    ndjson_messages,
+    ndjson_response,
+    sse_response,
+    stream_ai_reply,
+)
+from app.core.config import settings
 from app.core.database import get_async_session
+from app.core.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 from app.db.base import get_db
+from app.models.job import JobType
+from app.models.message import Message
 from app.schemas.conversation import (
+    CONVERSATION_FIELDS,
+    CONVERSATION_LIST_FIELDS,
     ConversationCreate,
-    ConversationListResponse,
+    ConversationFieldsResponse,
     ConversationResponse,
+    ConversationSort,
     ConversationUpdate,
 )
-from app.schemas.message import MessageCreate, MessageResponse
-from app.services.ai_service import AIService
+from app.schemas.message import (
+    MESSAGE_DEFAULT_FIELDS,
+    MESSAGE_FIELDS,
+    MessageCreate,
+    MessageFieldsResponse,
+    MessageImportResult,
+    MessageResponse,
+)
+from app.services.ai_service import AIService, get_ai_service
+from app.services.context_builder import ContextBuilder
 from app.services.conversation_service import ConversationService
+from app.services.job_service import JobService
+from app.services.message_import import (
+    MessageImportError,
+    MessageImportService,
+    iter_lines,
+)
 from app.services.message_service import MessageService
 
 router = APIRouter()
@@ -38,20 +70,51 @@ async def create_conversation(
     }
 
 
-@router.get("/", response_model=List[ConversationListResponse])
+@router.get(
+    "/",
+    response_model=List[ConversationFieldsResponse],
+    response_model_exclude_unset=True,
+)
 async def get_conversations(
-    skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+    fields: List[str] = Depends(
+        fields_param(CONVERSATION_LIST_FIELDS, CONVERSATION_LIST_FIELDS)
+    ),
+    sort: ConversationSort = Query(
+        "created_at",
+        description="last_activity_at orders by the latest message (inbox view)",
+    ),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Get all conversations."""
+    """Get a page of conversations, newest first."""
     conversation_service = ConversationService(db)
-    return await conversation_service.get_conversations(skip, limit)
+    try:
+        page = await conversation_service.get_conversations(limit, cursor, fields, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return [project(row, fields) for row in page.items]
 
 
-@router.get("/{conversation_id}", response_model=ConversationResponse)
-async def get_conversation(conversation_id: int, db: AsyncSession = Depends(get_db)):
+@router.get(
+    "/{conversation_id}",
+    response_model=ConversationFieldsResponse,
+    response_model_exclude_unset=True,
+)
+async def get_conversation(
+    conversation_id: int,
+    fields: List[str] = Depends(fields_param(CONVERSATION_FIELDS, CONVERSATION_FIELDS)),
+    db: AsyncSession = Depends(get_db),
+):
     """Get a specific conversation by ID."""
     conversation_service = ConversationService(db)
-    conversation = await conversation_service.get_conversation(conversation_id)
+    conversation = await conversation_service.get_conversation_fields(
+        conversation_id, fields
+    )
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -96,91 +159,162 @@ async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(g
 async def add_message(
     conversation_id: int,
     message: MessageCreate,
-    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_async_session),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
+):
+    """Add a message and queue generation of the AI response"""
+    # Ensure the message is associated with the correct conversation
+    if message.conversation_id != conversation_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Message conversation_id does not match URL conversation_id",
+        )
+
+    conv_service = ConversationService(session)
+
+    if not await conv_service.conversation_exists(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+
+    async def add() -> Message:
+        # Save user message
+        user_message = await conv_service.add_message(message)
+
+        # A worker (python -m app.worker) generates and stores the AI response;
+        # a burst of messages is answered with one reply over all of them
+        await JobService(session).enqueue(
+            JobType.AI_RESPONSE,
+            conversation_id=conversation_id,
+            debounce=settings.JOB_REPLY_DEBOUNCE,
+            max_delay=settings.JOB_REPLY_MAX_DELAY,
+        )
+
+        return user_message
+
+    # A retried request returns the original message without queueing another reply
+    return await run_idempotent(
+        idempotency_key,
+        "conversations.add_message",
+        (conversation_id, message),
+        add,
+        MessageResponse,
+        session,
+    )
+
+
+@router.post("/{conversation_id}/messages/stream")
+async def stream_message(
+    conversation_id: int,
+    message: MessageCreate,
+    session: AsyncSession = Depends(get_async_session),
+    ai_service: AIService = Depends(get_ai_service),
 ):
-    """Add a message and generate AI response"""
+    """Add a message and stream the AI response as Server-Sent Events"""
+    # Ensure the message is associated with the correct conversation
+    if message.conversation_id != conversation_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Message conversation_id does not match URL conversation_id",
+        )
+
     conv_service = ConversationService(session)
-    ai_service = AIService()
+
+    if not await conv_service.conversation_exists(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Save user message
     user_message = await conv_service.add_message(message)
 
     # Get conversation history
-    conversation = await conv_service.get_conversation(conversation_id)
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    message_history = await MessageService(session).get_message_history(conversation_id)
+    # Commit the turn (and release its conversation row lock) before building
+    # the context, which may call the LLM to fold older turns into the summary
+    await session.commit()
+    context = await ContextBuilder(ai_service).build(conversation_id, message_history)
 
-    # Convert messages to dictionaries for the AI service
-    message_history = [
-        {"message_type": msg.message_type.value, "content": msg.content}
-        for msg in conversation.messages
-    ]
-
-    # Generate AI response in background
-    background_tasks.add_task(
-        generate_and_save_ai_response,
-        conv_service,
-        ai_service,
-        conversation_id,
-        message_history,  # Use the converted message_history
+    return sse_response(
+        stream_ai_reply(
+            ai_service,
+            conversation_id,
+            context,
+            message_payload(user_message),
+            "conversations.stream",
+        )
     )
 
-    return user_message
-
 
-async def generate_and_save_ai_response(
-    conv_service: ConversationService,
-    ai_service: AIService,
+@router.get(
+    "/{conversation_id}/messages",
+    response_model=List[MessageFieldsResponse],
+    response_model_exclude_unset=True,
+)
+async def get_conversation_messages(
     conversation_id: int,
-    message_history: List[dict],
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+    fields: List[str] = Depends(fields_param(MESSAGE_FIELDS, MESSAGE_DEFAULT_FIELDS)),
+    db: AsyncSession = Depends(get_db),
 ):
-    """Generate AI response and save it to the database"""
-    # Generate AI response
-    ai_response = await ai_service.generate_response(message_history)
+    """Get a page of messages for a conversation, oldest first."""
+    message_service = MessageService(db)
+    try:
+        page = await message_service.get_conversation_messages(
+            conversation_id, limit, cursor, fields
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
 
-    # Create AI message
-    ai_message = MessageCreate(
-        content=ai_response, message_type="ai", conversation_id=conversation_id
-    )
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
 
-    # Save AI message
-    await conv_service.add_message(ai_message)
+    return [project(row, fields) for row in page.items]
 
 
-@router.get("/{conversation_id}/messages", response_model=List[MessageResponse])
-async def get_conversation_messages(
+@router.post(
+    "/{conversation_id}/messages:bulk",
+    response_model=MessageImportResult,
+    openapi_extra={
+        "requestBody": {"content": {NDJSON_MEDIA_TYPE: {}}, "required": True}
+    },
+)
+async def bulk_import_messages(
     conversation_id: int,
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    defer_embeddings: bool = Query(
+        True, description="Leave embedding to the worker's background sweep"
+    ),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get all messages for a conversation."""
-    message_service = MessageService(db)
-    messages = await message_service.get_conversation_messages(
-        conversation_id, skip, limit
-    )
+    """Import JSONL messages (one MessageImport per line) in one transaction.
 
-    # Convert to dict to avoid lazy loading issues
-    result = []
-    for msg in messages:
-        # Handle message_type carefully - it could be an enum or string
-        if hasattr(msg.message_type, "value"):
-            message_type = msg.message_type.value
-        else:
-            message_type = str(msg.message_type)
-
-        result.append(
-            {
-                "id": msg.id,
-                "content": msg.content,
-                "message_type": message_type,
-                "conversation_id": msg.conversation_id,
-                "created_at": msg.created_at,
-                "updated_at": msg.updated_at,
-                "message_metadata": msg.message_metadata,
-                "embedding": None if msg.embedding is None else list(msg.embedding),
-            }
+    The body is streamed, validated in batches and written with COPY; no AI
+    replies are generated. Any invalid record rejects the whole import.
+    """
+    try:
+        imported = await MessageImportService(db).import_lines(
+            conversation_id, iter_lines(request.stream()), defer_embeddings
+        )
+    except MessageImportError as e:
+        raise HTTPException(
+            status_code=422, detail={"line": e.line, "errors": e.errors}
         )
+    if imported is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return {"imported": imported}
+
 
-    return result
+@router.get(
+    "/{conversation_id}/messages/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def export_conversation_messages(
+    conversation_id: int, db: AsyncSession = Depends(get_db)
+):
+    """Stream every message of a conversation as NDJSON, oldest first."""
+    conversation_service = ConversationService(db)
+    if not await conversation_service.conversation_exists(conversation_id):
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    return ndjson_response(ndjson_messages(conversation_id))
@@ -1,23 +1,166 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+import logging
+import time
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import get_db
-from app.schemas.message import MessageCreate, MessageResponse, MessageUpdate
-from app.services.ai_service import AIService
+from app.api.deadline import Deadline, cancel_on_disconnect
+from app.api.fields import fields_param, project
+from app.api.idempotency import get_idempotency_key, run_idempotent
+from app.api.streaming import message_payload, sse_response, stream_ai_reply
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal, get_db
+from app.models.message import Message
+from app.schemas.message import (
+    MESSAGE_DEFAULT_FIELDS,
+    MESSAGE_FIELDS,
+    MessageCreate,
+    MessageFieldsResponse,
+    MessageResponse,
+    MessageSearchResult,
+    MessageUpdate,
+)
+from app.services.ai_service import AIService, get_ai_service
+from app.services.context_builder import ContextBuilder
 from app.services.message_service import MessageService
+from app.services.response_cache import ResponseCacheService
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/{conversation_id}/messages", response_model=MessageResponse)
 async def create_message(
+    request: Request,
     conversation_id: int = Path(..., description="The ID of the conversation"),
     message: MessageCreate = None,
     db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
 ):
     """Create a new message in a conversation and get AI response."""
     message_service = MessageService(db)
-    ai_service = AIService()
+
+    # Ensure the message is associated with the correct conversation
+    if message.conversation_id != conversation_id:
+        raise HTTPException(
+            status_code=400,
+            detail="Message conversation_id does not match URL conversation_id",
+        )
+
+    async def create() -> Message:
+        # Each stage gets a share of the time left in the route's budget
+        deadline = Deadline("messages.create")
+        async with deadline.stage("db", share=0.2):
+            # Create the user message
+            user_message = await message_service.create_message(message)
+            user_message_id = user_message.id
+
+            # Get conversation history for context
+            history = await message_service.get_message_history(conversation_id)
+
+            # Inserting a message locks its conversation row (the inbox
+            # counters), so the turn is committed before any LLM call rather
+            # than held open, and blocking other writers, until the reply lands
+            await db.commit()
+
+        try:
+            # Keep the prompt within the token budget (folding older turns into
+            # the summary calls the LLM, outside any transaction)
+            async with deadline.stage("summary", share=0.2):
+                context = await ContextBuilder(ai_service).build(
+                    conversation_id, history
+                )
+
+            # Reuse a cached answer to a near-identical prompt for this tier
+            tier = ai_service.choose_tier(context.messages)
+            response_cache = ResponseCacheService(db, ai_service)
+            async with deadline.stage("embedding", share=0.1):
+                cached = await response_cache.lookup(context, tier, "messages.create")
+                # Hold no transaction (or pooled connection) during the LLM call
+                await db.commit()
+
+            if cached is not None:
+                ai_response_text = cached.response
+                metadata = cached.reply_metadata()
+            else:
+                usage = {}
+                # Generate AI response
+                async with deadline.stage("llm", share=0.8):
+                    started = time.perf_counter()
+                    ai_response_text = await ai_service.generate_response(
+                        context.messages,
+                        system=context.system_prompt,
+                        tier=tier,
+                        usage=usage,
+                    )
+                generation_seconds = time.perf_counter() - started
+                metadata = tier.reply_metadata(usage)
+
+            # Create AI message in database
+            ai_message_data = MessageCreate(
+                content=ai_response_text,
+                message_type="ai",
+                conversation_id=conversation_id,
+                message_metadata=metadata,
+            )
+            # Both messages are embedded in the background by the embedding
+            # pipeline
+            async with deadline.stage("db"):
+                ai_message = await message_service.create_message(ai_message_data)
+                await db.commit()
+        except BaseException:
+            # No reply, no turn: a retry (or a replayed Idempotency-Key) must
+            # not find the user message stored twice
+            await _discard_message(user_message_id)
+            raise
+
+        if cached is None:
+            # Best effort, so outside the deadline: a slow cache write must not
+            # turn a reply that was already generated (and paid for) into a 504
+            await response_cache.store(
+                context, tier, ai_response_text, generation_seconds
+            )
+        return ai_message
+
+    # A retried request returns the original AI message instead of a new one.
+    # If the client goes away first, the upstream call is cancelled and the
+    # session released rather than finishing a reply nobody will read.
+    return await cancel_on_disconnect(
+        request,
+        "messages.create",
+        lambda: run_idempotent(
+            idempotency_key,
+            "messages.create",
+            (conversation_id, message),
+            create,
+            MessageResponse,
+            db,
+        ),
+    )
+
+
+async def _discard_message(message_id: int) -> None:
+    """Delete a message committed by a request that then failed."""
+    try:
+        async with AsyncSessionLocal() as session:
+            await MessageService(session).delete_message(message_id)
+            await session.commit()
+    except Exception as e:
+        logger.error(f"Failed to discard message {message_id}: {str(e)}")
+
+
+@router.post("/{conversation_id}/messages/stream")
+async def stream_message(
+    conversation_id: int = Path(..., description="The ID of the conversation"),
+    message: MessageCreate = None,
+    db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+):
+    """Create a new message and stream the AI response as Server-Sent Events."""
+    message_service = MessageService(db)
 
     # Ensure the message is associated with the correct conversation
     if message.conversation_id != conversation_id:
@@ -30,40 +173,67 @@ async def create_message(
     user_message = await message_service.create_message(message)
 
     # Get conversation history for context
-    messages = await message_service.get_conversation_messages(conversation_id)
+    message_history = await message_service.get_message_history(conversation_id)
+    # Commit the turn (and release its conversation row lock) before building
+    # the context, which may call the LLM to fold older turns into the summary
+    await db.commit()
+    context = await ContextBuilder(ai_service).build(conversation_id, message_history)
 
-    # Format messages for AI service
-    message_history = [
-        {"message_type": msg.message_type.value, "content": msg.content}
-        for msg in messages
-    ]
+    return sse_response(
+        stream_ai_reply(
+            ai_service,
+            conversation_id,
+            context,
+            message_payload(user_message),
+            "messages.stream",
+        )
+    )
 
-    # Generate AI response
-    ai_response_text = await ai_service.generate_response(message_history)
 
-    # Create AI message in database
-    ai_message_data = MessageCreate(
-        content=ai_response_text, message_type="ai", conversation_id=conversation_id
-    )
-    ai_message = await message_service.create_message(ai_message_data)
+@router.get("/search", response_model=List[MessageSearchResult])
+async def search_messages(
+    q: str = Query(..., min_length=1, description="Text to search for"),
+    k: int = Query(
+        settings.VECTOR_SEARCH_DEFAULT_K, ge=1, le=settings.VECTOR_SEARCH_MAX_K
+    ),
+    conversation_id: Optional[int] = Query(
+        None, description="Only search within this conversation"
+    ),
+    db: AsyncSession = Depends(get_db),
+    ai_service: AIService = Depends(get_ai_service),
+):
+    """Find the messages most similar to a query."""
+    if not settings.ENABLE_VECTOR_SEARCH:
+        raise HTTPException(status_code=404, detail="Vector search is disabled")
 
-    # Generate embedding for the message (async background task)
-    # This could be moved to a background task with FastAPI
-    embedding = await ai_service.generate_embedding(user_message.content)
-    if embedding:
-        await message_service.update_message_embedding(user_message.id, embedding)
+    embedding = await ai_service.generate_embedding(q)
+    if embedding is None:
+        raise HTTPException(status_code=502, detail="Could not embed query")
+    if not any(embedding):
+        # Cosine distance to a zero vector is undefined
+        raise HTTPException(status_code=400, detail="Query has no searchable content")
 
-    return ai_message
+    message_service = MessageService(db)
+    matches = await message_service.search_similar(embedding, k, conversation_id)
+    return [project(row, [*MESSAGE_DEFAULT_FIELDS, "distance"]) for row in matches]
 
 
-@router.get("/{message_id}", response_model=MessageResponse)
-async def get_message(message_id: int, db: AsyncSession = Depends(get_db)):
+@router.get(
+    "/{message_id}",
+    response_model=MessageFieldsResponse,
+    response_model_exclude_unset=True,
+)
+async def get_message(
+    message_id: int,
+    fields: List[str] = Depends(fields_param(MESSAGE_FIELDS, MESSAGE_DEFAULT_FIELDS)),
+    db: AsyncSession = Depends(get_db),
+):
     """Get a specific message by ID."""
     message_service = MessageService(db)
-    message = await message_service.get_message(message_id)
+    message = await message_service.get_message_fields(message_id, fields)
     if not message:
         raise HTTPException(status_code=404, detail="Message not found")
-    return message
+    return project(message, fields)
 
 
 @router.put("/{message_id}", response_model=MessageResponse)
@@ -17,7 +17,7 @@ async def create_user(
     """Create a new user"""
     user = User.create(username=username, email=email, password=password)
     session.add(user)
-    await session.commit()
+    await session.flush()
     return {"username": user.username, "email": user.email}
 
 
@@ -0,0 +1,50 @@
+"""
+Sparse fieldsets (``?fields=id,content``) for list and detail endpoints.
+
+Endpoints pass the parsed field names down to the services, which select only
+those columns, so unrequested heavy columns are never fetched or serialized.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Query
+
+
+def parse_fields(
+    fields: Optional[str], allowed: Sequence[str], default: Sequence[str]
+) -> List[str]:
+    """Parse a comma-separated field list, rejecting unknown names."""
+    if not fields:
+        return list(default)
+
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. "
+            f"Allowed: {', '.join(allowed)}",
+        )
+    return list(dict.fromkeys(requested))
+
+
+def fields_param(
+    allowed: Sequence[str], default: Sequence[str]
+) -> Callable[..., List[str]]:
+    """Build a dependency that reads and validates the ``fields`` query param."""
+
+    def dependency(
+        fields: Optional[str] = Query(
+            None,
+            description="Comma-separated fields to return. "
+            f"Allowed: {', '.join(allowed)}. Default: {', '.join(default)}",
+        )
+    ) -> List[str]:
+        return parse_fields(fields, allowed, default)
+
+    return dependency
+
+
+def project(row: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    """Pick the selected fields from a result row."""
+    return {name: getattr(row, name) for name in fields}
@@ -0,0 +1,109 @@
+"""
+``Idempotency-Key`` support for endpoints that create messages.
+
+The first request with a key claims it, runs, and stores its response in
+``idempotency_keys``. A retry with the same key gets the stored response
+(with ``Idempotent-Replayed: true``) without running the endpoint again, and
+waits if the original is still running. Reusing a key for a different
+request is rejected with 422. The request's session is committed before its
+response is stored, so a replayed response never refers to rows that were
+rolled back or are not yet visible.
+"""
+
+import asyncio
+import json
+import time
+from hashlib import sha256
+from typing import Any, Awaitable, Callable, Optional, Type
+
+from fastapi import Header, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.models.idempotency_key import IdempotencyStatus
+from app.services.idempotency_service import IdempotencyService
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def get_idempotency_key(
+    key: Optional[str] = Header(
+        None,
+        alias=IDEMPOTENCY_KEY_HEADER,
+        max_length=255,
+        description="Unique key for this request; retries with the same key "
+        "return the original response instead of creating another message",
+    )
+) -> Optional[str]:
+    return key
+
+
+def request_hash(route: str, payload: Any) -> str:
+    body = json.dumps([route, jsonable_encoder(payload)], sort_keys=True)
+    return sha256(body.encode()).hexdigest()
+
+
+async def run_idempotent(
+    key: Optional[str],
+    route: str,
+    payload: Any,
+    handler: Callable[[], Awaitable[Any]],
+    response_model: Type[BaseModel],
+    db: AsyncSession,
+) -> Any:
+    """Run ``handler`` once per idempotency key, replaying its stored response.
+
+    ``db`` is the request's session, which ``handler`` writes through.
+    """
+    if key is None:
+        return await handler()
+
+    fingerprint = request_hash(route, payload)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        async with AsyncSessionLocal() as session:
+            service = IdempotencyService(session)
+            if await service.claim(key, fingerprint):
+                break
+            stored = await service.get(key)
+
+        if stored is not None:
+            if stored.request_hash != fingerprint:
+                raise HTTPException(
+                    status_code=422,
+                    detail="Idempotency-Key was already used for a different request",
+                )
+            if stored.status == IdempotencyStatus.DONE:
+                metrics.increment("idempotency.replayed", route=route)
+                return JSONResponse(
+                    stored.response_body,
+                    status_code=stored.response_status,
+                    headers={REPLAYED_HEADER: "true"},
+                )
+        if time.monotonic() > deadline:
+            metrics.increment("idempotency.conflicts", route=route)
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still in progress",
+            )
+        await asyncio.sleep(settings.IDEMPOTENCY_POLL_INTERVAL)
+
+    try:
+        result = await handler()
+        await db.commit()
+    except BaseException:
+        # Let a retry run the request again
+        async with AsyncSessionLocal() as session:
+            await IdempotencyService(session).release(key)
+        raise
+
+    body = jsonable_encoder(response_model.model_validate(result))
+    async with AsyncSessionLocal() as session:
+        await IdempotencyService(session).complete(key, 200, body)
+    return result
@@ -0,0 +1,135 @@
+"""
+Streaming responses: AI replies as Server-Sent Events and message exports as
+newline-delimited JSON.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List
+
+from fastapi.responses import StreamingResponse
+
+from app.db.base import AsyncSessionLocal
+from app.models.message import Message
+from app.schemas.message import MessageCreate, MessageResponse
+from app.services.ai_service import AIService
+from app.services.context_builder import ContextWindow
+from app.services.message_service import MessageService
+from app.services.response_cache import ResponseCacheService
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # Disable proxy buffering (nginx)
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def message_payload(message: Message) -> Dict[str, Any]:
+    """JSON-serializable representation of a stored message."""
+    return MessageResponse.model_validate(message).model_dump(mode="json")
+
+
+async def stream_ai_reply(
+    ai_service: AIService,
+    conversation_id: int,
+    context: ContextWindow,
+    user_message: Dict[str, Any],
+    route: str,
+) -> AsyncIterator[str]:
+    """Stream the AI reply as SSE frames and store it once it is complete.
+
+    Events: ``user_message`` (the stored user turn, already serialized with
+    ``message_payload`` because the request's session closes before the body
+    streams), ``token`` (one per text delta), then ``done`` with the stored AI
+    message or ``error``. A reply from the semantic response cache arrives as
+    a single ``token`` event.
+
+    When the client disconnects, Starlette cancels the response task; the
+    cancellation unwinds through ``AIService.stream_response`` and closes the
+    upstream stream, and the partial reply is discarded.
+    """
+    yield sse_event("user_message", user_message)
+
+    tier = ai_service.choose_tier(context.messages)
+    async with AsyncSessionLocal() as session:
+        cached = await ResponseCacheService(session, ai_service).lookup(
+            context, tier, route
+        )
+
+    usage: Dict[str, int] = {}
+    chunks: List[str] = []
+    started = time.perf_counter()
+    try:
+        if cached is not None:
+            chunks.append(cached.response)
+            yield sse_event("token", {"text": cached.response})
+        else:
+            async for text in ai_service.stream_response(
+                context.messages, system=context.system_prompt, tier=tier, usage=usage
+            ):
+                chunks.append(text)
+                yield sse_event("token", {"text": text})
+    except asyncio.CancelledError:
+        logger.info(
+            f"Client disconnected, cancelled AI reply for conversation "
+            f"{conversation_id} after {len(chunks)} chunks"
+        )
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming AI response: {str(e)}")
+        yield sse_event("error", {"detail": "Error generating AI response"})
+        return
+
+    reply = "".join(chunks)
+    async with AsyncSessionLocal() as session:
+        if cached is None:
+            # Before the reply's INSERT, whose conversation row lock is then
+            # only held until the commit, not across the prompt's embedding
+            await ResponseCacheService(session, ai_service).store(
+                context, tier, reply, time.perf_counter() - started
+            )
+        ai_message = await MessageService(session).create_message(
+            MessageCreate(
+                content=reply,
+                message_type="ai",
+                conversation_id=conversation_id,
+                message_metadata=(
+                    tier.reply_metadata(usage)
+                    if cached is None
+                    else cached.reply_metadata()
+                ),
+            )
+        )
+        await session.commit()
+        yield sse_event("done", message_payload(ai_message))
+
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events, media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+async def ndjson_messages(conversation_id: int) -> AsyncIterator[str]:
+    """Serialize a conversation's messages as NDJSON, one chunk per batch.
+
+    Uses its own session, because the request's closes before the body streams.
+    """
+    async with AsyncSessionLocal() as session:
+        batches = MessageService(session).stream_conversation_messages(conversation_id)
+        async for messages in batches:
+            yield "".join(json.dumps(message_payload(m)) + "\n" for m in messages)
+
+
+def ndjson_response(lines: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(lines, media_type=NDJSON_MEDIA_TYPE)
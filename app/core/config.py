@@ -1,8 +1,12 @@
 # /Users/tef/Projects/cta/back/app/core/config.py
-from typing import List, Literal
+from typing import Dict, List, Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+ModelName = Literal[
+    "claude-3-sonnet-20240229", "claude-3-opus-20240229", "gpt-4-turbo", "gpt-4o"
+]
+
 
 class Settings(BaseSettings):
     """
@@ -26,9 +30,114 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str | None = None
 
     # Preferred AI Model Selection
-    MODEL_NAME: Literal[
-        "claude-3-sonnet-20240229", "claude-3-opus-20240229", "gpt-4-turbo", "gpt-4o"
-    ] = "claude-3-sonnet-20240229"
+    MODEL_NAME: ModelName = "claude-3-sonnet-20240229"
+    AI_FALLBACK_MODEL: ModelName | None = None  # Hedge and fail over to this model
+
+    # Provider Routing Configuration (hedging and failover to AI_FALLBACK_MODEL)
+    AI_HEDGE_ENABLED: bool = True
+    AI_HEDGE_QUANTILE: float = 0.95  # Hedge once the primary is slower than this
+    AI_HEDGE_MIN_SAMPLES: int = 20  # Latencies needed before the quantile is used
+    AI_HEDGE_DEFAULT_DELAY: float = 10.0  # Hedge delay until then
+    AI_HEDGE_MIN_DELAY: float = 0.5
+    AI_CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive failures that open it
+    AI_CIRCUIT_RESET_TIMEOUT: float = 30.0  # Seconds a provider is skipped
+
+    # Model Routing Configuration (each turn goes to the model of its tier)
+    AI_MODEL_ROUTING: bool = True  # Off: every turn goes to MODEL_NAME
+    AI_MODEL_TIERS: Dict[str, ModelName] = {
+        "simple": "claude-3-sonnet-20240229",
+        "complex": "claude-3-opus-20240229",
+    }
+    AI_ROUTING_SIMPLE_MAX_CHARS: int = 280  # Longer turns are complex
+    AI_ROUTING_SIMPLE_MAX_HISTORY: int = 12  # Turns in the prompt, incl. latest
+    AI_ROUTING_KEYWORDS: Dict[str, str] = {  # Checked first: keyword -> tier
+        "itinerary": "complex",
+        "compare": "complex",
+        "budget": "complex",
+        "visa": "complex",
+        "day-by-day": "complex",
+    }
+
+    # AI Client Configuration (shared connection pool for all LLM calls)
+    ANTHROPIC_BASE_URL: str | None = None  # Override to point at a stub/proxy
+    AI_MAX_CONNECTIONS: int = 100
+    AI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AI_KEEPALIVE_EXPIRY: float = 30.0  # Seconds an idle connection is kept open
+    AI_CONNECT_TIMEOUT: float = 5.0
+    AI_READ_TIMEOUT: float = 120.0
+    AI_MAX_RETRIES: int = 2
+    AI_SINGLE_FLIGHT: bool = True  # Identical concurrent requests share one call
+    AI_SINGLE_FLIGHT_SHARED: bool = False  # Also across workers (llm_requests table)
+    AI_SINGLE_FLIGHT_SHARED_TTL: float = 120.0  # Claims honoured this long
+    AI_SINGLE_FLIGHT_RESULT_GRACE: float = 10.0  # Results kept this long for waiters
+    AI_SINGLE_FLIGHT_POLL_INTERVAL: float = 0.2  # Waiting workers poll this often
+    AI_PROMPT_CACHING: bool = True  # Mark conversation prefixes as cacheable
+    AI_PROMPT_CACHE_MIN_TOKENS: int = 1024  # Shorter prompts are not cached
+
+    # LLM Scheduler Configuration (per-process admission control for LLM calls)
+    AI_MAX_CONCURRENCY: int = 32  # Upper bound; lowered adaptively on 429/529
+    AI_MIN_CONCURRENCY: int = 1
+    AI_BACKOFF_FACTOR: float = 0.5  # Concurrency limit is multiplied by this
+    AI_DEFAULT_RETRY_AFTER: float = 1.0  # Pause when a 429 has no retry-after
+    AI_TOKENS_PER_MINUTE: int = 0  # Estimated input + max_tokens; 0 = unlimited
+
+    # Context Window Configuration
+    CONTEXT_TOKEN_BUDGET: int = 4000  # Max tokens of verbatim recent turns
+    CONTEXT_LOW_WATER_RATIO: float = 0.6  # Fold old turns down to this share
+    CONTEXT_SUMMARY_MODEL: str = "claude-3-haiku-20240307"
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 512
+
+    # Job Queue Configuration (AI replies are generated by `python -m app.worker`)
+    JOB_WORKER_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL: float = 2.0  # Fallback poll; workers also LISTEN for jobs
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 10.0  # Seconds, multiplied by the attempt number
+    JOB_STALE_TIMEOUT: float = 300.0  # Running jobs silent this long are requeued
+    JOB_HEARTBEAT_INTERVAL: float = 30.0  # Running jobs refresh locked_at this often
+    JOB_REPLY_DEBOUNCE: float = 1.0  # Messages this close together share one reply
+    JOB_REPLY_MAX_DELAY: float = 5.0  # A burst holds back its reply at most this long
+
+    # Vector Search Configuration
+    EMBEDDING_DIMENSIONS: int = 1536
+    VECTOR_SEARCH_DEFAULT_K: int = 10
+    VECTOR_SEARCH_MAX_K: int = 100
+    VECTOR_SEARCH_EF_SEARCH: int = 100  # HNSW candidate list; higher = better recall
+    EMBEDDING_BACKEND: Literal["hashing", "openai"] = "hashing"  # hashing is offline
+    EMBEDDING_MODEL: str = "text-embedding-3-small"  # Used by the openai backend
+
+    # Embedding Pipeline Configuration (new messages are embedded in batches)
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BATCH_MAX_WAIT: float = 0.5  # Seconds to wait for a batch to fill
+    EMBEDDING_QUEUE_SIZE: int = 10000  # Overflow is left to the worker's sweep
+    EMBEDDING_SWEEP_INTERVAL: float = 60.0  # Worker re-queues unembedded messages
+
+    # Embedding Cache Configuration (in-process LRU in front of a Postgres table)
+    EMBEDDING_CACHE_SIZE: int = 4096  # Entries kept in memory per process
+    EMBEDDING_CACHE_MEMORY_TTL: float = 3600.0  # Seconds an entry stays in memory
+    EMBEDDING_CACHE_PERSIST: bool = True  # Share embeddings through the database
+    EMBEDDING_CACHE_DB_TTL: float = 30 * 24 * 3600.0  # Evicted by the worker's sweep
+
+    # Semantic Response Cache Configuration (opt-in via ENABLE_RESPONSE_CACHE)
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95  # Cosine similarity to reuse
+    RESPONSE_CACHE_MAX_CONTEXT_MESSAGES: int = 2  # Longer conversations skip it
+    RESPONSE_CACHE_TTL: float = 7 * 24 * 3600.0  # Evicted by the worker's sweep
+
+    # Idempotency Key Configuration (Idempotency-Key header on message creation)
+    IDEMPOTENCY_KEY_TTL: float = 24 * 3600.0  # Responses are replayed this long
+    IDEMPOTENCY_PENDING_TIMEOUT: float = 600.0  # Abandoned claims can be retaken
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 60.0  # Retries wait this long, then get 409
+    IDEMPOTENCY_POLL_INTERVAL: float = 0.2
+
+    # Export Configuration (GET /conversations/{id}/messages/export)
+    MESSAGE_EXPORT_BATCH_SIZE: int = 1000  # Rows fetched per server-side cursor trip
+
+    # Bulk Import Configuration (messages:bulk endpoint, scripts/import_messages.py)
+    BULK_IMPORT_BATCH_SIZE: int = 5000  # Records validated and COPYed together
+
+    # Request Deadline Configuration (endpoints that wait on the LLM inline)
+    REQUEST_DEADLINES: Dict[str, float] = {  # Seconds per route; 504 past it
+        "messages.create": 90.0,
+    }
 
     # Application Settings
     APP_NAME: str = "CTA Travel Companion"
@@ -49,6 +158,12 @@ class Settings(BaseSettings):
     # Database Pool Configuration
     DATABASE_POOL_SIZE: int = 5  # Set a default pool size
     DATABASE_MAX_OVERFLOW: int = 10  # Optional: Set max overflow for the pool
+    DATABASE_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DATABASE_POOL_RECYCLE: int = 1800  # Reconnect connections older than this
+    DATABASE_POOL_PRE_PING: bool = True  # Drop dead connections before use
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100  # Set to 0 behind PgBouncer
+    DATABASE_CONNECT_TIMEOUT: float = 10.0
+    DATABASE_COMMAND_TIMEOUT: float = 60.0  # Per-statement client-side timeout
 
     # Security Settings
     SECRET_KEY: str
@@ -66,6 +181,7 @@ class Settings(BaseSettings):
     ENABLE_IMAGE_ANALYSIS: bool = True
     ENABLE_VECTOR_SEARCH: bool = True
     ENABLE_CHAT_HISTORY: bool = True
+    ENABLE_RESPONSE_CACHE: bool = False
 
     # Model configuration for Pydantic Settings
     model_config = SettingsConfigDict(
@@ -1,17 +1,87 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool that reports checkout wait time and saturation
+
+    A checkout is counted as saturated when every pooled and overflow
+    connection is already in use, i.e. the caller has to queue for one.
+    """
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        saturated = self.checkedin() == 0 and (
+            self._max_overflow > -1 and self._overflow >= self._max_overflow
+        )
+        if saturated:
+            metrics.increment("db.pool.saturated")
+
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            metrics.increment("db.pool.timeouts")
+            raise
+        finally:
+            metrics.observe(
+                "db.pool.checkout_wait_seconds", time.perf_counter() - started
+            )
+
+        self._record_usage()
+        return record
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        self._record_usage()
+
+    def _record_usage(self) -> None:
+        metrics.set_gauge("db.pool.checked_out", self.checkedout())
+        metrics.set_gauge("db.pool.overflow", max(self.overflow(), 0))
+
+
+def create_engine_from_settings(echo: bool = settings.DEBUG) -> AsyncEngine:
+    """
+    Build the application's async engine with pool settings applied
+
+    Every process opens at most DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW
+    connections; keep that times the number of API and worker processes
+    below max_connections in config/postgresql.conf.
+    """
+    return create_async_engine(
+        settings.DATABASE_URL,
+        echo=echo,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DATABASE_POOL_SIZE,
+        max_overflow=settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=settings.DATABASE_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DATABASE_STATEMENT_CACHE_SIZE,
+            "timeout": settings.DATABASE_CONNECT_TIMEOUT,
+            "command_timeout": settings.DATABASE_COMMAND_TIMEOUT,
+            "server_settings": {"application_name": settings.PROJECT_NAME},
+        },
+    )
+
+
+# Single engine and session factory shared by the API and the worker
+engine = create_engine_from_settings()
 
-# Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-)
+AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 # Dependency for FastAPI
 async def get_async_session():
-    async with AsyncSession(engine) as session:
+    async with AsyncSessionLocal() as session:
         try:
             yield session
             await session.commit()
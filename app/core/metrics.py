@@ -0,0 +1,74 @@
+# /Users/tef/Projects/cta/back/app/core/metrics.py
+from typing import Any, Dict
+
+
+class Metrics:
+    """
+    Minimal in-process metrics registry.
+
+    Key Responsibilities:
+    - Counters (monotonic totals)
+    - Gauges (last observed value)
+    - Summaries (count/sum/min/max of observed values)
+
+    Metrics are keyed by name plus optional labels and exposed as a JSON
+    snapshot on ``GET /metrics``.
+    """
+
+    def __init__(self):
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.summaries: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Add ``value`` to a counter."""
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Record the current value of a gauge."""
+        self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record one observation in a summary."""
+        key = self._key(name, labels)
+        summary = self.summaries.get(key)
+        if summary is None:
+            self.summaries[key] = {
+                "count": 1,
+                "sum": value,
+                "min": value,
+                "max": value,
+            }
+            return
+        summary["count"] += 1
+        summary["sum"] += value
+        summary["min"] = min(summary["min"], value)
+        summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return a JSON-serializable copy of all metrics."""
+        summaries: Dict[str, Dict[str, float]] = {}
+        for key, summary in self.summaries.items():
+            summaries[key] = {**summary, "avg": summary["sum"] / summary["count"]}
+        return {
+            "counters": dict(self.counters),
+            "gauges": dict(self.gauges),
+            "summaries": summaries,
+        }
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.gauges.clear()
+        self.summaries.clear()
+
+
+# Create a singleton metrics instance
+metrics = Metrics()
@@ -0,0 +1,79 @@
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import tuple_
+
+T = TypeVar("T")
+
+# Response header carrying the cursor for the next page, absent on the last page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 500
+
+
+@dataclass
+class Page(Generic[T]):
+    """One page of keyset-paginated results."""
+
+    items: List[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    """Encode a row's (created_at, id) sort key as an opaque cursor."""
+    raw = json.dumps([created_at.isoformat(), id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_cursor; raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), int(id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(
+    query,
+    model,
+    limit: int,
+    cursor: Optional[str],
+    descending: bool,
+    sort_column=None,
+):
+    """
+    Restrict a select to the page after ``cursor``, ordered by (created_at, id)
+
+    The row-value comparison lets Postgres seek straight to the cursor on a
+    (created_at, id) index, so every page costs the same regardless of depth.
+    One extra row is fetched to tell whether another page follows.
+    ``sort_column`` replaces created_at with another timestamp expression,
+    which needs its own (expression, id) index.
+    """
+    if sort_column is None:
+        sort_column = model.created_at
+    sort_key = tuple_(sort_column, model.id)
+    if cursor:
+        position = tuple_(*decode_cursor(cursor))
+        query = query.where(sort_key < position if descending else sort_key > position)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), model.id.desc())
+    else:
+        query = query.order_by(sort_column, model.id)
+    return query.limit(limit + 1)
+
+
+def to_page(rows: List[T], limit: int, sort_key: str = "created_at") -> Page[T]:
+    """Build a Page from ``limit + 1`` rows fetched by keyset_page."""
+    if len(rows) <= limit:
+        return Page(items=rows)
+    items = rows[:limit]
+    last = items[-1]
+    return Page(
+        items=items, next_cursor=encode_cursor(getattr(last, sort_key), last.id)
+    )
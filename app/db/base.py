@@ -1,32 +1,11 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 
-from app.config import settings
-
-# Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://"),
-    echo=settings.DEBUG,
-    future=True,
-)
-
-# Create async session factory
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# Engine and sessions come from the single configured pool in app.core.database
+from app.core.database import AsyncSessionLocal, engine  # noqa: F401
+from app.core.database import get_async_session as get_db  # noqa: F401
 
 # Create declarative base class
 Base = declarative_base()
 
 
-# Dependency for FastAPI
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-            await session.commit()
-        except Exception:
-            await session.rollback()
-            raise
-
-
 # Note: Model imports moved to base_models.py to avoid circular imports
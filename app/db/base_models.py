@@ -6,6 +6,11 @@
 # even if they appear unused in this file
 # pylint: disable=unused-import
 from app.models.conversation import Conversation  # noqa: F401
+from app.models.embedding_cache import CachedEmbedding  # noqa: F401
+from app.models.idempotency_key import IdempotencyKey  # noqa: F401
+from app.models.job import Job  # noqa: F401
+from app.models.llm_request import LLMRequest  # noqa: F401
 from app.models.message import Message  # noqa: F401
+from app.models.response_cache import CachedResponse  # noqa: F401
 
 # Add other models as they're created
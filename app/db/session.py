@@ -1,18 +1,3 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
-
-from app.core.config import settings
-
-engine = create_async_engine(
-    settings.DATABASE_URL, echo=True, future=True  # Set to False in production
-)
-
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-
-
-async def get_db():
-    async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+# Kept for existing imports; all sessions share the pool in app.core.database
+from app.core.database import AsyncSessionLocal, engine  # noqa: F401
+from app.core.database import get_async_session as get_db  # noqa: F401
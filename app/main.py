@@ -1,13 +1,29 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 from app.api.api import api_router
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.ai_service import close_ai_service
+from app.services.embedding_pipeline import embedding_pipeline
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await embedding_pipeline.start()
+    yield
+    await embedding_pipeline.stop()
+    # Release pooled upstream connections on shutdown
+    await close_ai_service()
+
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description=settings.PROJECT_DESCRIPTION,
     version=settings.PROJECT_VERSION,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -16,3 +32,9 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 @app.get("/")
 async def root():
     return {"message": "CTA API is running"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process application metrics for this worker."""
+    return metrics.snapshot()
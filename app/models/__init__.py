@@ -1,6 +1,21 @@
 from .base import Base
 from .conversation import Conversation
+from .embedding_cache import CachedEmbedding
+from .idempotency_key import IdempotencyKey
+from .job import Job
+from .llm_request import LLMRequest
 from .message import Message
+from .response_cache import CachedResponse
 from .user import User
 
-__all__ = ["Base", "User", "Conversation", "Message"]
+__all__ = [
+    "Base",
+    "User",
+    "Conversation",
+    "Message",
+    "Job",
+    "CachedEmbedding",
+    "CachedResponse",
+    "LLMRequest",
+    "IdempotencyKey",
+]
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, DateTime, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, DateTime, Index, Integer, String, Text
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 
 from app.db.base import Base
@@ -18,5 +18,43 @@ class Conversation(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Rolling summary of the turns that no longer fit in the context window
+    summary = Column(Text, nullable=True)
+    # Last message folded in, as its (created_at, id) history sort key:
+    # imported messages can carry an older created_at than lower ids
+    summary_message_id = Column(Integer, nullable=True)
+    summary_message_created_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Denormalized from messages by triggers on INSERT, DELETE and content
+    # UPDATE (see migration 5b2f0e9c41d7), so they stay current for every
+    # write path, COPY included. Read-only from the application.
+    message_count = Column(Integer, nullable=False, server_default="0")
+    last_message_id = Column(Integer, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(Text, nullable=True)  # First 200 characters
+
+    # Inbox sort key: the latest message, or creation for an empty conversation
+    last_activity_at = column_property(
+        func.coalesce(last_message_at, created_at).label("last_activity_at"),
+        deferred=True,
+    )
+
     # Relationship to messages
-    messages = relationship("Message", back_populates="conversation")
+    messages = relationship(
+        "Message", back_populates="conversation", order_by="Message.id"
+    )
+
+    # Fetch server-generated id/timestamps with RETURNING instead of a refresh
+    # (see Message)
+    __mapper_args__ = {"eager_defaults": "auto"}
+
+    __table_args__ = (
+        # Keyset pagination on (created_at, id)
+        Index("ix_conversations_created_at_id", "created_at", "id"),
+        # Keyset pagination on (last_activity_at, id) for the inbox view
+        Index(
+            "ix_conversations_last_activity_at_id",
+            func.coalesce(last_message_at, created_at),
+            id,
+        ),
+    )
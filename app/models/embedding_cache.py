@@ -0,0 +1,25 @@
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, DateTime, Index, String
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.db.base import Base
+
+
+class CachedEmbedding(Base):
+    """
+    Persistent tier of the embedding cache, shared by every process
+    Keyed by a hash of the embedding model and the normalized text
+    """
+
+    __tablename__ = "embedding_cache"
+
+    key = Column(String(64), primary_key=True)  # sha256 hex digest
+    model = Column(String, nullable=False)  # Backend name and dimensions
+    embedding = Column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Expired entries are evicted by creation time
+        Index("ix_embedding_cache_created_at", "created_at"),
+    )
@@ -0,0 +1,34 @@
+from enum import Enum as PyEnum
+
+from sqlalchemy import Column, DateTime, Enum, Index, Integer, String
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class IdempotencyStatus(PyEnum):
+    PENDING = "pending"
+    DONE = "done"
+
+
+class IdempotencyKey(Base):
+    """
+    Client-supplied Idempotency-Key and the response it produced
+    Retries with the same key replay the stored response instead of
+    creating another message
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # Endpoint and request body
+    status = Column(Enum(IdempotencyStatus), nullable=False)
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Expired keys are evicted by creation time
+        Index("ix_idempotency_keys_created_at", "created_at"),
+    )
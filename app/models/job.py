@@ -0,0 +1,70 @@
+from enum import Enum as PyEnum
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class JobType(PyEnum):
+    AI_RESPONSE = "ai_response"
+
+
+class JobStatus(PyEnum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class Job(Base):
+    """
+    Durable unit of background work (e.g. generating an AI reply)
+    Claimed by workers with FOR UPDATE SKIP LOCKED, so it survives restarts
+    and can be spread across machines
+    """
+
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(Enum(JobType), nullable=False)
+    conversation_id = Column(
+        Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=True
+    )
+    payload = Column(JSON, nullable=True)
+    status = Column(Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime(timezone=True), server_default=func.now())
+    locked_by = Column(String, nullable=True)  # Worker that claimed the job
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Only queued jobs are ever scanned by the claim query
+        Index(
+            "ix_jobs_queued_run_after",
+            "run_after",
+            postgresql_where=text("status = 'QUEUED'"),
+        ),
+        # Finds a conversation's queued or running job (debounce, ordering)
+        Index(
+            "ix_jobs_open_conversation_id",
+            "conversation_id",
+            postgresql_where=text("status IN ('QUEUED', 'RUNNING')"),
+        ),
+    )
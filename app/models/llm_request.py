@@ -0,0 +1,32 @@
+from enum import Enum as PyEnum
+
+from sqlalchemy import Column, DateTime, Enum, Index, String, Text
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class LLMRequestStatus(PyEnum):
+    PENDING = "pending"
+    DONE = "done"
+
+
+class LLMRequest(Base):
+    """
+    Cross-worker single-flight record for one LLM request
+    The worker that inserts the row makes the upstream call; others with the
+    same request key wait for its response instead of sending a duplicate
+    """
+
+    __tablename__ = "llm_requests"
+
+    key = Column(String(64), primary_key=True)  # sha256 of model, params, messages
+    status = Column(Enum(LLMRequestStatus), nullable=False)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Expired claims are evicted by creation time
+        Index("ix_llm_requests_created_at", "created_at"),
+    )
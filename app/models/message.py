@@ -1,10 +1,12 @@
 from enum import Enum as PyEnum
 
-from sqlalchemy import Column, DateTime, Enum, ForeignKey, Integer, String
-from sqlalchemy.dialects.postgresql import ARRAY, FLOAT, JSON
-from sqlalchemy.orm import relationship
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, DateTime, Enum, ForeignKey, Index, Integer, String, text
+from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 
+from app.core.config import settings
 from app.db.base import Base
 
 
@@ -26,9 +28,40 @@ class Message(Base):
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     content = Column(String, nullable=False)
     message_type = Column(Enum(MessageType), nullable=False)
-    embedding = Column(ARRAY(FLOAT(precision=6)), nullable=True)  # Vector storage
+    # Heavy columns are deferred: load them explicitly with undefer() when needed
+    embedding = deferred(Column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
-    message_metadata = Column(JSON, nullable=True)
+    message_metadata = deferred(Column(JSON, nullable=True))
 
     conversation = relationship("Conversation", back_populates="messages")
+
+    # Fetch server-generated id/timestamps with RETURNING instead of a refresh
+    # query, which would also drop deferred values set on the instance. "auto"
+    # rather than True: True also re-selects updated_at (an onupdate column)
+    # after every INSERT, a second round trip for a value that is still NULL
+    __mapper_args__ = {"eager_defaults": "auto"}
+
+    __table_args__ = (
+        # Keyset pagination within a conversation on (created_at, id)
+        Index(
+            "ix_messages_conversation_id_created_at_id",
+            "conversation_id",
+            "created_at",
+            "id",
+        ),
+        # Approximate nearest-neighbour search on cosine distance
+        Index(
+            "ix_messages_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # Lets the embedding sweep find unembedded messages without a scan
+        Index(
+            "ix_messages_unembedded_id",
+            "id",
+            postgresql_where=text("embedding IS NULL"),
+        ),
+    )
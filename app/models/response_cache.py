@@ -0,0 +1,45 @@
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, DateTime, Float, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from app.core.config import settings
+from app.db.base import Base
+
+
+class CachedResponse(Base):
+    """
+    AI reply stored for reuse by the semantic response cache
+    Matched on the embedding of the final user turn, within entries for the
+    same models and preceding-context fingerprint
+    """
+
+    __tablename__ = "response_cache"
+
+    id = Column(Integer, primary_key=True)
+    model = Column(String, nullable=False)  # Model that generated the response
+    embedding_model = Column(String, nullable=False)
+    context_fingerprint = Column(String(64), nullable=False)
+    prompt = Column(Text, nullable=False)
+    embedding = Column(Vector(settings.EMBEDDING_DIMENSIONS), nullable=False)
+    response = Column(Text, nullable=False)
+    generation_seconds = Column(Float, nullable=False)  # Latency a hit saves
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_response_cache_lookup",
+            "model",
+            "embedding_model",
+            "context_fingerprint",
+        ),
+        # Approximate nearest-neighbour search on cosine distance
+        Index(
+            "ix_response_cache_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "vector_cosine_ops"},
+        ),
+        # Expired entries are evicted by creation time
+        Index("ix_response_cache_created_at", "created_at"),
+    )
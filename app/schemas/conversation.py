@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
@@ -30,6 +30,9 @@ class ConversationResponse(ConversationBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
     messages: List[MessageResponse] = Field(default_factory=list)
 
     class Config:
@@ -41,7 +44,35 @@ class ConversationListResponse(ConversationBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
+    message_count: int = 0
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = None
 
     class Config:
         from_attributes = True
         populate_by_name = True
+
+
+class ConversationFieldsResponse(BaseModel):
+    """Sparse conversation data; only the fields selected with ?fields= are present."""
+
+    id: Optional[int] = None
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    message_count: Optional[int] = None
+    last_message_at: Optional[datetime] = None
+    last_message_preview: Optional[str] = Field(
+        None, description="Start of the latest message"
+    )
+    messages: Optional[List[MessageResponse]] = None
+
+
+# Fields selectable with ?fields=; "messages" is only available on a single
+# conversation and is loaded with a separate query only when requested
+CONVERSATION_FIELDS = tuple(ConversationFieldsResponse.model_fields)
+CONVERSATION_LIST_FIELDS = tuple(f for f in CONVERSATION_FIELDS if f != "messages")
+
+# Orders for the conversation list: newest first by creation, or by the latest
+# message (the inbox view); each is backed by an (expression, id) index
+ConversationSort = Literal["created_at", "last_activity_at"]
@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 
 from app.models.message import MessageType
 
@@ -35,16 +35,62 @@ class MessageUpdate(BaseModel):
     )
 
 
+class MessageImport(MessageBase):
+    """One JSONL record of a bulk import; the conversation comes from the request."""
+
+    created_at: Optional[datetime] = Field(
+        None, description="Original timestamp (UTC if naive); defaults to import time"
+    )
+    message_metadata: Optional[Dict[str, Any]] = Field(
+        None, description="Additional metadata for the message"
+    )
+
+
+class MessageImportResult(BaseModel):
+    """Outcome of a bulk import."""
+
+    imported: int = Field(..., description="Number of messages stored")
+
+
 class MessageResponse(MessageBase):
-    """Schema for message response data."""
+    """Schema for message response data (embeddings are left out)."""
 
     id: int
     conversation_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
     message_metadata: Optional[Dict[str, Any]] = None
-    embedding: Optional[List[float]] = None
 
     class Config:
         from_attributes = True
         populate_by_name = True
+
+
+class MessageSearchResult(MessageResponse):
+    """A message matched by similarity search."""
+
+    distance: float = Field(..., description="Cosine distance to the query")
+
+
+class MessageFieldsResponse(BaseModel):
+    """Sparse message data; only the fields selected with ?fields= are present."""
+
+    id: Optional[int] = None
+    conversation_id: Optional[int] = None
+    content: Optional[str] = None
+    message_type: Optional[MessageType] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    message_metadata: Optional[Dict[str, Any]] = None
+    embedding: Optional[List[float]] = None
+
+    @field_validator("embedding", mode="before")
+    @classmethod
+    def embedding_to_list(cls, value: Any) -> Any:
+        """pgvector returns numpy arrays; convert them to plain lists."""
+        return value.tolist() if hasattr(value, "tolist") else value
+
+
+# Fields selectable with ?fields=; embeddings are only returned on request
+MESSAGE_FIELDS = tuple(MessageFieldsResponse.model_fields)
+MESSAGE_DEFAULT_FIELDS = tuple(f for f in MESSAGE_FIELDS if f != "embedding")
@@ -1,19 +1,126 @@
-from typing import Any, Dict, List, Optional
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
 
 import anthropic
-import numpy as np
+import httpx
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.embedding_backends import EmbeddingBackend, create_embedding_backend
+from app.services.embedding_cache import EmbeddingCache
+from app.services.llm_providers import (
+    AnthropicProvider,
+    LLMProvider,
+    ProviderRouter,
+    create_provider,
+)
+from app.services.llm_scheduler import LLMScheduler, Priority
+from app.services.model_router import ModelRouter, ModelTier
+from app.services.single_flight import SingleFlight, request_key, shared_call
+
+# Stored as the reply when generation fails (see AIService.generate_response)
+FALLBACK_RESPONSE = "I apologize, but I encountered an error processing your request."
+
+
+def _build_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.AI_READ_TIMEOUT, connect=settings.AI_CONNECT_TIMEOUT)
+
+
+def _build_http_client(scheduler: LLMScheduler) -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by every LLM request."""
+
+    async def observe(response: httpx.Response) -> None:
+        scheduler.observe(response)
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.AI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.AI_KEEPALIVE_EXPIRY,
+        ),
+        timeout=_build_timeout(),
+        event_hooks={"response": [observe]},
+    )
+
+
+def _estimate_tokens(params: Dict[str, Any]) -> int:
+    """Upper-bound token cost of a request (~4 characters per token)."""
+    prompt = json.dumps([params.get("system"), params["messages"]])
+    return len(prompt) // 4 + params["max_tokens"]
 
 
 class AIService:
-    def __init__(self):
-        self.anthropic_client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
-        self.model = "claude-3-opus-20240229"  # Default model
+    def __init__(
+        self,
+        anthropic_client: Optional[anthropic.AsyncAnthropic] = None,
+        embedding_backend: Optional[EmbeddingBackend] = None,
+        embedding_cache: Optional[EmbeddingCache] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        router: Optional[ProviderRouter] = None,
+    ):
+        self.scheduler = scheduler or LLMScheduler()
+        self.anthropic_client = anthropic_client or anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.ANTHROPIC_BASE_URL,
+            timeout=_build_timeout(),
+            max_retries=settings.AI_MAX_RETRIES,
+            http_client=_build_http_client(self.scheduler),
+        )
+        self.embedding_backend = embedding_backend or create_embedding_backend()
+        self.embedding_cache = embedding_cache or EmbeddingCache()
+        self.single_flight = SingleFlight()
+        self.model = settings.MODEL_NAME
+        self.model_router = ModelRouter() if settings.AI_MODEL_ROUTING else None
+        self._router_override = router
+        self._providers: Dict[str, LLMProvider] = {}
+        self._routers: Dict[str, ProviderRouter] = {}
+        for tier_model in [self.model, *(settings.AI_MODEL_TIERS.values())]:
+            self._router(tier_model)  # Fail fast on a misconfigured provider
+        self.summary_router = ProviderRouter(
+            [
+                # Summary prompts are not resent, so caching them only adds cost
+                AnthropicProvider(
+                    self.anthropic_client,
+                    settings.CONTEXT_SUMMARY_MODEL,
+                    prompt_caching=False,
+                )
+            ]
+        )
+
+    async def close(self) -> None:
+        """Close the underlying connection pools."""
+        for provider in self._providers.values():
+            await provider.close()
+        await self.anthropic_client.close()
+        await self.embedding_backend.close()
 
-    async def generate_response(self, message_history: List[Dict[str, Any]]) -> str:
-        """Generate an AI response based on conversation history."""
-        # Format messages for Claude
+    def _router(self, model: str) -> ProviderRouter:
+        """Router for ``model``, hedging to ``AI_FALLBACK_MODEL`` if set.
+
+        Providers are shared between routers, so each has one circuit breaker.
+        """
+        if self._router_override is not None:
+            return self._router_override
+        if model not in self._routers:
+            models = dict.fromkeys([model, settings.AI_FALLBACK_MODEL])
+            for name in models:
+                if name and name not in self._providers:
+                    self._providers[name] = create_provider(name, self.anthropic_client)
+            self._routers[model] = ProviderRouter(
+                [self._providers[name] for name in models if name]
+            )
+        return self._routers[model]
+
+    def choose_tier(self, message_history: List[Dict[str, Any]]) -> ModelTier:
+        """Pick the model tier for the latest turn (see ``ModelRouter``)."""
+        if self.model_router is None:
+            return ModelTier("default", self.model)
+        return self.model_router.choose(message_history)
+
+    @staticmethod
+    def _format_messages(message_history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Convert stored message dicts to the Claude messages format."""
         messages = []
 
         for msg in message_history:
@@ -24,26 +131,211 @@ class AIService:
         if not messages or messages[-1]["role"] == "assistant":
             raise ValueError("Last message must be from the user")
 
+        return messages
+
+    @staticmethod
+    def _request_params(
+        messages: List[Dict[str, str]], system: Optional[str], model: str
+    ) -> Dict[str, Any]:
+        """Build the Messages API parameters for a conversation turn."""
+        params = {
+            "model": model,
+            "max_tokens": 1024,
+            "messages": messages,
+        }
+        if system:
+            params["system"] = system
+        return params
+
+    async def complete(
+        self,
+        message_history: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        tier: Optional[ModelTier] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        """Generate an AI response, raising if the upstream call fails.
+
+        ``tier`` defaults to ``choose_tier(message_history)``. ``usage``, if
+        given, is filled with the call's token counts (left empty when the
+        reply is shared with an identical in-flight request).
+        """
+        # Validated before routing, so a bad history raises ValueError
+        messages = self._format_messages(message_history)
+        tier = tier or self.choose_tier(message_history)
+        params = self._request_params(messages, system, tier.model)
+        return await self._coalesced(
+            params,
+            lambda: self._create(
+                params, priority, self._router(tier.model), tier.name, usage
+            ),
+        )
+
+    async def _create(
+        self,
+        params: Dict[str, Any],
+        priority: Priority,
+        router: ProviderRouter,
+        tier: str,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        tokens = _estimate_tokens(params)
+        async with self.scheduler.slot(priority, tokens):
+            started = time.perf_counter()
+            text = await router.complete(params, usage, self.scheduler, tokens)
+        metrics.observe(
+            "ai.tier.latency_seconds", time.perf_counter() - started, tier=tier
+        )
+        return text
+
+    async def _coalesced(
+        self, params: Dict[str, Any], call: Callable[[], Awaitable[str]]
+    ) -> str:
+        """Share one upstream call among concurrent identical requests."""
+        if not settings.AI_SINGLE_FLIGHT:
+            return await call()
+        key = request_key(params)
+        if settings.AI_SINGLE_FLIGHT_SHARED:
+            return await self.single_flight.do(key, lambda: shared_call(key, call))
+        return await self.single_flight.do(key, call)
+
+    async def generate_response(
+        self,
+        message_history: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        tier: Optional[ModelTier] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> str:
+        """Generate an AI response based on conversation history.
+
+        Upstream errors are logged and answered with an apology; use
+        ``complete`` to have them raised instead.
+        """
         try:
-            response = self.anthropic_client.messages.create(
-                model=self.model, max_tokens=1024, messages=messages
+            return await self.complete(
+                message_history,
+                system=system,
+                priority=priority,
+                tier=tier,
+                usage=usage,
             )
-            return response.content[0].text
+        except ValueError:
+            raise
         except Exception as e:
             print(f"Error generating AI response: {str(e)}")
-            return "I apologize, but I encountered an error processing your request."
+            return FALLBACK_RESPONSE
+
+    async def stream_response(
+        self,
+        message_history: List[Dict[str, Any]],
+        system: Optional[str] = None,
+        tier: Optional[ModelTier] = None,
+        usage: Optional[Dict[str, int]] = None,
+    ) -> AsyncIterator[str]:
+        """Yield the AI response text incrementally as the model produces it.
+
+        Closing the generator (e.g. because the client went away) closes the
+        upstream stream, which stops generation on the provider side.
+        ``usage`` is filled with the token counts once the stream completes.
+        """
+        messages = self._format_messages(message_history)
+        tier = tier or self.choose_tier(message_history)
+        params = self._request_params(messages, system, tier.model)
+
+        # The slot is held until the stream finishes or is closed
+        async with self.scheduler.slot(Priority.INTERACTIVE, _estimate_tokens(params)):
+            started = time.perf_counter()
+            first = True
+            async for text in self._router(tier.model).stream(params, usage):
+                if first:
+                    first = False
+                    metrics.observe(
+                        "ai.stream.first_token_seconds",
+                        time.perf_counter() - started,
+                        tier=tier.name,
+                    )
+                yield text
+        metrics.observe(
+            "ai.tier.latency_seconds", time.perf_counter() - started, tier=tier.name
+        )
+
+    async def summarize(
+        self,
+        previous_summary: Optional[str],
+        message_history: List[Dict[str, Any]],
+        priority: Priority = Priority.BACKGROUND,
+    ) -> Optional[str]:
+        """Fold older turns into the running conversation summary.
+
+        Returns None if the summary could not be generated, so callers can
+        keep the previous summary and retry on a later turn. A summary that a
+        reply waits on should be scheduled at the reply's ``priority``.
+        """
+        transcript = "\n".join(
+            f"{'User' if msg['message_type'] == 'user' else 'Assistant'}: "
+            f"{msg['content']}"
+            for msg in message_history
+        )
+        prompt = (
+            "Update the running summary of a travel-planning conversation with "
+            "the new turns below. Keep destinations, dates, budgets, preferences "
+            "and decisions; drop pleasantries. Reply with the summary only.\n\n"
+            f"Current summary:\n{previous_summary or '(none)'}\n\n"
+            f"New turns:\n{transcript}"
+        )
+
+        params = {
+            "model": settings.CONTEXT_SUMMARY_MODEL,
+            "max_tokens": settings.CONTEXT_SUMMARY_MAX_TOKENS,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        try:
+            return await self._coalesced(
+                params,
+                lambda: self._create(params, priority, self.summary_router, "summary"),
+            )
+        except Exception as e:
+            print(f"Error generating conversation summary: {str(e)}")
+            return None
+
+    async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Generate one vector embedding per text in a single batch.
+
+        Texts already embedded (by any process) are served from the cache.
+        """
+        embeddings = await self.embedding_cache.embed(texts, self.embedding_backend)
+        return embeddings.tolist()
 
     async def generate_embedding(self, text: str) -> Optional[List[float]]:
-        """Generate vector embedding for text using Claude."""
+        """Generate vector embedding for text with the configured backend."""
         try:
-            # This is a placeholder - Claude doesn't have a dedicated embedding API yet
-            # In a real implementation, you would use OpenAI or another embedding
-            # provider
-            # For now, we'll return a random vector of the right dimensionality
-
-            # Simulate a 1536-dimensional embedding vector (OpenAI's standard)
-            random_embedding = np.random.normal(0, 1, 1536).tolist()
-            return random_embedding
+            embeddings = await self.generate_embeddings([text])
+            return embeddings[0]
         except Exception as e:
             print(f"Error generating embedding: {str(e)}")
             return None
+
+
+# Process-wide instance so every request shares one client and connection pool
+_ai_service: Optional[AIService] = None
+
+
+def get_ai_service() -> AIService:
+    """Return the shared AIService, creating it on first use.
+
+    Also usable as a FastAPI dependency.
+    """
+    global _ai_service
+    if _ai_service is None:
+        _ai_service = AIService()
+    return _ai_service
+
+
+async def close_ai_service() -> None:
+    """Close the shared AIService's connection pool (called on app shutdown)."""
+    global _ai_service
+    if _ai_service is not None:
+        await _ai_service.close()
+        _ai_service = None
@@ -0,0 +1,149 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.services.ai_service import AIService
+from app.services.conversation_service import ConversationService
+from app.services.llm_scheduler import Priority
+
+# Rough per-message overhead for role markers and separators
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free token estimate (~4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass
+class ContextWindow:
+    """The prompt context for one turn: recent turns plus a summary of the rest."""
+
+    messages: List[Dict[str, Any]]
+    summary: Optional[str]
+    tokens_total: int  # Tokens the full history would have cost
+    tokens_sent: int  # Tokens actually sent (recent turns + summary)
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(self.tokens_total - self.tokens_sent, 0)
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        if not self.summary:
+            return None
+        return f"Summary of the earlier conversation:\n{self.summary}"
+
+
+class ContextBuilder:
+    """
+    Keeps the prompt for each turn within a token budget.
+
+    Turns after the last message folded into the summary are sent verbatim.
+    They are compared on ``(created_at, id)``, the order history is read in,
+    since imported messages can have higher ids than the turns after them.
+    When they exceed ``token_budget``, the oldest are folded into the stored
+    summary until the rest fit in ``token_budget * low_water_ratio``. Folding
+    down to a low-water mark, rather than just under the budget, means the
+    summary is rewritten every few turns instead of on every turn.
+
+    The summary is read and written in short transactions of the builder's
+    own, never the caller's: folding calls the LLM, and a transaction that
+    has inserted a message holds its conversation's row lock (the inbox
+    counters) until it ends. Callers commit their writes before ``build``.
+    The summary is generated at ``priority``, since the turn's reply waits
+    for it.
+    """
+
+    def __init__(
+        self,
+        ai_service: AIService,
+        token_budget: Optional[int] = None,
+        low_water_ratio: Optional[float] = None,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        priority: Priority = Priority.INTERACTIVE,
+    ):
+        self.ai_service = ai_service
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.low_water_ratio = low_water_ratio or settings.CONTEXT_LOW_WATER_RATIO
+        self.session_factory = session_factory
+        self.priority = priority
+
+    async def build(
+        self, conversation_id: int, message_history: List[Dict[str, Any]]
+    ) -> ContextWindow:
+        """Build the context window for the latest turn.
+
+        ``message_history`` is the full conversation in order, as dicts with
+        ``id``, ``message_type``, ``content`` and ``created_at``.
+        """
+        async with self.session_factory() as session:
+            summary, summarized_through = await ConversationService(
+                session
+            ).get_summary(conversation_id)
+        tokens_total = sum(message_tokens(msg) for msg in message_history)
+
+        recent = [
+            msg
+            for msg in message_history
+            if summarized_through is None
+            or (msg["created_at"], msg["id"]) > summarized_through
+        ]
+        recent_tokens = sum(message_tokens(msg) for msg in recent)
+
+        folded = self._split_oldest(recent) if recent_tokens > self.token_budget else []
+        if folded:
+            recent = recent[len(folded) :]
+            new_summary = await self.ai_service.summarize(
+                summary, folded, priority=self.priority
+            )
+            if new_summary is not None:
+                summary = new_summary
+                async with self.session_factory() as session:
+                    await ConversationService(session).update_summary(
+                        conversation_id,
+                        summary,
+                        folded[-1]["id"],
+                        folded[-1]["created_at"],
+                    )
+                    await session.commit()
+                metrics.increment("context.summaries_updated")
+            else:
+                # Keep the old summary; the folded turns are retried next time
+                metrics.increment("context.summary_failures")
+
+        window = ContextWindow(
+            messages=recent,
+            summary=summary,
+            tokens_total=tokens_total,
+            tokens_sent=sum(message_tokens(msg) for msg in recent)
+            + (estimate_tokens(summary) if summary else 0),
+        )
+        metrics.observe("context.tokens_sent", window.tokens_sent)
+        metrics.observe("context.tokens_saved", window.tokens_saved)
+        metrics.increment("context.tokens_saved_total", window.tokens_saved)
+        return window
+
+    def _split_oldest(self, recent: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the oldest turns to fold so the rest fit the low-water mark.
+
+        The latest turn is always kept, and the kept turns start with a user
+        message as the Messages API requires.
+        """
+        target = self.token_budget * self.low_water_ratio
+        remaining = sum(message_tokens(msg) for msg in recent)
+        cut = 0
+        while cut < len(recent) - 1 and (
+            remaining > target or recent[cut]["message_type"] != "user"
+        ):
+            remaining -= message_tokens(recent[cut])
+            cut += 1
+        return recent[:cut]
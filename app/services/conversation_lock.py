@@ -0,0 +1,77 @@
+"""
+Per-conversation serialization of AI replies.
+
+Only one reply is generated for a conversation at a time, across all API and
+worker processes: a turn that arrives while a reply is being generated waits
+for it, then answers with that reply in its history instead of racing it.
+Within a process waiters queue on an ``asyncio.Lock``; across processes the
+holder also takes a session-level Postgres advisory lock on a connection of
+its own, which the server releases if the process dies.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from sqlalchemy import text
+
+from app.core.metrics import metrics
+from app.db.base import engine
+
+logger = logging.getLogger(__name__)
+
+# First key of the two-int advisory lock held while replying to a conversation
+# (JobService uses its own namespace for enqueues)
+REPLY_LOCK_NAMESPACE = 2
+
+
+class ConversationLocks:
+    """Mutual exclusion per conversation id, in-process and across processes."""
+
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, conversation_id: int) -> AsyncIterator[None]:
+        started = time.monotonic()
+        lock = self._locks.setdefault(conversation_id, asyncio.Lock())
+        self._users[conversation_id] = self._users.get(conversation_id, 0) + 1
+        try:
+            async with lock:
+                async with _advisory_lock(conversation_id):
+                    metrics.observe(
+                        "conversation_lock.wait_seconds", time.monotonic() - started
+                    )
+                    yield
+        finally:
+            self._users[conversation_id] -= 1
+            if not self._users[conversation_id]:
+                del self._users[conversation_id]
+                del self._locks[conversation_id]
+
+
+@asynccontextmanager
+async def _advisory_lock(conversation_id: int) -> AsyncIterator[None]:
+    params = {"namespace": REPLY_LOCK_NAMESPACE, "id": conversation_id}
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT pg_advisory_lock(:namespace, :id)"), params)
+        await conn.commit()
+        try:
+            yield
+        finally:
+            try:
+                await conn.execute(
+                    text("SELECT pg_advisory_unlock(:namespace, :id)"), params
+                )
+                await conn.commit()
+            except Exception:
+                # Don't return a connection still holding the lock to the pool
+                logger.exception("Failed to release conversation lock")
+                await conn.invalidate()
+
+
+# Process-wide, so every reply in this process queues on the same locks
+conversation_locks = ConversationLocks()
@@ -1,16 +1,32 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, Optional, Sequence, Tuple
 
+from sqlalchemy import Row, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
+from app.core.pagination import Page, keyset_page, to_page
 from app.models.conversation import Conversation
 from app.models.message import Message
-from app.schemas.conversation import ConversationCreate, ConversationUpdate
-from app.schemas.message import MessageCreate
+from app.schemas.conversation import (
+    CONVERSATION_FIELDS,
+    CONVERSATION_LIST_FIELDS,
+    ConversationCreate,
+    ConversationSort,
+    ConversationUpdate,
+)
+from app.schemas.message import MESSAGE_DEFAULT_FIELDS, MessageCreate
+from app.services.message_service import MessageService
 
 
 class ConversationService:
+    """Conversation reads and writes.
+
+    Writes are flushed, not committed: the caller owns the transaction (the
+    ``get_db`` dependency commits once per request).
+    """
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
@@ -25,22 +41,36 @@ class ConversationService:
         conversation = Conversation(
             title=conversation_data.title, created_at=now, updated_at=now
         )
+        # One INSERT ... RETURNING (see Conversation's eager_defaults)
         self.db.add(conversation)
-        await self.db.commit()
-        await self.db.refresh(conversation)
+        await self.db.flush()
         return conversation
 
     async def get_conversations(
-        self, skip: int = 0, limit: int = 100
-    ) -> List[Conversation]:
-        """Get all conversations."""
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Sequence[str] = CONVERSATION_LIST_FIELDS,
+        sort: ConversationSort = "created_at",
+    ) -> Page[Row]:
+        """Get a page of conversations, newest first by ``sort``.
+
+        Only the given fields (plus the id and sort key) are selected; message
+        counts and previews are kept on the conversation, so no messages are
+        read.
+        """
+        columns = dict.fromkeys(["id", sort, *fields])
         result = await self.db.execute(
-            select(Conversation)
-            .offset(skip)
-            .limit(limit)
-            .order_by(Conversation.created_at.desc())
+            keyset_page(
+                select(*[getattr(Conversation, name) for name in columns]),
+                Conversation,
+                limit,
+                cursor,
+                descending=True,
+                sort_column=getattr(Conversation, sort),
+            )
         )
-        return result.scalars().all()
+        return to_page(list(result.all()), limit, sort_key=sort)
 
     async def get_conversation(self, conversation_id: int) -> Optional[Conversation]:
         """Get a specific conversation by ID with its messages."""
@@ -58,43 +88,109 @@ class ConversationService:
 
         return conversation
 
-    async def update_conversation(
-        self, conversation_id: int, conversation_data: ConversationUpdate
-    ) -> Optional[Conversation]:
-        """Update a conversation."""
+    async def get_conversation_fields(
+        self, conversation_id: int, fields: Sequence[str] = CONVERSATION_FIELDS
+    ) -> Optional[Dict[str, Any]]:
+        """Get only the given fields of a conversation.
+
+        Messages are fetched, without embeddings, only if "messages" is asked for.
+        """
+        columns = [name for name in fields if name != "messages"]
         result = await self.db.execute(
-            select(Conversation).where(Conversation.id == conversation_id)
+            select(
+                *[
+                    getattr(Conversation, name)
+                    for name in dict.fromkeys(["id", *columns])
+                ]
+            ).where(Conversation.id == conversation_id)
         )
-        conversation = result.scalars().first()
-
-        if not conversation:
+        row = result.first()
+        if row is None:
             return None
 
-        # Update fields if provided
-        if conversation_data.title is not None:
-            conversation.title = conversation_data.title
-
-        await self.db.commit()
-        await self.db.refresh(conversation)
+        conversation = {name: getattr(row, name) for name in columns}
+        if "messages" in fields:
+            result = await self.db.execute(
+                select(*[getattr(Message, name) for name in MESSAGE_DEFAULT_FIELDS])
+                .where(Message.conversation_id == conversation_id)
+                .order_by(Message.id)
+            )
+            conversation["messages"] = [dict(m._mapping) for m in result]
         return conversation
 
-    async def delete_conversation(self, conversation_id: int) -> bool:
-        """Delete a conversation."""
+    async def conversation_exists(self, conversation_id: int) -> bool:
+        """Check whether a conversation exists without loading it."""
         result = await self.db.execute(
-            select(Conversation).where(Conversation.id == conversation_id)
+            select(Conversation.id).where(Conversation.id == conversation_id)
         )
-        conversation = result.scalars().first()
+        return result.first() is not None
 
-        if not conversation:
-            return False
+    async def get_summary(
+        self, conversation_id: int
+    ) -> Tuple[Optional[str], Optional[Tuple[datetime, int]]]:
+        """Get a conversation's rolling summary and the last message folded in.
 
-        await self.db.delete(conversation)
-        await self.db.commit()
-        return True
+        The message is returned as its ``(created_at, id)`` key, the order
+        ``MessageService.get_message_history`` reads messages in.
+        """
+        result = await self.db.execute(
+            select(
+                Conversation.summary,
+                Conversation.summary_message_created_at,
+                Conversation.summary_message_id,
+            ).where(Conversation.id == conversation_id)
+        )
+        row = result.first()
+        if row is None:
+            return None, None
+        if row.summary_message_created_at is None:
+            return row.summary, None
+        return row.summary, (row.summary_message_created_at, row.summary_message_id)
+
+    async def update_summary(
+        self,
+        conversation_id: int,
+        summary: str,
+        summary_message_id: int,
+        summary_message_created_at: datetime,
+    ) -> None:
+        """Store a new rolling summary covering messages up to summary_message_id."""
+        await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(
+                summary=summary,
+                summary_message_id=summary_message_id,
+                summary_message_created_at=summary_message_created_at,
+            )
+        )
+
+    async def update_conversation(
+        self, conversation_id: int, conversation_data: ConversationUpdate
+    ) -> Optional[Conversation]:
+        """Update a conversation with a single UPDATE ... RETURNING."""
+        changes = conversation_data.model_dump(exclude_none=True)
+        if not changes:
+            return await self.db.get(Conversation, conversation_id)
+
+        result = await self.db.execute(
+            update(Conversation)
+            .where(Conversation.id == conversation_id)
+            .values(**changes)
+            .returning(Conversation)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalars().first()
+
+    async def delete_conversation(self, conversation_id: int) -> bool:
+        """Delete a conversation."""
+        result = await self.db.execute(
+            delete(Conversation)
+            .where(Conversation.id == conversation_id)
+            .returning(Conversation.id)
+        )
+        return result.first() is not None
 
     async def add_message(self, data: MessageCreate) -> Message:
         """Add a message to a conversation"""
-        message = Message(**data.model_dump())
-        self.db.add(message)
-        await self.db.commit()
-        return message
+        return await MessageService(self.db).create_message(data)
@@ -0,0 +1,188 @@
+"""
+Embedding backends.
+
+``AIService`` embeds text through an ``EmbeddingBackend``. The default,
+``HashingEmbeddingBackend``, runs locally: it is deterministic, needs no
+network, and suits near-duplicate and keyword-overlap retrieval.
+``OpenAIEmbeddingBackend`` calls the OpenAI embeddings API. Vectors from
+different backends are not comparable, so re-embed stored messages
+(``scripts/reembed_messages.py``) after switching ``EMBEDDING_BACKEND``.
+"""
+
+import asyncio
+import re
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import chain
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _hash_feature(feature: str) -> int:
+    # Stable across processes, unlike hash()
+    return int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), "little")
+
+
+@lru_cache(maxsize=2**16)
+def _word_features(word: str, char_ngram: int) -> Tuple[int, ...]:
+    """Hashes of a word and its character n-grams, cached for common words."""
+    padded = f"<{word}>"
+    ngrams = (padded[i : i + char_ngram] for i in range(len(padded) - char_ngram + 1))
+    return (_hash_feature(f"w:{word}"), *(_hash_feature(f"c:{g}") for g in ngrams))
+
+
+def _mix(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Combine two hash arrays into one (splitmix64 finalizer over the pair)."""
+    with np.errstate(over="ignore"):
+        h = left * np.uint64(0x9E3779B97F4A7C15) ^ right
+        h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return h ^ (h >> np.uint64(31))
+
+
+def _tokens(text: str) -> List[str]:
+    """Words, else raw tokens (punctuation, emoji), else one empty token."""
+    return _WORD_RE.findall(text) or text.split() or [""]
+
+
+class EmbeddingBackend(ABC):
+    """Turns a batch of texts into an ``(n, dimensions)`` float32 matrix."""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Identifies the model; bump it whenever the vectors would change."""
+
+    @property
+    def model_id(self) -> str:
+        """Name plus dimensions: vectors are only comparable within one id."""
+        return f"{self.name}:{self.dimensions}"
+
+    @abstractmethod
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed ``texts``, one row per text in input order."""
+
+    async def close(self) -> None:
+        """Release any client resources."""
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """Signed feature hashing of words, word bigrams and character trigrams.
+
+    Each feature is hashed to one dimension with a +/-1 sign, which is a
+    sparse random projection of the bag of features; counts are damped with
+    log1p and rows are L2-normalized so cosine distance compares texts.
+    Text without word characters ("👍", "?!") is featurized by its
+    whitespace-separated tokens instead, and empty text by a single fixed
+    feature, so no row is ever zero (cosine distance to it would be NaN).
+    """
+
+    # Batches larger than this are encoded off the event loop
+    thread_threshold = 256
+
+    def __init__(self, dimensions: int, char_ngram: int = 3):
+        super().__init__(dimensions)
+        self.char_ngram = char_ngram
+
+    @property
+    def name(self) -> str:
+        return f"hashing-v2-c{self.char_ngram}"
+
+    def _hashes(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (row, hash) arrays for every feature in the batch."""
+        words = [_tokens(text.lower()) for text in texts]
+        features = [
+            [_word_features(word, self.char_ngram) for word in row] for row in words
+        ]
+        counts = np.fromiter(
+            (sum(map(len, row)) for row in features), np.int64, len(texts)
+        )
+        hashes = np.fromiter(
+            chain.from_iterable(chain.from_iterable(features)), np.uint64, counts.sum()
+        )
+        rows = np.repeat(np.arange(len(texts)), counts)
+
+        # Word bigrams: mix the hashes of adjacent words within each text
+        word_counts = np.fromiter(map(len, words), np.int64, len(texts))
+        word_hashes = np.fromiter(
+            (f[0] for row in features for f in row), np.uint64, word_counts.sum()
+        )
+        word_rows = np.repeat(np.arange(len(texts)), word_counts)
+        adjacent = word_rows[1:] == word_rows[:-1]
+        bigrams = _mix(word_hashes[:-1][adjacent], word_hashes[1:][adjacent])
+        return (
+            np.concatenate([rows, word_rows[1:][adjacent]]),
+            np.concatenate([hashes, bigrams]),
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch synchronously with vectorized scatter-adds."""
+        matrix = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        rows, hashes = self._hashes(texts)
+        if not len(hashes):
+            return matrix
+
+        # Sum the +/-1 signs of features sharing a (row, dimension) cell
+        cells = rows * self.dimensions + (hashes % np.uint64(self.dimensions))
+        signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+        cells, inverse = np.unique(cells.astype(np.int64), return_inverse=True)
+        values = np.bincount(inverse, weights=signs)
+
+        values = np.sign(values) * np.log1p(np.abs(values))
+        cell_rows = cells // self.dimensions
+        norms = np.sqrt(np.bincount(cell_rows, values**2, minlength=len(texts)))
+        matrix.flat[cells] = values / np.maximum(norms[cell_rows], 1e-12)
+        return matrix
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        if len(texts) > self.thread_threshold:
+            return await asyncio.to_thread(self.encode, texts)
+        return self.encode(texts)
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Embeddings from the OpenAI API (``text-embedding-3-*`` models)."""
+
+    def __init__(self, dimensions: int, model: str, client=None):
+        super().__init__(dimensions)
+        self.model = model
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        self.client = client
+
+    @property
+    def name(self) -> str:
+        return f"openai-{self.model}"
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        response = await self.client.embeddings.create(
+            model=self.model, input=texts, dimensions=self.dimensions
+        )
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.array([item.embedding for item in data], dtype=np.float32)
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """Build the backend selected by ``EMBEDDING_BACKEND``."""
+    name = name or settings.EMBEDDING_BACKEND
+    if name == "openai":
+        if not settings.OPENAI_API_KEY:
+            raise ValueError("EMBEDDING_BACKEND=openai requires OPENAI_API_KEY")
+        return OpenAIEmbeddingBackend(
+            settings.EMBEDDING_DIMENSIONS, settings.EMBEDDING_MODEL
+        )
+    return HashingEmbeddingBackend(settings.EMBEDDING_DIMENSIONS)
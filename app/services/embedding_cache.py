@@ -0,0 +1,192 @@
+"""
+Two-tier embedding cache.
+
+Embeddings are keyed by a sha256 of the backend's model name, its dimensions
+and the normalized text. Lookups go to an in-process LRU first, then to the
+shared ``embedding_cache`` table, and only texts missing from both are sent
+to the backend. New embeddings are written back to both tiers, so a repeated
+text is embedded once across all processes (until its entry expires).
+"""
+
+import logging
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import timedelta
+from hashlib import sha256
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.models.embedding_cache import CachedEmbedding
+from app.services.embedding_backends import EmbeddingBackend
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, Unicode forms and whitespace so trivial variants share a key."""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def cache_key(model: str, normalized_text: str) -> str:
+    return sha256(f"{model}\n{normalized_text}".encode()).hexdigest()
+
+
+class LRUCache:
+    """Size-capped LRU mapping whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[float, np.ndarray]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            metrics.increment("embedding_cache.evicted", tier="memory")
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: np.ndarray) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            metrics.increment("embedding_cache.evicted", tier="memory")
+
+
+class EmbeddingCacheService:
+    """Reads and writes the persistent ``embedding_cache`` table."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_embeddings(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        result = await self.db.execute(
+            select(CachedEmbedding.key, CachedEmbedding.embedding).where(
+                CachedEmbedding.key.in_(keys)
+            )
+        )
+        return {key: embedding for key, embedding in result.tuples()}
+
+    async def store_embeddings(
+        self, model: str, embeddings: Dict[str, np.ndarray]
+    ) -> None:
+        """Insert new entries; keys another process stored first are kept."""
+        await self.db.execute(
+            insert(CachedEmbedding)
+            .values(
+                [
+                    {"key": key, "model": model, "embedding": embedding}
+                    for key, embedding in embeddings.items()
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["key"])
+        )
+        await self.db.commit()
+
+    async def evict_expired(self, ttl: float) -> int:
+        """Delete entries created more than ``ttl`` seconds ago."""
+        result = await self.db.execute(
+            delete(CachedEmbedding).where(
+                CachedEmbedding.created_at < func.now() - timedelta(seconds=ttl)
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
+
+
+class EmbeddingCache:
+    """In-process LRU in front of the shared table, wrapped around a backend."""
+
+    def __init__(
+        self,
+        maxsize: int = settings.EMBEDDING_CACHE_SIZE,
+        ttl: float = settings.EMBEDDING_CACHE_MEMORY_TTL,
+        persist: bool = settings.EMBEDDING_CACHE_PERSIST,
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+    ):
+        self.memory = LRUCache(maxsize, ttl)
+        self.persist = persist
+        self.session_factory = session_factory
+        self.lookups = 0
+        self.hits = 0
+
+    async def embed(self, texts: List[str], backend: EmbeddingBackend) -> np.ndarray:
+        """Embed ``texts`` (in normalized form), calling the backend for misses."""
+        model = backend.model_id
+        normalized = [normalize_text(text) for text in texts]
+        keys = [cache_key(model, text) for text in normalized]
+        unique = dict(zip(keys, normalized))
+
+        found: Dict[str, np.ndarray] = {}
+        for key in unique:
+            embedding = self.memory.get(key)
+            if embedding is not None:
+                found[key] = embedding
+        memory_hits = len(found)
+
+        if self.persist and len(found) < len(unique):
+            stored = await self._load([key for key in unique if key not in found])
+            for key, embedding in stored.items():
+                self.memory.set(key, embedding)
+            found.update(stored)
+        db_hits = len(found) - memory_hits
+
+        missing = {key: text for key, text in unique.items() if key not in found}
+        if missing:
+            embeddings = await backend.embed(list(missing.values()))
+            # Copy rows so cached entries don't keep the whole batch alive
+            computed = {key: row.copy() for key, row in zip(missing, embeddings)}
+            for key, embedding in computed.items():
+                self.memory.set(key, embedding)
+            found.update(computed)
+            if self.persist:
+                await self._store(model, computed)
+
+        self._record(len(unique), memory_hits, db_hits)
+        if not keys:
+            return np.zeros((0, backend.dimensions), dtype=np.float32)
+        return np.stack([found[key] for key in keys])
+
+    async def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            async with self.session_factory() as session:
+                return await EmbeddingCacheService(session).get_embeddings(keys)
+        except Exception:
+            # The cache is an optimization; fall back to embedding
+            logger.warning("Embedding cache lookup failed", exc_info=True)
+            return {}
+
+    async def _store(self, model: str, embeddings: Dict[str, np.ndarray]) -> None:
+        try:
+            async with self.session_factory() as session:
+                await EmbeddingCacheService(session).store_embeddings(model, embeddings)
+        except Exception:
+            logger.warning("Embedding cache write failed", exc_info=True)
+
+    def _record(self, lookups: int, memory_hits: int, db_hits: int) -> None:
+        self.lookups += lookups
+        self.hits += memory_hits + db_hits
+        metrics.increment("embedding_cache.hits", memory_hits, tier="memory")
+        metrics.increment("embedding_cache.hits", db_hits, tier="db")
+        metrics.increment("embedding_cache.misses", lookups - memory_hits - db_hits)
+        if self.lookups:
+            metrics.set_gauge("embedding_cache.hit_rate", self.hits / self.lookups)
+        metrics.set_gauge("embedding_cache.memory_entries", len(self.memory))
@@ -0,0 +1,184 @@
+"""
+Write-behind embedding pipeline.
+
+Message IDs are queued as messages are created. A background task embeds
+them in batches and stores the vectors with one bulk UPDATE per batch, so
+embedding never runs on the request path. Anything not embedded (queue full,
+failed batch, process restart) is re-queued by the worker's periodic sweep.
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.services.ai_service import get_ai_service
+from app.services.embedding_cache import EmbeddingCacheService
+
+logger = logging.getLogger(__name__)
+
+# Session.info key for message IDs to queue once the transaction commits
+SUBMIT_ON_COMMIT = "embedding_pipeline.submit"
+
+
+class EmbeddingPipeline:
+    """Batches embedding of new messages in the background."""
+
+    def __init__(
+        self,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        max_wait: float = settings.EMBEDDING_BATCH_MAX_WAIT,
+        queue_size: int = settings.EMBEDDING_QUEUE_SIZE,
+        sweep_interval: float = settings.EMBEDDING_SWEEP_INTERVAL,
+    ):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.sweep_interval = sweep_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.pending: Set[int] = set()  # Queued IDs, so the sweep adds no duplicates
+        self.tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self.queue is not None
+
+    def submit(self, message_id: int) -> None:
+        """Queue a message for embedding without blocking the caller."""
+        if not self.running or message_id in self.pending:
+            return
+        try:
+            self.queue.put_nowait(message_id)
+        except asyncio.QueueFull:
+            metrics.increment("embeddings.dropped")
+            return
+        self.pending.add(message_id)
+        metrics.set_gauge("embeddings.queue_depth", self.queue.qsize())
+
+    def submit_on_commit(self, session: AsyncSession, message_id: int) -> None:
+        """Queue a message once ``session`` commits (dropped on rollback).
+
+        Queued before the commit, the batch could read the table before the
+        message is visible and skip it until the next sweep.
+        """
+        session.info.setdefault(SUBMIT_ON_COMMIT, set()).add(message_id)
+
+    async def start(self, sweep: bool = False) -> None:
+        """Start the batching task, plus the backfill sweep if ``sweep``."""
+        if self.running or not settings.ENABLE_VECTOR_SEARCH:
+            return
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.tasks = [asyncio.create_task(self._run())]
+        if sweep:
+            self.tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        """Stop background tasks; still-queued messages are left to the sweep."""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        self.queue = None
+        self.pending.clear()
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self.process(batch)
+            except Exception:
+                logger.exception(f"Failed to embed batch of {len(batch)} messages")
+                metrics.increment("embeddings.failed", len(batch))
+
+    async def _next_batch(self) -> List[int]:
+        """Wait for one ID, then collect more until the batch is full or stale."""
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        self.pending.difference_update(batch)
+        metrics.set_gauge("embeddings.queue_depth", self.queue.qsize())
+        return batch
+
+    async def process(self, message_ids: List[int]) -> int:
+        """Embed a batch of messages and store the vectors in one UPDATE."""
+        # Imported here: MessageService queues new messages on this pipeline
+        from app.services.message_service import MessageService
+
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as session:
+            message_service = MessageService(session)
+            contents = await message_service.get_message_contents(message_ids)
+            if not contents:
+                return 0
+            embeddings = await get_ai_service().generate_embeddings(
+                list(contents.values())
+            )
+            updated = await message_service.update_message_embeddings(
+                dict(zip(contents, embeddings))
+            )
+            await session.commit()
+
+        metrics.increment("embeddings.embedded", updated)
+        metrics.observe("embeddings.batch_size", len(contents))
+        metrics.observe("embeddings.batch_seconds", time.perf_counter() - started)
+        return updated
+
+    async def _sweep(self) -> None:
+        """Periodically queue messages that still have no embedding.
+
+        Also evicts expired entries from the persistent embedding cache.
+        """
+        from app.services.message_service import MessageService
+
+        while True:
+            free = self.queue_size - self.queue.qsize()
+            try:
+                async with AsyncSessionLocal() as session:
+                    if free > 0:
+                        message_ids = await MessageService(
+                            session
+                        ).get_unembedded_message_ids(free)
+                        for message_id in message_ids:
+                            self.submit(message_id)
+                    if settings.EMBEDDING_CACHE_PERSIST:
+                        evicted = await EmbeddingCacheService(session).evict_expired(
+                            settings.EMBEDDING_CACHE_DB_TTL
+                        )
+                        metrics.increment("embedding_cache.evicted", evicted, tier="db")
+            except Exception:
+                logger.exception("Embedding sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+
+# Process-wide pipeline, started by the app lifespan and the worker
+embedding_pipeline = EmbeddingPipeline()
+
+
+@event.listens_for(Session, "after_commit")
+def _submit_committed(session: Session) -> None:
+    if session.in_nested_transaction():
+        return  # A savepoint was released; the transaction is still open
+    for message_id in session.info.pop(SUBMIT_ON_COMMIT, ()):
+        embedding_pipeline.submit(message_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_rolled_back(session: Session, previous_transaction) -> None:
+    if previous_transaction.parent is None:
+        session.info.pop(SUBMIT_ON_COMMIT, None)
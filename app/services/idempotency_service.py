@@ -0,0 +1,93 @@
+from datetime import timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, func, literal_column, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyKey, IdempotencyStatus
+
+
+class IdempotencyService:
+    """Claims idempotency keys and stores the responses they produced."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def claim(self, key: str, request_hash: str) -> bool:
+        """Claim a key for a new request.
+
+        Succeeds if the key is unused, expired, or held by a request that has
+        been pending so long it presumably died.
+        """
+        now = func.now()
+        takeover = or_(
+            IdempotencyKey.created_at
+            < now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+            (IdempotencyKey.status == IdempotencyStatus.PENDING)
+            & (
+                IdempotencyKey.created_at
+                < now - timedelta(seconds=settings.IDEMPOTENCY_PENDING_TIMEOUT)
+            ),
+        )
+        result = await self.db.execute(
+            insert(IdempotencyKey)
+            .values(
+                key=key, request_hash=request_hash, status=IdempotencyStatus.PENDING
+            )
+            .on_conflict_do_update(
+                index_elements=["key"],
+                set_={
+                    "request_hash": request_hash,
+                    "status": IdempotencyStatus.PENDING,
+                    "response_status": None,
+                    "response_body": None,
+                    "created_at": now,
+                },
+                where=takeover,
+            )
+            .returning(literal_column("1"))
+        )
+        await self.db.commit()
+        return result.first() is not None
+
+    async def get(self, key: str) -> Optional[Row]:
+        result = await self.db.execute(
+            select(
+                IdempotencyKey.request_hash,
+                IdempotencyKey.status,
+                IdempotencyKey.response_status,
+                IdempotencyKey.response_body,
+            ).where(IdempotencyKey.key == key)
+        )
+        return result.first()
+
+    async def complete(self, key: str, status_code: int, body: Any) -> None:
+        await self.db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(
+                status=IdempotencyStatus.DONE,
+                response_status=status_code,
+                response_body=body,
+            )
+        )
+        await self.db.commit()
+
+    async def release(self, key: str) -> None:
+        """Forget a key whose request failed, so a retry runs it again."""
+        await self.db.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key))
+        await self.db.commit()
+
+    async def evict_expired(self) -> int:
+        result = await self.db.execute(
+            delete(IdempotencyKey).where(
+                IdempotencyKey.created_at
+                < func.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
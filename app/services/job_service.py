@@ -0,0 +1,201 @@
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.job import Job, JobStatus, JobType
+
+# Channel workers LISTEN on so new jobs are picked up without waiting a poll
+JOB_NOTIFY_CHANNEL = "jobs"
+
+# First key of the two-int advisory lock serializing enqueues per conversation
+ENQUEUE_LOCK_NAMESPACE = 1
+
+
+class JobService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def enqueue(
+        self,
+        job_type: JobType,
+        conversation_id: Optional[int] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        debounce: float = 0,
+        max_delay: Optional[float] = None,
+    ) -> Job:
+        """Queue a job and wake up idle workers.
+
+        With ``debounce``, the job runs that many seconds after the latest
+        enqueue for its conversation: a job of the same type still queued
+        for the conversation is pushed back instead of adding another, but
+        never beyond ``max_delay`` after it was first queued.
+
+        Flushed, not committed: the job is queued, and workers are notified,
+        when the caller's transaction commits, together with the message it
+        replies to.
+        """
+        if debounce and conversation_id is not None:
+            job = await self._debounce(job_type, conversation_id, debounce, max_delay)
+            if job is not None:
+                metrics.increment("jobs.coalesced", job_type=job_type.value)
+                return job
+
+        job = Job(
+            job_type=job_type,
+            conversation_id=conversation_id,
+            payload=payload,
+            status=JobStatus.QUEUED,
+            max_attempts=settings.JOB_MAX_ATTEMPTS,
+            run_after=func.now() + timedelta(seconds=debounce),
+        )
+        self.db.add(job)
+        await self.db.flush()
+        await self.db.execute(
+            text("SELECT pg_notify(:channel, '')"), {"channel": JOB_NOTIFY_CHANNEL}
+        )
+        return job
+
+    async def _debounce(
+        self,
+        job_type: JobType,
+        conversation_id: int,
+        debounce: float,
+        max_delay: Optional[float],
+    ) -> Optional[Job]:
+        """Push back the conversation's queued job, if there is one."""
+        # Concurrent enqueues for one conversation must not both insert
+        await self.db.execute(
+            text("SELECT pg_advisory_xact_lock(:namespace, :id)"),
+            {"namespace": ENQUEUE_LOCK_NAMESPACE, "id": conversation_id},
+        )
+        run_after = func.now() + timedelta(seconds=debounce)
+        if max_delay is not None:
+            run_after = func.least(
+                run_after, Job.created_at + timedelta(seconds=max_delay)
+            )
+        result = await self.db.execute(
+            update(Job)
+            .where(
+                Job.conversation_id == conversation_id,
+                Job.job_type == job_type,
+                Job.status == JobStatus.QUEUED,
+            )
+            .values(run_after=run_after)
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalars().first()
+
+    async def next_due_in(self) -> Optional[float]:
+        """Seconds until the next not-yet-due job is due (None if there is none)."""
+        result = await self.db.execute(
+            select(func.extract("epoch", func.min(Job.run_after) - func.now())).where(
+                Job.status == JobStatus.QUEUED, Job.run_after > func.now()
+            )
+        )
+        seconds = result.scalar()
+        return None if seconds is None else max(float(seconds), 0.0)
+
+    async def claim(self, worker_id: str, limit: int) -> List[Job]:
+        """Atomically claim up to ``limit`` due jobs for this worker.
+
+        ``FOR UPDATE SKIP LOCKED`` lets any number of workers poll the same
+        table without blocking on, or double-claiming, each other's rows.
+        Jobs for a conversation that already has a running job wait for it
+        to finish, so its replies are generated in order.
+        """
+        running = aliased(Job)
+        busy = (
+            select(running.id)
+            .where(
+                running.conversation_id == Job.conversation_id,
+                running.status == JobStatus.RUNNING,
+            )
+            .exists()
+        )
+        due = (
+            select(Job.id)
+            .where(Job.status == JobStatus.QUEUED, Job.run_after <= func.now(), ~busy)
+            .order_by(Job.run_after, Job.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.db.execute(
+            update(Job)
+            .where(Job.id.in_(due.scalar_subquery()))
+            .values(
+                status=JobStatus.RUNNING,
+                locked_by=worker_id,
+                locked_at=func.now(),
+                attempts=Job.attempts + 1,
+            )
+            .returning(Job)
+            .execution_options(synchronize_session=False)
+        )
+        jobs = list(result.scalars().all())
+        await self.db.commit()
+        return jobs
+
+    async def complete(self, job_id: int) -> None:
+        """Mark a job as succeeded."""
+        await self.db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status=JobStatus.SUCCEEDED, finished_at=func.now())
+        )
+        await self.db.commit()
+
+    async def fail(self, job: Job, error: str) -> None:
+        """Record a failed attempt; retry with backoff until attempts run out."""
+        if job.attempts < job.max_attempts:
+            values = {
+                "status": JobStatus.QUEUED,
+                "run_after": func.now()
+                + timedelta(seconds=settings.JOB_RETRY_BACKOFF * job.attempts),
+            }
+        else:
+            values = {"status": JobStatus.FAILED, "finished_at": func.now()}
+
+        await self.db.execute(
+            update(Job)
+            .where(Job.id == job.id)
+            .values(last_error=error, locked_by=None, locked_at=None, **values)
+        )
+        await self.db.commit()
+
+    async def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Refresh a running job's lock; False if it is no longer this worker's."""
+        result = await self.db.execute(
+            update(Job)
+            .where(
+                Job.id == job_id,
+                Job.status == JobStatus.RUNNING,
+                Job.locked_by == worker_id,
+            )
+            .values(locked_at=func.now())
+        )
+        await self.db.commit()
+        return result.rowcount > 0
+
+    async def requeue_stale(self) -> int:
+        """Return jobs whose worker died mid-run to the queue.
+
+        A live worker heartbeats its running jobs (see ``heartbeat``), so only
+        jobs whose worker stopped doing so for ``JOB_STALE_TIMEOUT`` are taken.
+        """
+        result = await self.db.execute(
+            update(Job)
+            .where(
+                Job.status == JobStatus.RUNNING,
+                Job.locked_at
+                < func.now() - timedelta(seconds=settings.JOB_STALE_TIMEOUT),
+            )
+            .values(status=JobStatus.QUEUED, locked_by=None, locked_at=None)
+        )
+        await self.db.commit()
+        return result.rowcount
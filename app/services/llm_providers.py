@@ -0,0 +1,461 @@
+"""
+LLM providers and the router that hedges and fails over between them.
+
+``ProviderRouter`` sends each request to the first provider whose circuit is
+closed. If no answer has arrived after that provider's recent p95 latency
+(``AI_HEDGE_QUANTILE``), the same request is also sent to the next provider;
+the first answer wins and the slower call is cancelled. A provider that fails
+``AI_CIRCUIT_FAILURE_THRESHOLD`` times in a row is skipped for
+``AI_CIRCUIT_RESET_TIMEOUT`` seconds; after that a single failure skips it
+again.
+
+Calls take an optional ``usage`` dict, which is filled with the token counts
+of the call that produced the reply (``USAGE_FIELDS``).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import anthropic
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.llm_scheduler import LLMScheduler
+
+logger = logging.getLogger(__name__)
+
+# Token counts reported per call; the cache fields are Anthropic prompt caching
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+EPHEMERAL = {"type": "ephemeral"}
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when every provider's circuit is open."""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; half-opens after a cool-down."""
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(
+        self,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None,
+    ):
+        self.failure_threshold = (
+            failure_threshold or settings.AI_CIRCUIT_FAILURE_THRESHOLD
+        )
+        self.reset_timeout = reset_timeout or settings.AI_CIRCUIT_RESET_TIMEOUT
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def allow(self) -> bool:
+        """Whether requests may be sent to the provider now."""
+        if (
+            self.state == self.OPEN
+            and time.monotonic() - self.opened_at >= self.reset_timeout
+        ):
+            self.state = self.HALF_OPEN
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Latencies of a provider's recent successful calls."""
+
+    def __init__(self, window: int = 200):
+        self.samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < settings.AI_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class LLMProvider(ABC):
+    """One model on one provider, speaking Anthropic Messages API parameters."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+
+    @property
+    @abstractmethod
+    def name(self) -> str:
+        """Label for metrics, e.g. ``anthropic:claude-3-sonnet-20240229``."""
+
+    @abstractmethod
+    async def complete(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        """Return the reply text; ``params["model"]`` is replaced by ``model``."""
+
+    @abstractmethod
+    def stream(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """Yield the reply text incrementally; ``usage`` is filled at the end."""
+
+    async def close(self) -> None:
+        pass
+
+    def _record_usage(
+        self, counts: Dict[str, int], usage: Optional[Dict[str, int]]
+    ) -> None:
+        """Count billed tokens, so cost per model can be derived from metrics."""
+        for field, count in counts.items():
+            metrics.increment(f"ai.provider.{field}", count, provider=self.name)
+        if usage is not None:
+            usage.update(counts)
+
+
+def with_cache_breakpoints(params: Dict[str, Any], min_tokens: int) -> Dict[str, Any]:
+    """Mark the stable prefix of a conversation prompt as cacheable.
+
+    Breakpoints go on the system prompt (the running summary, which changes
+    only every few turns) and on the last two user turns. The marker on the
+    final turn writes the whole prompt to the cache; on the next turn that
+    prefix ends at the previous user turn plus the assistant reply, so it is
+    read back and only the newest turns are processed. Prompts shorter than
+    ``min_tokens`` (~4 characters per token) are left alone, since the
+    provider does not cache them.
+    """
+    if len(json.dumps([params.get("system"), params["messages"]])) // 4 < min_tokens:
+        return params
+    params = dict(params)
+    if params.get("system"):
+        params["system"] = _cached_content(params["system"])
+    messages = list(params["messages"])
+    user_turns = [i for i, msg in enumerate(messages) if msg["role"] == "user"]
+    for i in user_turns[-2:]:
+        messages[i] = {
+            **messages[i],
+            "content": _cached_content(messages[i]["content"]),
+        }
+    params["messages"] = messages
+    return params
+
+
+def _cached_content(content: Any) -> List[Dict[str, Any]]:
+    """Content as blocks, with a cache breakpoint after the last one."""
+    blocks = (
+        [{"type": "text", "text": content}] if isinstance(content, str) else content
+    )
+    return [*blocks[:-1], {**blocks[-1], "cache_control": EPHEMERAL}]
+
+
+def _flatten(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+class AnthropicProvider(LLMProvider):
+    def __init__(
+        self,
+        client: anthropic.AsyncAnthropic,
+        model: str,
+        prompt_caching: Optional[bool] = None,
+    ):
+        super().__init__(model)
+        self.client = client  # Shared with AIService, which closes it
+        self.prompt_caching = (
+            settings.AI_PROMPT_CACHING if prompt_caching is None else prompt_caching
+        )
+
+    @property
+    def name(self) -> str:
+        return f"anthropic:{self.model}"
+
+    def _params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        params = {**params, "model": self.model}
+        if not self.prompt_caching:
+            return params
+        return {
+            **with_cache_breakpoints(params, settings.AI_PROMPT_CACHE_MIN_TOKENS),
+            "extra_headers": {"anthropic-beta": PROMPT_CACHING_BETA},
+        }
+
+    @staticmethod
+    def _counts(usage: anthropic.types.Usage) -> Dict[str, int]:
+        # Cache fields are only present when prompt caching is in use
+        return {field: getattr(usage, field, None) or 0 for field in USAGE_FIELDS}
+
+    async def complete(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        response = await self.client.messages.create(**self._params(params))
+        self._record_usage(self._counts(response.usage), usage)
+        return response.content[0].text
+
+    async def stream(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        async with self.client.messages.stream(**self._params(params)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            message = await stream.get_final_message()
+            self._record_usage(self._counts(message.usage), usage)
+
+
+class OpenAIProvider(LLMProvider):
+    def __init__(self, model: str, client=None):
+        super().__init__(model)
+        if client is None:
+            from openai import AsyncOpenAI
+
+            client = AsyncOpenAI(
+                api_key=settings.OPENAI_API_KEY,
+                timeout=settings.AI_READ_TIMEOUT,
+                max_retries=settings.AI_MAX_RETRIES,
+            )
+        self.client = client
+
+    @property
+    def name(self) -> str:
+        return f"openai:{self.model}"
+
+    def _chat_params(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        messages = [
+            {"role": msg["role"], "content": _flatten(msg["content"])}
+            for msg in params["messages"]
+        ]
+        if params.get("system"):
+            messages.insert(
+                0, {"role": "system", "content": _flatten(params["system"])}
+            )
+        return {
+            "model": self.model,
+            "max_tokens": params["max_tokens"],
+            "messages": messages,
+        }
+
+    async def complete(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        response = await self.client.chat.completions.create(
+            **self._chat_params(params)
+        )
+        if response.usage is not None:
+            counts = {
+                "input_tokens": response.usage.prompt_tokens,
+                "output_tokens": response.usage.completion_tokens,
+            }
+            self._record_usage(counts, usage)
+        return response.choices[0].message.content or ""
+
+    async def stream(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        # Streamed chat completions do not report usage in this API version
+        stream = await self.client.chat.completions.create(
+            **self._chat_params(params), stream=True
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+def create_provider(
+    model: str, anthropic_client: anthropic.AsyncAnthropic
+) -> LLMProvider:
+    """Build the provider serving ``model`` (``gpt-*`` models are OpenAI's)."""
+    if model.startswith("gpt-"):
+        if not settings.OPENAI_API_KEY:
+            raise ValueError(f"Model {model} requires OPENAI_API_KEY")
+        return OpenAIProvider(model)
+    return AnthropicProvider(anthropic_client, model)
+
+
+class ProviderRouter:
+    """Sends requests to providers in order, hedging slow calls and failing over."""
+
+    def __init__(self, providers: List[LLMProvider], hedge: Optional[bool] = None):
+        self.providers = providers
+        self.hedge = settings.AI_HEDGE_ENABLED if hedge is None else hedge
+
+    async def close(self) -> None:
+        for provider in self.providers:
+            await provider.close()
+
+    def _available(self) -> List[LLMProvider]:
+        available = [p for p in self.providers if p.breaker.allow()]
+        for provider in self.providers:
+            if provider not in available:
+                metrics.increment("ai.provider.skipped", provider=provider.name)
+        if not available:
+            raise ProviderUnavailableError("All LLM providers are unavailable")
+        return available
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """Seconds to wait for ``provider`` before sending a hedged request."""
+        delay = provider.latency.quantile(settings.AI_HEDGE_QUANTILE)
+        if delay is None:
+            delay = settings.AI_HEDGE_DEFAULT_DELAY
+        return max(delay, settings.AI_HEDGE_MIN_DELAY)
+
+    async def _call(
+        self,
+        provider: LLMProvider,
+        params: Dict[str, Any],
+        usage: Optional[Dict[str, int]],
+    ) -> str:
+        started = time.perf_counter()
+        try:
+            text = await provider.complete(params, usage)
+        except asyncio.CancelledError:
+            raise  # Lost a hedge race; not the provider's fault
+        except Exception:
+            self._record_failure(provider)
+            raise
+        elapsed = time.perf_counter() - started
+        provider.latency.record(elapsed)
+        self._record_success(provider)
+        metrics.observe("ai.provider.latency_seconds", elapsed, provider=provider.name)
+        return text
+
+    def _record_success(self, provider: LLMProvider) -> None:
+        provider.breaker.record_success()
+        self._report(provider)
+
+    def _record_failure(self, provider: LLMProvider) -> None:
+        provider.breaker.record_failure()
+        metrics.increment("ai.provider.failures", provider=provider.name)
+        self._report(provider)
+
+    @staticmethod
+    def _report(provider: LLMProvider) -> None:
+        metrics.set_gauge(
+            "ai.provider.circuit_open",
+            int(provider.breaker.state != CircuitBreaker.CLOSED),
+            provider=provider.name,
+        )
+
+    async def complete(
+        self,
+        params: Dict[str, Any],
+        usage: Optional[Dict[str, int]] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        tokens: float = 0,
+    ) -> str:
+        """Return the first successful reply among the available providers.
+
+        The caller holds a ``scheduler`` slot for the primary call. A hedged
+        request is a second full-price call, so it is only sent if it can take
+        a slot of its own (and ``tokens`` from the budget) without waiting.
+        """
+        candidates = self._available()
+        tasks: Dict[asyncio.Task, Tuple[LLMProvider, Dict[str, int]]] = {}
+        next_index = 0
+        hedged = False
+        error: Optional[BaseException] = None
+
+        def start(slot_held: bool = False) -> LLMProvider:
+            nonlocal next_index
+            provider = candidates[next_index]
+            next_index += 1
+            # Each call gets its own counts; only the winner's are reported
+            counts: Dict[str, int] = {}
+            task = asyncio.ensure_future(self._call(provider, params, counts))
+            if slot_held:
+                task.add_done_callback(scheduler.release_task)
+            tasks[task] = (provider, counts)
+            return provider
+
+        primary = start()
+        try:
+            while tasks:
+                can_hedge = self.hedge and not hedged and next_index < len(candidates)
+                done, _ = await asyncio.wait(
+                    tasks,
+                    timeout=self.hedge_delay(primary) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedged = True
+                    if scheduler is None:
+                        metrics.increment("ai.hedge.fired", provider=start().name)
+                    elif scheduler.try_acquire(tokens):
+                        provider = start(slot_held=True)
+                        metrics.increment("ai.hedge.fired", provider=provider.name)
+                    else:
+                        metrics.increment(
+                            "ai.hedge.skipped", provider=candidates[next_index].name
+                        )
+                    continue
+
+                for task in done:
+                    provider, counts = tasks.pop(task)
+                    if task.exception() is None:
+                        if hedged:
+                            metrics.increment("ai.hedge.won", provider=provider.name)
+                        if usage is not None:
+                            usage.update(counts)
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"LLM provider {provider.name} failed: {error}")
+
+                if not tasks and next_index < len(candidates):
+                    metrics.increment("ai.failover", provider=start().name)
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def stream(
+        self, params: Dict[str, Any], usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        """Stream from the first available provider, failing over before output.
+
+        Streams are not hedged: once text has been sent to the client it
+        cannot be swapped for another provider's.
+        """
+        candidates = self._available()
+        for index, provider in enumerate(candidates):
+            started = False
+            try:
+                async for text in provider.stream(params, usage):
+                    started = True
+                    yield text
+            except Exception as e:
+                self._record_failure(provider)
+                if started or index == len(candidates) - 1:
+                    raise
+                logger.warning(f"LLM provider {provider.name} failed: {e}")
+                metrics.increment("ai.failover", provider=candidates[index + 1].name)
+                continue
+            self._record_success(provider)
+            return
@@ -0,0 +1,230 @@
+"""
+Admission control for upstream LLM calls.
+
+Every call takes a slot from ``LLMScheduler`` before it is sent. The number of
+slots adapts AIMD-style: it grows by about one per round of successful calls,
+up to ``AI_MAX_CONCURRENCY``, and is cut by ``AI_BACKOFF_FACTOR`` when the
+provider answers 429 or 529, with new calls held back for its ``retry-after``.
+An optional token bucket keeps the estimated tokens per minute under
+``AI_TOKENS_PER_MINUTE``. Waiting calls are admitted by priority, so
+interactive replies go ahead of background work such as summaries.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+# Responses that mean the provider wants us to slow down
+THROTTLE_STATUSES = {429, 529}
+
+
+class Priority(IntEnum):
+    """Admission order when calls have to wait; lower goes first."""
+
+    INTERACTIVE = 0  # A user is waiting on the reply
+    BACKGROUND = 1  # Summaries and other housekeeping
+
+
+class TokenBucket:
+    """Token-per-minute budget, refilled continuously."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens: float) -> float:
+        """Seconds until ``tokens`` can be spent (0 if they can be now)."""
+        self._refill()
+        missing = min(tokens, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.0)
+
+    def spend(self, tokens: float) -> None:
+        self.tokens -= min(tokens, self.capacity)
+
+
+class LLMScheduler:
+    """Bounds, paces and prioritises concurrent LLM calls in one process."""
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        min_concurrency: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        backoff_factor: Optional[float] = None,
+        default_retry_after: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency or settings.AI_MAX_CONCURRENCY
+        self.min_concurrency = min_concurrency or settings.AI_MIN_CONCURRENCY
+        self.backoff_factor = backoff_factor or settings.AI_BACKOFF_FACTOR
+        self.default_retry_after = (
+            default_retry_after or settings.AI_DEFAULT_RETRY_AFTER
+        )
+        if tokens_per_minute is None:
+            tokens_per_minute = settings.AI_TOKENS_PER_MINUTE
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        self.limit = float(self.max_concurrency)
+        self.active = 0
+        self.paused_until = 0.0
+        self._waiters: List[Tuple[int, int, float, asyncio.Future]] = []
+        self._queued: Dict[Priority, int] = {priority: 0 for priority in Priority}
+        self._order = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._report()
+
+    @asynccontextmanager
+    async def slot(
+        self, priority: Priority = Priority.INTERACTIVE, tokens: float = 0
+    ) -> AsyncIterator[None]:
+        """Hold a slot for the duration of one upstream call (or stream)."""
+        started = time.monotonic()
+        await self._acquire(priority, tokens)
+        metrics.observe(
+            "ai.scheduler.wait_seconds",
+            time.monotonic() - started,
+            priority=priority.name.lower(),
+        )
+        try:
+            yield
+        except BaseException as e:
+            self._release(e)
+            raise
+        self._release()
+
+    def try_acquire(self, tokens: float = 0) -> bool:
+        """Take a slot only if one is free right now, without queueing.
+
+        For speculative calls such as hedged requests: they never go ahead of
+        waiting calls, past the token budget, or out while the provider is
+        throttling us. Release with ``release_task`` when the call is done.
+        """
+        if (
+            any(self._queued.values())
+            or self.active >= int(self.limit)
+            or time.monotonic() < self.paused_until
+        ):
+            return False
+        if self.bucket is not None:
+            if self.bucket.delay(tokens) > 0:
+                return False
+            self.bucket.spend(tokens)
+        self.active += 1
+        self._report()
+        return True
+
+    def release_task(self, task: asyncio.Task) -> None:
+        """Done callback for the task holding a slot from ``try_acquire``."""
+        self._release(
+            asyncio.CancelledError() if task.cancelled() else task.exception()
+        )
+
+    def _release(self, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            self._increase()
+        elif isinstance(error, Exception):
+            response = getattr(error, "response", None)
+            if isinstance(response, httpx.Response):
+                self.observe(response)
+        self.active -= 1
+        self._dispatch()
+
+    def observe(self, response: httpx.Response) -> None:
+        """Back off if an upstream response asks us to slow down.
+
+        Installed as a response hook on the shared HTTP client, so it also
+        sees the rate-limited attempts the SDK retries on its own.
+        """
+        if response.status_code not in THROTTLE_STATUSES:
+            return
+        metrics.increment("ai.scheduler.throttled", status=response.status_code)
+        now = time.monotonic()
+        if now >= self.paused_until:
+            # Cut once per throttling episode, not once per rejected call
+            self.limit = max(self.limit * self.backoff_factor, self.min_concurrency)
+        retry_after = _retry_after(response) or self.default_retry_after
+        self.paused_until = max(self.paused_until, now + retry_after)
+        self._report()
+        self._schedule(retry_after)
+
+    def _increase(self) -> None:
+        # Additive increase: about one more slot per round of successful calls
+        self.limit = min(self.limit + 1 / self.limit, self.max_concurrency)
+
+    async def _acquire(self, priority: Priority, tokens: float) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), tokens, future))
+        self._queued[priority] += 1
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.cancelled():
+                self._queued[priority] -= 1
+            else:
+                # Admitted just as the caller went away; hand the slot on
+                self.active -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls, in priority order, while there is room."""
+        while self._waiters:
+            priority, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)  # Cancelled while waiting
+                continue
+            if self.active >= int(self.limit):
+                break
+            delay = self.paused_until - time.monotonic()
+            if delay <= 0 and self.bucket is not None:
+                delay = self.bucket.delay(tokens)
+            if delay > 0:
+                self._schedule(delay)
+                break
+            heapq.heappop(self._waiters)
+            if self.bucket is not None:
+                self.bucket.spend(tokens)
+            self._queued[Priority(priority)] -= 1
+            self.active += 1
+            future.set_result(None)
+        self._report()
+
+    def _schedule(self, delay: float) -> None:
+        """Run ``_dispatch`` again after ``delay``, unless it is due sooner."""
+        loop = asyncio.get_running_loop()
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            if loop.time() < self._wakeup.when() <= loop.time() + delay:
+                return
+            self._wakeup.cancel()
+        self._wakeup = loop.call_later(delay, self._dispatch)
+
+    def _report(self) -> None:
+        for priority, count in self._queued.items():
+            metrics.set_gauge(
+                "ai.scheduler.queue_depth", count, priority=priority.name.lower()
+            )
+        metrics.set_gauge("ai.scheduler.active", self.active)
+        metrics.set_gauge("ai.scheduler.concurrency_limit", int(self.limit))
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["retry-after"])
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,183 @@
+"""
+Bulk message import with COPY.
+
+Records arrive as JSONL, are validated by Pydantic a batch at a time and
+written with asyncpg's ``copy_records_to_table`` on the session's connection,
+so the whole import is one transaction: an invalid record anywhere rolls all
+of it back. Used by ``POST /conversations/{id}/messages:bulk`` and
+``scripts/import_messages.py``.
+"""
+
+import json
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, List, Optional, Union
+
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.conversation import Conversation
+from app.models.message import Message
+from app.schemas.message import MessageImport
+from app.services.embedding_pipeline import embedding_pipeline
+
+COPY_COLUMNS = [
+    "conversation_id",
+    "content",
+    "message_type",
+    "created_at",
+    "message_metadata",
+]
+
+_batch_adapter = TypeAdapter(List[MessageImport])
+
+
+class MessageImportError(ValueError):
+    """A record failed validation; ``line`` is its 1-based line number."""
+
+    def __init__(self, line: int, errors: Union[str, list]):
+        self.line = line
+        self.errors = errors
+        super().__init__(f"Invalid record on line {line}: {errors}")
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream (e.g. a request body) into lines."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+class MessageImportService:
+    def __init__(self, db: AsyncSession, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.BULK_IMPORT_BATCH_SIZE
+
+    async def import_lines(
+        self,
+        conversation_id: int,
+        lines: AsyncIterable[Union[bytes, str]],
+        defer_embeddings: bool = True,
+    ) -> Optional[int]:
+        """Import JSONL records into a conversation; None if it does not exist.
+
+        With ``defer_embeddings`` the messages are left for the worker's
+        embedding sweep; otherwise they are queued on the embedding pipeline
+        once the transaction commits. Nothing is committed here.
+        """
+        # Also starts the transaction the COPYs run in
+        result = await self.db.execute(
+            select(Conversation.id).where(Conversation.id == conversation_id)
+        )
+        if result.first() is None:
+            return None
+
+        copy = _Copy(self.db, conversation_id, assign_ids=not defer_embeddings)
+        started = time.perf_counter()
+        batch: List[bytes] = []
+        line_numbers: List[int] = []
+        line_number = 0
+        async for line in lines:
+            line_number += 1
+            line = line.strip()
+            if not line:
+                continue
+            batch.append(line.encode() if isinstance(line, str) else line)
+            line_numbers.append(line_number)
+            if len(batch) >= self.batch_size:
+                await copy.write(_validate(batch, line_numbers))
+                batch, line_numbers = [], []
+        if batch:
+            await copy.write(_validate(batch, line_numbers))
+
+        # The pipeline's queue is bounded; overflow is picked up by the sweep
+        for message_id in copy.message_ids:
+            embedding_pipeline.submit_on_commit(self.db, message_id)
+
+        metrics.increment("messages.bulk_imported", copy.count)
+        metrics.observe("messages.bulk_import_seconds", time.perf_counter() - started)
+        return copy.count
+
+
+class _Copy:
+    """COPYs validated batches into ``messages`` on the session's connection."""
+
+    def __init__(self, db: AsyncSession, conversation_id: int, assign_ids: bool):
+        self.db = db
+        self.conversation_id = conversation_id
+        self.assign_ids = assign_ids
+        self.imported_at = datetime.now(timezone.utc)
+        self.message_ids: List[int] = []
+        self.count = 0
+
+    async def write(self, records: List[MessageImport]) -> None:
+        rows = [
+            (
+                self.conversation_id,
+                record.content,
+                record.message_type.name,
+                _utc(record.created_at) or self.imported_at,
+                (
+                    None
+                    if record.message_metadata is None
+                    else json.dumps(record.message_metadata)
+                ),
+            )
+            for record in records
+        ]
+        columns = COPY_COLUMNS
+        if self.assign_ids:
+            # COPY cannot return the generated ids, so take them up front
+            ids = await self._next_ids(len(rows))
+            self.message_ids.extend(ids)
+            rows = [(id, *row) for id, row in zip(ids, rows)]
+            columns = ["id", *columns]
+
+        connection = await (await self.db.connection()).get_raw_connection()
+        await connection.driver_connection.copy_records_to_table(
+            Message.__tablename__, columns=columns, records=rows
+        )
+        self.count += len(rows)
+
+    async def _next_ids(self, count: int) -> List[int]:
+        sequence = func.pg_get_serial_sequence(Message.__tablename__, "id")
+        result = await self.db.execute(
+            select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+        )
+        return list(result.scalars())
+
+
+def _validate(lines: List[bytes], line_numbers: List[int]) -> List[MessageImport]:
+    """Validate a batch in one pass, reporting the first bad record's line."""
+    try:
+        return _batch_adapter.validate_json(b"[" + b",".join(lines) + b"]")
+    except ValidationError as e:
+        error = e.errors(include_url=False, include_context=False, include_input=False)[
+            0
+        ]
+        loc = error["loc"]
+        if loc and isinstance(loc[0], int):
+            raise MessageImportError(
+                line_numbers[loc[0]], [{**error, "loc": loc[1:]}]
+            ) from None
+    # Malformed JSON: find the offending line
+    for line, line_number in zip(lines, line_numbers):
+        try:
+            json.loads(line)
+        except ValueError as e:
+            raise MessageImportError(line_number, str(e)) from None
+    raise MessageImportError(line_numbers[0], "Invalid JSON")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
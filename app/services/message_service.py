@@ -1,14 +1,26 @@
-from typing import List, Optional
+import math
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
 
+from sqlalchemy import Integer, Row, cast, column, delete, text, true, update, values
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
 
+from app.core.config import settings
+from app.core.pagination import Page, keyset_page, to_page
 from app.models.conversation import Conversation
 from app.models.message import Message, MessageType
-from app.schemas.message import MessageCreate, MessageUpdate
+from app.schemas.message import MESSAGE_DEFAULT_FIELDS, MessageCreate, MessageUpdate
+from app.services.embedding_pipeline import embedding_pipeline
 
 
 class MessageService:
+    """Message reads and writes.
+
+    Writes are flushed, not committed: the caller owns the transaction (the
+    ``get_db`` dependency commits once per request).
+    """
+
     def __init__(self, db: AsyncSession):
         self.db = db
 
@@ -27,95 +39,202 @@ class MessageService:
             message_metadata=message_data.message_metadata,
         )
 
+        # One INSERT ... RETURNING (see Message's eager_defaults)
         self.db.add(message)
-        await self.db.commit()
-        await self.db.refresh(message)
+        await self.db.flush()
+
+        embedding_pipeline.submit_on_commit(self.db, message.id)
         return message
 
     async def get_conversation_messages(
-        self, conversation_id: int, skip: int = 0, limit: int = 100
-    ) -> List[Message]:
-        """Get all messages for a conversation."""
-        # First check if conversation exists
+        self,
+        conversation_id: int,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        fields: Sequence[str] = MESSAGE_DEFAULT_FIELDS,
+    ) -> Optional[Page[Row]]:
+        """Get a page of a conversation's messages, oldest first.
+
+        Returns None if the conversation does not exist. Only the given fields
+        (plus the id and created_at sort key) are selected.
+        """
+        columns = dict.fromkeys(["id", "created_at", *fields])
+        page = keyset_page(
+            select(*[getattr(Message, name) for name in columns]).where(
+                Message.conversation_id == conversation_id
+            ),
+            Message,
+            limit,
+            cursor,
+            descending=False,
+        ).subquery()
+
+        # One round trip: the page is outer-joined to the conversation row, so
+        # no rows means no conversation and a single all-NULL row an empty page
         result = await self.db.execute(
-            select(Conversation).where(Conversation.id == conversation_id)
+            select(page)
+            .select_from(Conversation)
+            .outerjoin(page, true())
+            .where(Conversation.id == conversation_id)
+            .order_by(page.c.created_at, page.c.id)
         )
-        conversation = result.scalars().first()
+        rows = list(result.all())
+        if not rows:
+            return None
+        return to_page([row for row in rows if row.id is not None], limit)
 
-        if not conversation:
-            return []
+    async def stream_conversation_messages(
+        self, conversation_id: int
+    ) -> AsyncIterator[List[Message]]:
+        """Yield all of a conversation's messages, oldest first, in batches.
 
-        # Get messages
-        result = await self.db.execute(
+        Rows come through a server-side cursor ``MESSAGE_EXPORT_BATCH_SIZE`` at
+        a time, so memory stays flat however long the conversation is.
+        """
+        result = await self.db.stream_scalars(
             select(Message)
             .where(Message.conversation_id == conversation_id)
-            .order_by(Message.created_at)
-            .offset(skip)
-            .limit(limit)
+            .order_by(Message.created_at, Message.id)
+            .options(undefer(Message.message_metadata))
+            .execution_options(yield_per=settings.MESSAGE_EXPORT_BATCH_SIZE)
         )
+        async for messages in result.partitions():
+            yield messages
 
-        # Materialize the results to avoid lazy loading issues
-        messages = list(result.scalars().all())
+    async def get_message_history(self, conversation_id: int) -> List[Dict[str, Any]]:
+        """Get a conversation's messages, oldest first, in prompt-builder form.
 
-        # Debug: Print message types
-        for msg in messages:
-            print(
-                f"Message ID: {msg.id}, "
-                f"Type: {msg.message_type}, "
-                f"Type class: {type(msg.message_type)}"
+        Only the id, type, content and created_at columns are selected, as
+        plain row tuples, so no ORM objects, embeddings or metadata are
+        materialized.
+        """
+        result = await self.db.execute(
+            select(
+                Message.id, Message.message_type, Message.content, Message.created_at
             )
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at, Message.id)
+        )
+        return [
+            {
+                "id": id,
+                "message_type": message_type.value,
+                "content": content,
+                "created_at": created_at,
+            }
+            for id, message_type, content, created_at in result.tuples()
+        ]
+
+    async def search_similar(
+        self,
+        embedding: List[float],
+        k: int = settings.VECTOR_SEARCH_DEFAULT_K,
+        conversation_id: Optional[int] = None,
+    ) -> List[Row]:
+        """Find the k messages nearest to an embedding by cosine distance.
+
+        Rows carry the default message fields (no embedding) and ``distance``.
+        Messages stored with a zero vector (NaN distance) are left out.
+        """
+        # Widen the HNSW candidate list for this transaction to keep recall up
+        await self.db.execute(
+            text(f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_SEARCH_EF_SEARCH)}")
+        )
+
+        distance = Message.embedding.cosine_distance(embedding).label("distance")
+        query = select(
+            *[getattr(Message, name) for name in MESSAGE_DEFAULT_FIELDS], distance
+        ).where(Message.embedding.isnot(None))
+        if conversation_id is not None:
+            # Few rows per conversation: the planner scans them exactly instead
+            query = query.where(Message.conversation_id == conversation_id)
 
-        return messages
+        result = await self.db.execute(query.order_by(distance).limit(k))
+        return [row for row in result.all() if math.isfinite(row.distance)]
 
     async def get_message(self, message_id: int) -> Optional[Message]:
         """Get a specific message by ID."""
         result = await self.db.execute(select(Message).where(Message.id == message_id))
         return result.scalars().first()
 
+    async def get_message_fields(
+        self, message_id: int, fields: Sequence[str] = MESSAGE_DEFAULT_FIELDS
+    ) -> Optional[Row]:
+        """Get only the given fields of a message."""
+        result = await self.db.execute(
+            select(*[getattr(Message, name) for name in fields]).where(
+                Message.id == message_id
+            )
+        )
+        return result.first()
+
     async def update_message(
         self, message_id: int, message_data: MessageUpdate
     ) -> Optional[Message]:
-        """Update a message."""
-        result = await self.db.execute(select(Message).where(Message.id == message_id))
-        message = result.scalars().first()
-
-        if not message:
-            return None
-
-        # Update fields if provided
-        if message_data.content is not None:
-            message.content = message_data.content
+        """Update a message with a single UPDATE ... RETURNING."""
+        changes = message_data.model_dump(exclude_none=True)
+        if not changes:
+            result = await self.db.execute(
+                select(Message)
+                .where(Message.id == message_id)
+                .options(undefer(Message.message_metadata))
+            )
+            return result.scalars().first()
 
-        if message_data.message_metadata is not None:
-            message.message_metadata = message_data.message_metadata
+        result = await self.db.execute(
+            update(Message)
+            .where(Message.id == message_id)
+            .values(**changes)
+            .returning(Message)
+            .options(undefer(Message.message_metadata))
+            .execution_options(populate_existing=True)
+        )
+        message = result.scalars().first()
 
-        await self.db.commit()
-        await self.db.refresh(message)
+        # Re-embed edited content
+        if message is not None and "content" in changes:
+            embedding_pipeline.submit_on_commit(self.db, message.id)
         return message
 
-    async def update_message_embedding(
-        self, message_id: int, embedding: List[float]
-    ) -> Optional[Message]:
-        """Update a message's embedding."""
-        result = await self.db.execute(select(Message).where(Message.id == message_id))
-        message = result.scalars().first()
-
-        if not message:
-            return None
+    async def get_message_contents(self, message_ids: List[int]) -> Dict[int, str]:
+        """Get the content of each existing message, keyed by ID."""
+        result = await self.db.execute(
+            select(Message.id, Message.content).where(Message.id.in_(message_ids))
+        )
+        return dict(result.tuples().all())
 
-        message.embedding = embedding
-        await self.db.commit()
-        await self.db.refresh(message)
-        return message
+    async def get_unembedded_message_ids(self, limit: int) -> List[int]:
+        """Get IDs of messages that have no embedding yet, oldest first."""
+        result = await self.db.execute(
+            select(Message.id)
+            .where(Message.embedding.is_(None))
+            .order_by(Message.id)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    async def update_message_embeddings(
+        self, embeddings: Dict[int, List[float]]
+    ) -> int:
+        """Store many embeddings with a single UPDATE ... FROM (VALUES ...)."""
+        if not embeddings:
+            return 0
+
+        vector_type = Message.embedding.type
+        rows = values(
+            column("id", Integer), column("embedding", vector_type), name="v"
+        ).data(list(embeddings.items()))
+        result = await self.db.execute(
+            update(Message)
+            .where(Message.id == rows.c.id)
+            .values(embedding=cast(rows.c.embedding, vector_type))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
 
     async def delete_message(self, message_id: int) -> bool:
         """Delete a message."""
-        result = await self.db.execute(select(Message).where(Message.id == message_id))
-        message = result.scalars().first()
-
-        if not message:
-            return False
-
-        await self.db.delete(message)
-        await self.db.commit()
-        return True
+        result = await self.db.execute(
+            delete(Message).where(Message.id == message_id).returning(Message.id)
+        )
+        return result.first() is not None
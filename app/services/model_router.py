@@ -0,0 +1,73 @@
+"""
+Complexity-based model routing.
+
+Each turn is classified locally, without a model call, and sent to the model
+of its tier in ``AI_MODEL_TIERS``. Keyword rules (``AI_ROUTING_KEYWORDS``)
+are checked first against the latest user turn; otherwise a short turn in a
+short conversation is ``simple`` and anything else is ``complex``.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+
+    def reply_metadata(self, usage: Optional[Dict[str, int]] = None) -> Dict[str, Any]:
+        """The reply's ``message_metadata``, with the call's token usage if any."""
+        metadata: Dict[str, Any] = {"model_tier": self.name, "model": self.model}
+        if usage:
+            metadata["usage"] = usage
+        return metadata
+
+
+class ModelRouter:
+    """Picks a model tier for each turn from cheap, local signals."""
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, str]] = None,
+        keywords: Optional[Dict[str, str]] = None,
+        simple_max_chars: Optional[int] = None,
+        simple_max_history: Optional[int] = None,
+    ):
+        self.tiers = tiers or settings.AI_MODEL_TIERS
+        for tier in ("simple", "complex"):
+            if tier not in self.tiers:
+                raise ValueError(f"AI_MODEL_TIERS needs a {tier!r} tier")
+        keywords = settings.AI_ROUTING_KEYWORDS if keywords is None else keywords
+        unknown = set(keywords.values()) - set(self.tiers)
+        if unknown:
+            raise ValueError(f"AI_ROUTING_KEYWORDS uses unknown tiers: {unknown}")
+        self.keyword_rules: List[Tuple[re.Pattern, str]] = [
+            (re.compile(rf"\b{re.escape(keyword)}\b", re.IGNORECASE), tier)
+            for keyword, tier in keywords.items()
+        ]
+        self.simple_max_chars = simple_max_chars or settings.AI_ROUTING_SIMPLE_MAX_CHARS
+        self.simple_max_history = (
+            simple_max_history or settings.AI_ROUTING_SIMPLE_MAX_HISTORY
+        )
+
+    def classify(self, message_history: List[Dict[str, Any]]) -> Tuple[str, str]:
+        """Return (tier name, reason) for the latest turn of a conversation."""
+        latest = message_history[-1]["content"] if message_history else ""
+        for pattern, tier in self.keyword_rules:
+            if pattern.search(latest):
+                return tier, "keyword"
+        if len(latest) > self.simple_max_chars:
+            return "complex", "length"
+        if len(message_history) > self.simple_max_history:
+            return "complex", "history"
+        return "simple", "short"
+
+    def choose(self, message_history: List[Dict[str, Any]]) -> ModelTier:
+        tier, reason = self.classify(message_history)
+        metrics.increment("ai.routing.turns", tier=tier, reason=reason)
+        return ModelTier(tier, self.tiers[tier])
@@ -0,0 +1,89 @@
+import time
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.message import Message, MessageType
+from app.schemas.message import MessageCreate
+from app.services.ai_service import AIService
+from app.services.context_builder import ContextBuilder
+from app.services.conversation_lock import conversation_locks
+from app.services.message_service import MessageService
+from app.services.response_cache import ResponseCacheService
+
+
+class ReplyService:
+    """Generates and stores the AI reply to a conversation's latest turn."""
+
+    def __init__(self, db: AsyncSession, ai_service: AIService):
+        self.db = db
+        self.ai_service = ai_service
+
+    async def generate_reply(
+        self, conversation_id: int, fallback_on_error: bool = True
+    ) -> Optional[Message]:
+        """Reply to the latest user message in a conversation.
+
+        Returns None if the conversation is gone or its latest message is not
+        from the user (e.g. a retried job that already replied). With
+        ``fallback_on_error=False`` upstream errors propagate so the caller
+        can retry; otherwise an apology is stored as the reply. Replies to
+        one conversation are generated one at a time (see ``conversation_lock``).
+
+        No transaction is held across an LLM call: the history is read and
+        the reply written in short transactions either side of it.
+        """
+        async with conversation_locks.hold(conversation_id):
+            reply = await self._generate_reply(conversation_id, fallback_on_error)
+            # Visible before the next reply to this conversation starts
+            await self.db.commit()
+            return reply
+
+    async def _generate_reply(
+        self, conversation_id: int, fallback_on_error: bool
+    ) -> Optional[Message]:
+        message_service = MessageService(self.db)
+        message_history = await message_service.get_message_history(conversation_id)
+        if not message_history:
+            return None
+        if message_history[-1]["message_type"] != MessageType.USER.value:
+            return None
+        await self.db.commit()
+
+        context = await ContextBuilder(self.ai_service).build(
+            conversation_id, message_history
+        )
+
+        tier = self.ai_service.choose_tier(context.messages)
+        response_cache = ResponseCacheService(self.db, self.ai_service)
+        cached = await response_cache.lookup(context, tier, "worker")
+        await self.db.commit()
+        if cached is not None:
+            ai_response = cached.response
+            metadata = cached.reply_metadata()
+        else:
+            generate = (
+                self.ai_service.generate_response
+                if fallback_on_error
+                else self.ai_service.complete
+            )
+            usage = {}
+            started = time.perf_counter()
+            ai_response = await generate(
+                context.messages, system=context.system_prompt, tier=tier, usage=usage
+            )
+            # Before the reply's INSERT, whose conversation row lock is then
+            # only held until the commit, not across the prompt's embedding
+            await response_cache.store(
+                context, tier, ai_response, time.perf_counter() - started
+            )
+            metadata = tier.reply_metadata(usage)
+
+        return await message_service.create_message(
+            MessageCreate(
+                content=ai_response,
+                message_type="ai",
+                conversation_id=conversation_id,
+                message_metadata=metadata,
+            )
+        )
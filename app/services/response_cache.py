@@ -0,0 +1,174 @@
+"""
+Semantic response cache.
+
+Reuses a stored AI reply when a new prompt is close enough to one already
+answered. Only short conversations qualify: the final user turn is embedded,
+and the turns before it (plus any summary) are reduced to a fingerprint that
+must match exactly, so an answer is never reused in a different context.
+Entries are scoped to the model of the turn's routed tier and to the embedding
+model, so changing either (or the tier a turn is routed to) misses, and they
+expire after ``RESPONSE_CACHE_TTL``.
+"""
+
+import json
+import logging
+import math
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from hashlib import sha256
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, func, insert, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.response_cache import CachedResponse
+from app.services.ai_service import FALLBACK_RESPONSE, AIService
+from app.services.context_builder import ContextWindow
+from app.services.embedding_cache import normalize_text
+from app.services.model_router import ModelTier
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedReply:
+    response: str
+    similarity: float
+    seconds_saved: float
+
+    def reply_metadata(self) -> Dict[str, Any]:
+        """The reply's ``message_metadata``: no model was called for it."""
+        return {"response_cache": {"similarity": round(self.similarity, 4)}}
+
+
+def context_fingerprint(context: ContextWindow) -> str:
+    """Hash of everything in the prompt except the final user turn."""
+    preceding = [
+        [msg["message_type"], normalize_text(msg["content"])]
+        for msg in context.messages[:-1]
+    ]
+    return sha256(json.dumps([context.system_prompt, preceding]).encode()).hexdigest()
+
+
+class ResponseCacheService:
+    """Looks up and stores AI replies in the ``response_cache`` table."""
+
+    def __init__(self, db: AsyncSession, ai_service: AIService):
+        self.db = db
+        self.ai_service = ai_service
+
+    @staticmethod
+    def eligible(context: ContextWindow) -> bool:
+        return (
+            settings.ENABLE_RESPONSE_CACHE
+            and context.summary is None
+            and len(context.messages) - 1
+            <= settings.RESPONSE_CACHE_MAX_CONTEXT_MESSAGES
+        )
+
+    async def lookup(
+        self, context: ContextWindow, tier: ModelTier, route: str
+    ) -> Optional[CachedReply]:
+        """Find the nearest prompt answered by ``tier``'s model above the threshold."""
+        if not self.eligible(context):
+            return None
+
+        started = time.perf_counter()
+        try:
+            # A savepoint, so a failure leaves the caller's transaction usable
+            async with self.db.begin_nested():
+                nearest = await self._nearest(context, tier)
+        except Exception:
+            # The cache is an optimization; fall back to generating
+            logger.warning("Response cache lookup failed", exc_info=True)
+            nearest = None
+        elapsed = time.perf_counter() - started
+        metrics.observe("response_cache.lookup_seconds", elapsed, route=route)
+
+        # A zero vector on either side makes the distance NaN: never a hit
+        similarity = 0.0
+        if nearest is not None and math.isfinite(nearest.distance):
+            similarity = 1 - nearest.distance
+        if similarity < settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD:
+            metrics.increment("response_cache.misses", route=route)
+            return None
+
+        seconds_saved = max(nearest.generation_seconds - elapsed, 0.0)
+        metrics.increment("response_cache.hits", route=route)
+        metrics.increment("response_cache.seconds_saved", seconds_saved, route=route)
+        return CachedReply(nearest.response, similarity, seconds_saved)
+
+    async def store(
+        self,
+        context: ContextWindow,
+        tier: ModelTier,
+        response: str,
+        generation_seconds: float,
+    ) -> None:
+        """Cache a reply freshly generated by ``tier`` (error fallbacks are skipped)."""
+        if not self.eligible(context) or response == FALLBACK_RESPONSE:
+            return
+
+        prompt = context.messages[-1]["content"]
+        try:
+            embedding = await self.ai_service.generate_embedding(prompt)
+            if embedding is None or not any(embedding):
+                # A zero vector has no direction to match later prompts by
+                return
+            # Committed with the caller's transaction; a failed write only
+            # rolls back its savepoint
+            async with self.db.begin_nested():
+                await self.db.execute(
+                    insert(CachedResponse).values(
+                        model=tier.model,
+                        embedding_model=self.ai_service.embedding_backend.model_id,
+                        context_fingerprint=context_fingerprint(context),
+                        prompt=prompt,
+                        embedding=embedding,
+                        response=response,
+                        generation_seconds=generation_seconds,
+                    )
+                )
+        except Exception:
+            logger.warning("Response cache write failed", exc_info=True)
+
+    async def evict_expired(self, ttl: float = settings.RESPONSE_CACHE_TTL) -> int:
+        """Delete entries created more than ``ttl`` seconds ago."""
+        result = await self.db.execute(
+            delete(CachedResponse).where(
+                CachedResponse.created_at < func.now() - timedelta(seconds=ttl)
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
+
+    async def _nearest(self, context: ContextWindow, tier: ModelTier):
+        embedding = await self.ai_service.generate_embedding(
+            context.messages[-1]["content"]
+        )
+        if embedding is None:
+            return None
+
+        # Widen the HNSW candidate list, since the filters are applied after it
+        await self.db.execute(
+            text(f"SET LOCAL hnsw.ef_search = {int(settings.VECTOR_SEARCH_EF_SEARCH)}")
+        )
+        distance = CachedResponse.embedding.cosine_distance(embedding).label("distance")
+        result = await self.db.execute(
+            select(CachedResponse.response, CachedResponse.generation_seconds, distance)
+            .where(
+                CachedResponse.model == tier.model,
+                CachedResponse.embedding_model
+                == self.ai_service.embedding_backend.model_id,
+                CachedResponse.context_fingerprint == context_fingerprint(context),
+                CachedResponse.created_at
+                > func.now() - timedelta(seconds=settings.RESPONSE_CACHE_TTL),
+            )
+            .order_by(distance)
+            .limit(1)
+        )
+        return result.first()
@@ -0,0 +1,218 @@
+"""
+Single-flight coalescing of identical LLM requests.
+
+Concurrent calls with the same request key share one upstream call: within a
+process they await the same task. With ``AI_SINGLE_FLIGHT_SHARED`` the
+``llm_requests`` table extends this across workers. The first worker to
+insert a key makes the call and stores the response; the others poll for it
+instead of sending a duplicate, and fall back to calling upstream themselves
+if that worker fails or its claim expires. Only calls still in flight are
+shared: a stored response is there for the waiters to read, and the next
+identical request claims the key again and makes its own call.
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import timedelta
+from hashlib import sha256
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+from sqlalchemy import delete, func, literal_column, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.models.llm_request import LLMRequest, LLMRequestStatus
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _normalize(content: Any) -> Any:
+    return " ".join(content.split()) if isinstance(content, str) else content
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Hash of model, parameters and messages, ignoring whitespace differences."""
+    normalized = {
+        **params,
+        "messages": [
+            {**msg, "content": _normalize(msg["content"])} for msg in params["messages"]
+        ],
+    }
+    return sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; other callers share its result."""
+
+    def __init__(self):
+        self.flights: Dict[str, _Flight] = {}
+
+    async def do(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        else:
+            metrics.increment("ai.single_flight.coalesced", scope="process")
+
+        # Shielded, so one caller going away does not cancel the call for all
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+
+
+class LLMRequestService:
+    """Claims, completes and polls rows in the ``llm_requests`` table."""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def claim(self, key: str, ttl: float) -> bool:
+        """Claim a key unless another worker's call for it is still in flight."""
+        expired = LLMRequest.created_at < func.now() - timedelta(seconds=ttl)
+        finished = LLMRequest.status == LLMRequestStatus.DONE
+        result = await self.db.execute(
+            insert(LLMRequest)
+            .values(key=key, status=LLMRequestStatus.PENDING)
+            .on_conflict_do_update(
+                index_elements=["key"],
+                set_={
+                    "status": LLMRequestStatus.PENDING,
+                    "response": None,
+                    "created_at": func.now(),
+                    "completed_at": None,
+                },
+                where=expired | finished,
+            )
+            .returning(literal_column("1"))
+        )
+        await self.db.commit()
+        return result.first() is not None
+
+    async def get(self, key: str, ttl: float) -> Optional[Row]:
+        """Return (status, response, expired) for a key, or None if released."""
+        expired = LLMRequest.created_at < func.now() - timedelta(seconds=ttl)
+        result = await self.db.execute(
+            select(
+                LLMRequest.status, LLMRequest.response, expired.label("expired")
+            ).where(LLMRequest.key == key)
+        )
+        return result.first()
+
+    async def complete(self, key: str, response: str) -> None:
+        await self.db.execute(
+            update(LLMRequest)
+            .where(LLMRequest.key == key)
+            .values(
+                status=LLMRequestStatus.DONE,
+                response=response,
+                completed_at=func.now(),
+            )
+        )
+        await self.db.commit()
+
+    async def release(self, key: str) -> None:
+        """Drop a failed claim so waiting workers stop waiting."""
+        await self.db.execute(delete(LLMRequest).where(LLMRequest.key == key))
+        await self.db.commit()
+
+    async def evict_expired(self, ttl: float, grace: float) -> int:
+        """Delete expired claims and responses completed over ``grace`` ago."""
+        result = await self.db.execute(
+            delete(LLMRequest).where(
+                (LLMRequest.created_at < func.now() - timedelta(seconds=ttl))
+                | (LLMRequest.completed_at < func.now() - timedelta(seconds=grace))
+            )
+        )
+        await self.db.commit()
+        return result.rowcount
+
+
+async def shared_call(
+    key: str,
+    call: Callable[[], Awaitable[str]],
+    ttl: float = settings.AI_SINGLE_FLIGHT_SHARED_TTL,
+    poll_interval: float = settings.AI_SINGLE_FLIGHT_POLL_INTERVAL,
+    session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+) -> str:
+    """Make ``call`` once across workers for ``key``.
+
+    No database connection is held while the call or the wait is in progress.
+    """
+    try:
+        async with session_factory() as session:
+            leader = await LLMRequestService(session).claim(key, ttl)
+    except Exception:
+        logger.warning("Single-flight claim failed", exc_info=True)
+        return await call()
+
+    if not leader:
+        response = await _wait_for_response(key, ttl, poll_interval, session_factory)
+        if response is not None:
+            metrics.increment("ai.single_flight.coalesced", scope="shared")
+            return response
+        # The claiming worker failed or timed out
+        return await call()
+
+    try:
+        response = await call()
+    except BaseException:
+        await _finish(session_factory, key, None)
+        raise
+    await _finish(session_factory, key, response)
+    return response
+
+
+async def _wait_for_response(
+    key: str,
+    ttl: float,
+    poll_interval: float,
+    session_factory: Callable[[], AsyncSession],
+) -> Optional[str]:
+    while True:
+        await asyncio.sleep(poll_interval)
+        async with session_factory() as session:
+            row = await LLMRequestService(session).get(key, ttl)
+        if row is None or row.expired:
+            return None
+        if row.status == LLMRequestStatus.DONE:
+            return row.response
+
+
+async def _finish(
+    session_factory: Callable[[], AsyncSession], key: str, response: Optional[str]
+) -> None:
+    """Publish the response, or release the claim if the call failed."""
+    try:
+        async with session_factory() as session:
+            service = LLMRequestService(session)
+            if response is None:
+                await service.release(key)
+            else:
+                await service.complete(key, response)
+    except Exception:
+        logger.warning("Single-flight update failed", exc_info=True)
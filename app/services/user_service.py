@@ -16,7 +16,7 @@ class UserService:
             password=user_data.password,
         )
         self.session.add(user)
-        await self.session.commit()
+        await self.session.flush()
         return user
 
     async def get_user_by_email(self, email: str) -> User | None:
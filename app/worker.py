@@ -0,0 +1,224 @@
+"""
+Background job worker.
+
+Claims queued jobs from the ``jobs`` table and runs them with bounded
+concurrency. Run one or more per machine, independently of the API nodes:
+
+    python -m app.worker --concurrency 8
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal, engine
+from app.models.job import Job, JobType
+from app.services.ai_service import close_ai_service, get_ai_service
+from app.services.embedding_pipeline import embedding_pipeline
+from app.services.idempotency_service import IdempotencyService
+from app.services.job_service import JOB_NOTIFY_CHANNEL, JobService
+from app.services.reply_service import ReplyService
+from app.services.response_cache import ResponseCacheService
+from app.services.single_flight import LLMRequestService
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, Job], Awaitable[None]]
+
+
+async def handle_ai_response(session: AsyncSession, job: Job) -> None:
+    """Generate and store the AI reply for the job's conversation."""
+    # Store an apology rather than raising once the last attempt is reached
+    final_attempt = job.attempts >= job.max_attempts
+    await ReplyService(session, get_ai_service()).generate_reply(
+        job.conversation_id, fallback_on_error=final_attempt
+    )
+
+
+JOB_HANDLERS: Dict[JobType, JobHandler] = {
+    JobType.AI_RESPONSE: handle_ai_response,
+}
+
+
+class Worker:
+    """Polls the job queue and runs up to ``concurrency`` jobs at once."""
+
+    def __init__(
+        self,
+        concurrency: int = settings.JOB_WORKER_CONCURRENCY,
+        poll_interval: float = settings.JOB_POLL_INTERVAL,
+        worker_id: Optional[str] = None,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.active: Set[asyncio.Task] = set()
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        logger.info(
+            f"Worker {self.worker_id} started with concurrency {self.concurrency}"
+        )
+        async with engine.connect() as listen_conn:
+            await self._listen(listen_conn)
+            await self._requeue_stale()
+            last_stale_check = asyncio.get_running_loop().time()
+
+            while not self.stopping.is_set():
+                free_slots = self.concurrency - len(self.active)
+                claimed = 0
+                if free_slots > 0:
+                    async with AsyncSessionLocal() as session:
+                        jobs = await JobService(session).claim(
+                            self.worker_id, free_slots
+                        )
+                    claimed = len(jobs)
+                    for job in jobs:
+                        task = asyncio.create_task(self._run_job(job))
+                        self.active.add(task)
+                        task.add_done_callback(self._job_done)
+
+                metrics.set_gauge("jobs.active", len(self.active))
+
+                now = asyncio.get_running_loop().time()
+                if now - last_stale_check > settings.JOB_STALE_TIMEOUT / 2:
+                    await self._requeue_stale()
+                    await self._evict_expired()
+                    last_stale_check = now
+
+                # Keep claiming while there is both work and capacity
+                if claimed and claimed == free_slots:
+                    continue
+                await self._wait_for_work()
+
+        if self.active:
+            logger.info(f"Waiting for {len(self.active)} running jobs to finish")
+            await asyncio.gather(*self.active, return_exceptions=True)
+
+    def stop(self) -> None:
+        self.stopping.set()
+        self.wakeup.set()
+
+    async def _listen(self, conn) -> None:
+        """Wake up on NOTIFY from JobService.enqueue instead of waiting a poll."""
+        raw_conn = await conn.get_raw_connection()
+        await raw_conn.driver_connection.add_listener(
+            JOB_NOTIFY_CHANNEL, lambda *args: self.wakeup.set()
+        )
+
+    async def _wait_for_work(self) -> None:
+        # Debounced jobs are enqueued ahead of time; wake up when one is due
+        async with AsyncSessionLocal() as session:
+            due_in = await JobService(session).next_due_in()
+        timeout = self.poll_interval if due_in is None else due_in
+        try:
+            await asyncio.wait_for(
+                self.wakeup.wait(), timeout=min(timeout, self.poll_interval)
+            )
+        except asyncio.TimeoutError:
+            pass
+        self.wakeup.clear()
+
+    def _job_done(self, task: asyncio.Task) -> None:
+        self.active.discard(task)
+        # A slot is free again
+        self.wakeup.set()
+
+    async def _requeue_stale(self) -> None:
+        async with AsyncSessionLocal() as session:
+            requeued = await JobService(session).requeue_stale()
+        if requeued:
+            logger.warning(f"Requeued {requeued} stale jobs")
+
+    async def _evict_expired(self) -> None:
+        """Delete expired cache entries, single-flight records and idempotency keys."""
+        async with AsyncSessionLocal() as session:
+            await IdempotencyService(session).evict_expired()
+            if settings.ENABLE_RESPONSE_CACHE:
+                evicted = await ResponseCacheService(
+                    session, get_ai_service()
+                ).evict_expired()
+                metrics.increment("response_cache.evicted", evicted)
+            if settings.AI_SINGLE_FLIGHT_SHARED:
+                await LLMRequestService(session).evict_expired(
+                    settings.AI_SINGLE_FLIGHT_SHARED_TTL,
+                    settings.AI_SINGLE_FLIGHT_RESULT_GRACE,
+                )
+
+    async def _heartbeat(self, job: Job) -> None:
+        """Keep a running job from being requeued as stale, however long it runs."""
+        while True:
+            await asyncio.sleep(settings.JOB_HEARTBEAT_INTERVAL)
+            try:
+                async with AsyncSessionLocal() as session:
+                    if not await JobService(session).heartbeat(job.id, self.worker_id):
+                        logger.warning(
+                            f"Job {job.id} is no longer locked by this worker"
+                        )
+                        return
+            except Exception:
+                logger.exception(f"Heartbeat for job {job.id} failed")
+
+    async def _run_job(self, job: Job) -> None:
+        handler = JOB_HANDLERS[job.job_type]
+        started = asyncio.get_running_loop().time()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            async with AsyncSessionLocal() as session:
+                await handler(session, job)
+                await session.commit()
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.job_type.value}) failed")
+            metrics.increment("jobs.failed", job_type=job.job_type.value)
+            async with AsyncSessionLocal() as session:
+                await JobService(session).fail(job, str(e))
+            return
+        finally:
+            heartbeat.cancel()
+
+        async with AsyncSessionLocal() as session:
+            await JobService(session).complete(job.id)
+        metrics.increment("jobs.succeeded", job_type=job.job_type.value)
+        metrics.observe(
+            "jobs.duration_seconds",
+            asyncio.get_running_loop().time() - started,
+            job_type=job.job_type.value,
+        )
+
+
+async def main(concurrency: int) -> None:
+    worker = Worker(concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+    # The worker also backfills embeddings for messages that were missed
+    await embedding_pipeline.start(sweep=True)
+    try:
+        await worker.run()
+    finally:
+        await embedding_pipeline.stop()
+        await close_ai_service()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the background job worker.")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=settings.JOB_WORKER_CONCURRENCY,
+        help="Maximum number of jobs to run at once",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    asyncio.run(main(args.concurrency))
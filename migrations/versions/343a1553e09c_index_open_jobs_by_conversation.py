@@ -0,0 +1,27 @@
+"""index open jobs by conversation
+
+Revision ID: 343a1553e09c
+Revises: ebb8229a41ee
+Create Date: 2026-10-18 10:55:20.920574
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '343a1553e09c'
+down_revision: Union[str, None] = 'ebb8229a41ee'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_jobs_open_conversation_id', 'jobs', ['conversation_id'], unique=False,
+                    postgresql_where=sa.text("status IN ('QUEUED', 'RUNNING')"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_open_conversation_id', table_name='jobs')
@@ -0,0 +1,27 @@
+"""index messages missing embeddings
+
+Revision ID: 3ea929d274c0
+Revises: a136566e7a74
+Create Date: 2026-10-18 10:29:21.493969
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3ea929d274c0'
+down_revision: Union[str, None] = 'a136566e7a74'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_messages_unembedded_id', 'messages', ['id'], unique=False,
+                    postgresql_where=sa.text('embedding IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_unembedded_id', table_name='messages')
@@ -0,0 +1,41 @@
+"""add summary message created at
+
+Revision ID: 4b8d2e6f1a93
+Revises: 9e1c4a7f20b3
+Create Date: 2026-10-18 16:42:11.305218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b8d2e6f1a93'
+down_revision: Union[str, None] = '9e1c4a7f20b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('summary_message_created_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing marks were compared by id: take the folded message's
+    # timestamp, or the latest one at or below the mark if it was deleted
+    op.execute(
+        """
+        UPDATE conversations
+        SET summary_message_created_at = (
+            SELECT messages.created_at FROM messages
+            WHERE messages.conversation_id = conversations.id
+              AND messages.id <= conversations.summary_message_id
+            ORDER BY messages.id DESC
+            LIMIT 1
+        )
+        WHERE summary_message_id IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'summary_message_created_at')
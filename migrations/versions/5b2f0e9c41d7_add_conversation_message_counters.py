@@ -0,0 +1,118 @@
+"""add conversation message counters
+
+Revision ID: 5b2f0e9c41d7
+Revises: 343a1553e09c
+Create Date: 2026-10-18 13:02:47.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2f0e9c41d7'
+down_revision: Union[str, None] = '343a1553e09c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Recomputes the latest message of the conversation being updated
+# (a backward scan of ix_messages_conversation_id_created_at_id)
+LATEST_MESSAGE = '''
+    (last_message_id, last_message_at, last_message_preview) = (
+        SELECT m.id, m.created_at, left(m.content, 200)
+        FROM messages m
+        WHERE m.conversation_id = c.id
+        ORDER BY m.created_at DESC, m.id DESC
+        LIMIT 1
+    )
+'''
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('conversations', sa.Column('last_message_id', sa.Integer(), nullable=True))
+    op.add_column('conversations', sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('conversations', sa.Column('last_message_preview', sa.Text(), nullable=True))
+
+    op.execute(f'''
+        UPDATE conversations c
+        SET message_count = s.messages,
+            {LATEST_MESSAGE}
+        FROM (SELECT conversation_id, count(*) AS messages FROM messages GROUP BY conversation_id) s
+        WHERE c.id = s.conversation_id
+    ''')
+
+    # Statement-level, so a COPY or multi-row INSERT updates each conversation
+    # once rather than once per message
+    op.execute(f'''
+        CREATE FUNCTION conversations_count_inserted_messages() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE conversations c
+            SET message_count = c.message_count + s.messages,
+                {LATEST_MESSAGE}
+            FROM (SELECT conversation_id, count(*) AS messages FROM inserted GROUP BY conversation_id) s
+            WHERE c.id = s.conversation_id;
+            RETURN NULL;
+        END
+        $$
+    ''')
+    op.execute(f'''
+        CREATE FUNCTION conversations_count_deleted_messages() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE conversations c
+            SET message_count = c.message_count - s.messages,
+                {LATEST_MESSAGE}
+            FROM (SELECT conversation_id, count(*) AS messages FROM deleted GROUP BY conversation_id) s
+            WHERE c.id = s.conversation_id;
+            RETURN NULL;
+        END
+        $$
+    ''')
+    # Row-level with a column list, so embedding updates never fire it
+    op.execute('''
+        CREATE FUNCTION conversations_refresh_message_preview() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            UPDATE conversations
+            SET last_message_preview = left(NEW.content, 200)
+            WHERE id = NEW.conversation_id AND last_message_id = NEW.id;
+            RETURN NULL;
+        END
+        $$
+    ''')
+    op.execute('''
+        CREATE TRIGGER messages_count_inserted AFTER INSERT ON messages
+        REFERENCING NEW TABLE AS inserted
+        FOR EACH STATEMENT EXECUTE FUNCTION conversations_count_inserted_messages()
+    ''')
+    op.execute('''
+        CREATE TRIGGER messages_count_deleted AFTER DELETE ON messages
+        REFERENCING OLD TABLE AS deleted
+        FOR EACH STATEMENT EXECUTE FUNCTION conversations_count_deleted_messages()
+    ''')
+    op.execute('''
+        CREATE TRIGGER messages_refresh_preview AFTER UPDATE OF content ON messages
+        FOR EACH ROW WHEN (OLD.content IS DISTINCT FROM NEW.content)
+        EXECUTE FUNCTION conversations_refresh_message_preview()
+    ''')
+
+    op.create_index('ix_conversations_last_activity_at_id', 'conversations',
+                    [sa.text('coalesce(last_message_at, created_at)'), 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_last_activity_at_id', table_name='conversations')
+    op.execute('DROP TRIGGER messages_refresh_preview ON messages')
+    op.execute('DROP TRIGGER messages_count_deleted ON messages')
+    op.execute('DROP TRIGGER messages_count_inserted ON messages')
+    op.execute('DROP FUNCTION conversations_refresh_message_preview()')
+    op.execute('DROP FUNCTION conversations_count_deleted_messages()')
+    op.execute('DROP FUNCTION conversations_count_inserted_messages()')
+    op.drop_column('conversations', 'last_message_preview')
+    op.drop_column('conversations', 'last_message_at')
+    op.drop_column('conversations', 'last_message_id')
+    op.drop_column('conversations', 'message_count')
@@ -0,0 +1,35 @@
+"""add llm requests
+
+Revision ID: 7f3255b5d7e6
+Revises: d64ac81f972b
+Create Date: 2026-10-18 10:39:33.075526
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7f3255b5d7e6'
+down_revision: Union[str, None] = 'd64ac81f972b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('llm_requests',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'DONE', name='llmrequeststatus'), nullable=False),
+    sa.Column('response', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_llm_requests_created_at', 'llm_requests', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_llm_requests_created_at', table_name='llm_requests')
+    op.drop_table('llm_requests')
+    sa.Enum(name='llmrequeststatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,35 @@
+"""add embedding cache
+
+Revision ID: 8d32b5ec6085
+Revises: 3ea929d274c0
+Create Date: 2026-10-18 10:34:51.166616
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d32b5ec6085'
+down_revision: Union[str, None] = '3ea929d274c0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('embedding_cache',
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('embedding', Vector(dim=1536), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_embedding_cache_created_at', 'embedding_cache', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_embedding_cache_created_at', table_name='embedding_cache')
+    op.drop_table('embedding_cache')
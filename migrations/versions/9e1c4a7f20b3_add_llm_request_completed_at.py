@@ -0,0 +1,26 @@
+"""add llm request completed at
+
+Revision ID: 9e1c4a7f20b3
+Revises: 5b2f0e9c41d7
+Create Date: 2026-10-18 14:21:05.664130
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e1c4a7f20b3'
+down_revision: Union[str, None] = '5b2f0e9c41d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('llm_requests', sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('llm_requests', 'completed_at')
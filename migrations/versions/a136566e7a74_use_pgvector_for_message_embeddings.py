@@ -0,0 +1,74 @@
+"""use pgvector for message embeddings
+
+Revision ID: a136566e7a74
+Revises: ca295ddecb89
+Create Date: 2026-10-18 10:09:36.268215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a136566e7a74'
+down_revision: Union[str, None] = 'ca295ddecb89'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+EMBEDDING_DIMENSIONS = 1536
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _backfill(source: str, target: str, cast: str, where: str = 'true') -> None:
+    """Copy embeddings between columns in committed batches to keep locks short.
+
+    Each batch starts after the last id of the previous one, so rows already
+    copied (or skipped by ``where``) are not scanned again.
+    """
+    batch = sa.text(
+        f'WITH batch AS (SELECT id FROM messages WHERE id > :last_id ORDER BY id LIMIT :batch_size), '
+        f'copied AS (UPDATE messages SET {target} = {source}::{cast} FROM batch '
+        f'WHERE messages.id = batch.id AND {source} IS NOT NULL AND {target} IS NULL AND {where}) '
+        f'SELECT max(id) FROM batch'
+    )
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        last_id = 0
+        while last_id is not None:
+            last_id = connection.execute(
+                batch, {'last_id': last_id, 'batch_size': BACKFILL_BATCH_SIZE}
+            ).scalar()
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS vector')
+    op.add_column('messages', sa.Column('embedding_vector', Vector(EMBEDDING_DIMENSIONS), nullable=True))
+
+    # Arrays of any other length cannot be cast and are left to be re-embedded
+    _backfill('embedding', 'embedding_vector', 'vector',
+              where=f'array_length(embedding, 1) = {EMBEDDING_DIMENSIONS}')
+
+    op.drop_column('messages', 'embedding')
+    op.alter_column('messages', 'embedding_vector', new_column_name='embedding')
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_embedding_hnsw', 'messages', ['embedding'], unique=False,
+                        postgresql_using='hnsw',
+                        postgresql_with={'m': 16, 'ef_construction': 64},
+                        postgresql_ops={'embedding': 'vector_cosine_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_embedding_hnsw', table_name='messages')
+    op.add_column('messages', sa.Column('embedding_array', postgresql.ARRAY(postgresql.FLOAT(precision=6)), nullable=True))
+
+    _backfill('embedding', 'embedding_array', 'real[]')
+
+    op.drop_column('messages', 'embedding')
+    op.alter_column('messages', 'embedding_array', new_column_name='embedding')
@@ -0,0 +1,28 @@
+"""add conversation summary
+
+Revision ID: c3e7405a7133
+Revises: 6cfc3bbfe33b
+Create Date: 2026-10-18 10:01:25.581900
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e7405a7133'
+down_revision: Union[str, None] = '6cfc3bbfe33b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('conversations', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('conversations', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('conversations', 'summary_message_id')
+    op.drop_column('conversations', 'summary')
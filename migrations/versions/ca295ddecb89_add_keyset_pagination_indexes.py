@@ -0,0 +1,28 @@
+"""add keyset pagination indexes
+
+Revision ID: ca295ddecb89
+Revises: f867f36fc59d
+Create Date: 2026-10-18 10:08:33.028418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ca295ddecb89'
+down_revision: Union[str, None] = 'f867f36fc59d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_conversations_created_at_id', 'conversations', ['created_at', 'id'], unique=False)
+    op.create_index('ix_messages_conversation_id_created_at_id', 'messages', ['conversation_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_conversation_id_created_at_id', table_name='messages')
+    op.drop_index('ix_conversations_created_at_id', table_name='conversations')
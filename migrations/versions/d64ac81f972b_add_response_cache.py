@@ -0,0 +1,47 @@
+"""add response cache
+
+Revision ID: d64ac81f972b
+Revises: 8d32b5ec6085
+Create Date: 2026-10-18 10:37:18.703912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd64ac81f972b'
+down_revision: Union[str, None] = '8d32b5ec6085'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('response_cache',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('embedding_model', sa.String(), nullable=False),
+    sa.Column('context_fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('prompt', sa.Text(), nullable=False),
+    sa.Column('embedding', Vector(dim=1536), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('generation_seconds', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_response_cache_lookup', 'response_cache', ['model', 'embedding_model', 'context_fingerprint'], unique=False)
+    op.create_index('ix_response_cache_embedding_hnsw', 'response_cache', ['embedding'], unique=False,
+                    postgresql_using='hnsw',
+                    postgresql_with={'m': 16, 'ef_construction': 64},
+                    postgresql_ops={'embedding': 'vector_cosine_ops'})
+    op.create_index('ix_response_cache_created_at', 'response_cache', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_response_cache_created_at', table_name='response_cache')
+    op.drop_index('ix_response_cache_embedding_hnsw', table_name='response_cache')
+    op.drop_index('ix_response_cache_lookup', table_name='response_cache')
+    op.drop_table('response_cache')
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Benchmark how many concurrent LLM calls one worker's event loop sustains.
+
+Compares the old pattern (a new synchronous ``anthropic.Anthropic`` client per
+request, called from inside ``async def``) against the shared ``AIService``
+(``AsyncAnthropic`` over one pooled HTTP client), both talking to a local stub
+LLM with a fixed latency.
+
+Usage:
+    python scripts/bench_ai_concurrency.py --latency 0.2 --concurrency 1 8 32 128
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(".")  # Add current directory to path
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import anthropic  # noqa: E402
+
+from scripts.stub_llm_server import StubLLMServer  # noqa: E402
+
+HISTORY = [{"message_type": "user", "content": "When should I visit Lisbon?"}]
+
+
+async def legacy_generate(base_url: str) -> str:
+    """The pre-pooling implementation: blocking client built per request."""
+    client = anthropic.Anthropic(api_key="bench", base_url=base_url)
+    response = client.messages.create(
+        model="claude-3-opus-20240229",
+        max_tokens=1024,
+        messages=[{"role": "user", "content": HISTORY[0]["content"]}],
+    )
+    return response.content[0].text
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst event-loop stall seen while the calls were running."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(call, concurrency: int, rounds: int):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        await asyncio.gather(*(call() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    worst_lag = await lag_task
+    return elapsed, concurrency * rounds / elapsed, worst_lag
+
+
+async def main(args) -> None:
+    with StubLLMServer(latency=args.latency) as stub:
+        os.environ["ANTHROPIC_BASE_URL"] = stub.base_url
+        from app.services.ai_service import close_ai_service, get_ai_service
+
+        ai_service = get_ai_service()
+        variants = {
+            "legacy (sync client)": lambda: legacy_generate(stub.base_url),
+            "pooled AsyncAnthropic": lambda: ai_service.generate_response(HISTORY),
+        }
+
+        print(f"Stub latency: {args.latency * 1000:.0f} ms, rounds: {args.rounds}")
+        print(
+            f"{'variant':<24}{'concurrency':>12}{'wall s':>10}"
+            f"{'req/s':>10}{'max loop lag ms':>18}"
+        )
+        for name, call in variants.items():
+            for concurrency in args.concurrency:
+                elapsed, throughput, lag = await run(call, concurrency, args.rounds)
+                print(
+                    f"{name:<24}{concurrency:>12}{elapsed:>10.2f}"
+                    f"{throughput:>10.1f}{lag * 1000:>18.0f}"
+                )
+        await close_ai_service()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Benchmark embedding throughput of the local hashing backend.
+
+Embeds synthetic travel messages in batches and reports the median batch
+latency and texts per second. The previous placeholder (random normal
+vectors) is included for reference. Runs offline.
+
+Usage:
+    python scripts/bench_embeddings.py --batch-sizes 1 64 1024 --rounds 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(".")  # Add current directory to path
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import numpy as np  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services.embedding_backends import HashingEmbeddingBackend  # noqa: E402
+
+VOCABULARY = (
+    "lisbon porto madrid seville kyoto tokyo reykjavik hotel hostel train flight "
+    "ferry museum beach hike budget euros cheap luxury itinerary day trip week "
+    "weekend food wine tapas sushi visa passport weather winter summer rain pack "
+    "family kids couple solo tickets booking cancel refund airport transfer"
+).split()
+
+
+def make_texts(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(8, 60, count)
+    return [
+        f"Message {i}: " + " ".join(rng.choice(VOCABULARY, length))
+        for i, length in enumerate(lengths)
+    ]
+
+
+def random_placeholder(texts):
+    """The previous implementation: noise of the right shape."""
+    return np.random.normal(0, 1, (len(texts), settings.EMBEDDING_DIMENSIONS))
+
+
+def measure(encode, texts, rounds: int) -> float:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        encode(texts)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(args) -> None:
+    backend = HashingEmbeddingBackend(settings.EMBEDDING_DIMENSIONS)
+    variants = {"hashing": backend.encode, "random (previous)": random_placeholder}
+    texts = make_texts(max(args.batch_sizes))
+    backend.encode(texts)  # Warm the word-feature cache
+
+    print(f"Dimensions: {settings.EMBEDDING_DIMENSIONS}, rounds: {args.rounds}")
+    print(f"{'variant':<20}{'batch':>8}{'latency ms':>14}{'texts/s':>12}")
+    for name, encode in variants.items():
+        for size in args.batch_sizes:
+            latency = measure(encode, texts[:size], args.rounds)
+            print(f"{name:<20}{size:>8}{latency * 1000:>14.2f}{size / latency:>12,.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 64, 1024])
+    parser.add_argument("--rounds", type=int, default=20)
+    main(parser.parse_args())
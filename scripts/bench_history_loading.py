@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+"""Benchmark loading a long conversation's history for the prompt builder.
+
+Compares the old path (``selectinload(Conversation.messages)`` materializing
+full ``Message`` objects, embeddings and metadata included) against
+``MessageService.get_message_history``, which selects only id, type,
+content and created_at as row tuples. Seeds a throwaway conversation in the
+configured database and deletes it afterwards.
+
+Usage:
+    python scripts/bench_history_loading.py --messages 2000 --rounds 5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(".")  # Add current directory to path
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+os.environ.setdefault("SECRET_KEY", "bench")
+
+import numpy as np  # noqa: E402
+from sqlalchemy import delete, insert  # noqa: E402
+from sqlalchemy.future import select  # noqa: E402
+from sqlalchemy.orm import selectinload, undefer  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.models.conversation import Conversation  # noqa: E402
+from app.models.message import Message, MessageType  # noqa: E402
+from app.services.message_service import MessageService  # noqa: E402
+
+
+async def seed(count: int) -> int:
+    async with AsyncSessionLocal() as session:
+        conversation = Conversation(title="history benchmark")
+        session.add(conversation)
+        await session.flush()
+        rows = [
+            {
+                "conversation_id": conversation.id,
+                "content": f"Message {i} about day trips from Lisbon. " * 8,
+                "message_type": MessageType.USER if i % 2 == 0 else MessageType.AI,
+                "embedding": np.random.rand(settings.EMBEDDING_DIMENSIONS).tolist(),
+                "message_metadata": {"tokens": 120, "model": "bench", "index": i},
+            }
+            for i in range(count)
+        ]
+        await session.execute(insert(Message), rows)
+        await session.commit()
+        return conversation.id
+
+
+async def cleanup(conversation_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            delete(Message).where(Message.conversation_id == conversation_id)
+        )
+        await session.execute(
+            delete(Conversation).where(Conversation.id == conversation_id)
+        )
+        await session.commit()
+
+
+async def load_full_objects(conversation_id: int):
+    """The previous path: full ORM objects, heavy columns included."""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Conversation)
+            .where(Conversation.id == conversation_id)
+            .options(
+                selectinload(Conversation.messages).options(
+                    undefer(Message.embedding), undefer(Message.message_metadata)
+                )
+            )
+        )
+        conversation = result.scalars().first()
+        return [
+            {
+                "id": msg.id,
+                "message_type": msg.message_type.value,
+                "content": msg.content,
+            }
+            for msg in conversation.messages
+        ]
+
+
+async def load_column_tuples(conversation_id: int):
+    async with AsyncSessionLocal() as session:
+        return await MessageService(session).get_message_history(conversation_id)
+
+
+async def measure(loader, conversation_id: int, rounds: int):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        history = await loader(conversation_id)
+        timings.append(time.perf_counter() - started)
+
+    # Separate pass: tracemalloc slows allocation-heavy code down considerably
+    tracemalloc.start()
+    await loader(conversation_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return len(history), statistics.median(timings), peak
+
+
+async def main(args) -> None:
+    conversation_id = await seed(args.messages)
+    try:
+        variants = {
+            "selectinload (full ORM)": load_full_objects,
+            "column tuples": load_column_tuples,
+        }
+        # Warm up the pool and statement caches
+        for loader in variants.values():
+            await loader(conversation_id)
+
+        print(f"Messages: {args.messages}, rounds: {args.rounds} (median latency)")
+        print(f"{'variant':<26}{'rows':>8}{'latency ms':>14}{'peak MiB':>12}")
+        for name, loader in variants.items():
+            rows, latency, peak = await measure(loader, conversation_id, args.rounds)
+            print(f"{name:<26}{rows:>8}{latency * 1000:>14.1f}{peak / 2**20:>12.2f}")
+    finally:
+        await cleanup(conversation_id)
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""Import JSONL chat logs into a conversation with COPY.
+
+Each line is a message: {"content": ..., "message_type": "user"|"ai"|"system"}
+plus optional "created_at" and "message_metadata". The whole file is imported
+in one transaction, so a bad record leaves the database unchanged. Embeddings
+are left to the worker's sweep unless --embed is given, in which case they are
+generated in batches once the import has committed.
+
+Usage:
+    python scripts/import_messages.py --conversation-id 42 history.jsonl
+    python scripts/import_messages.py --title "Imported" - < history.jsonl
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import AsyncIterator, BinaryIO
+
+sys.path.append(".")  # Add current directory to path
+
+from sqlalchemy.future import select  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.schemas.conversation import ConversationCreate  # noqa: E402
+from app.services.ai_service import close_ai_service  # noqa: E402
+from app.services.conversation_service import ConversationService  # noqa: E402
+from app.services.embedding_pipeline import embedding_pipeline  # noqa: E402
+from app.services.message_import import (  # noqa: E402
+    MessageImportError,
+    MessageImportService,
+)
+
+
+async def read_lines(file: BinaryIO) -> AsyncIterator[bytes]:
+    for line in file:
+        yield line
+
+
+async def embed(conversation_id: int) -> None:
+    """Embed the conversation's unembedded messages, one bulk UPDATE per batch."""
+    last_id, total = 0, 0
+    while True:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(Message.id)
+                .where(
+                    Message.conversation_id == conversation_id,
+                    Message.id > last_id,
+                    Message.embedding.is_(None),
+                )
+                .order_by(Message.id)
+                .limit(settings.EMBEDDING_BATCH_SIZE)
+            )
+            message_ids = list(result.scalars())
+        if not message_ids:
+            return
+        total += await embedding_pipeline.process(message_ids)
+        last_id = message_ids[-1]
+        print(f"Embedded {total} messages")
+
+
+async def main(args) -> int:
+    file = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as session:
+            conversation_id = args.conversation_id
+            if conversation_id is None:
+                conversation = await ConversationService(session).create_conversation(
+                    ConversationCreate(title=args.title)
+                )
+                conversation_id = conversation.id
+            try:
+                imported = await MessageImportService(
+                    session, args.batch_size
+                ).import_lines(conversation_id, read_lines(file))
+            except MessageImportError as e:
+                print(e, file=sys.stderr)
+                return 1
+            if imported is None:
+                print(f"Conversation {conversation_id} not found", file=sys.stderr)
+                return 1
+            await session.commit()
+        elapsed = time.perf_counter() - started
+        print(
+            f"Imported {imported} messages into conversation {conversation_id} "
+            f"in {elapsed:.1f}s ({imported / elapsed:,.0f}/s)"
+        )
+        if args.embed:
+            await embed(conversation_id)
+        return 0
+    finally:
+        file.close()
+        await close_ai_service()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="JSONL file, or - for stdin")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--conversation-id", type=int)
+    target.add_argument("--title", help="Create a new conversation with this title")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument(
+        "--embed",
+        action="store_true",
+        help="Embed the messages after importing instead of leaving them "
+        "to the worker's sweep",
+    )
+    sys.exit(asyncio.run(main(parser.parse_args())))
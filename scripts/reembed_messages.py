@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""Re-embed every stored message with the configured embedding backend.
+
+Run after changing ``EMBEDDING_BACKEND`` (or to replace vectors written by
+the old random placeholder). Messages are processed in id order, one bulk
+UPDATE per batch.
+
+Usage:
+    python scripts/reembed_messages.py --batch-size 256
+"""
+import argparse
+import asyncio
+import sys
+
+sys.path.append(".")  # Add current directory to path
+
+from sqlalchemy.future import select  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine  # noqa: E402
+from app.models.message import Message  # noqa: E402
+from app.services.ai_service import close_ai_service  # noqa: E402
+from app.services.embedding_pipeline import embedding_pipeline  # noqa: E402
+
+
+async def main(args) -> None:
+    last_id, total = 0, 0
+    try:
+        while True:
+            async with AsyncSessionLocal() as session:
+                result = await session.execute(
+                    select(Message.id)
+                    .where(Message.id > last_id)
+                    .order_by(Message.id)
+                    .limit(args.batch_size)
+                )
+                message_ids = list(result.scalars())
+            if not message_ids:
+                break
+            total += await embedding_pipeline.process(message_ids)
+            last_id = message_ids[-1]
+            print(f"Re-embedded {total} messages (up to id {last_id})")
+    finally:
+        await close_ai_service()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=256)
+    asyncio.run(main(parser.parse_args()))
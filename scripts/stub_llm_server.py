@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+"""Local stub of the Anthropic Messages API for benchmarks and manual testing.
+
+Answers ``POST /v1/messages`` after a fixed latency with a canned reply, so the
+app can be pointed at it with ``ANTHROPIC_BASE_URL=http://127.0.0.1:<port>``.
+Requests with ``"stream": true`` get the reply as SSE events, one word per
+``token_latency`` seconds.
+
+Prompt caching is simulated: ``cache_control`` markers are checked for the
+shape the API accepts (400 otherwise), prefixes ending at a marker are
+remembered, and a later request sharing one reports it in
+``cache_read_input_tokens`` (new marked prefixes in
+``cache_creation_input_tokens``). Tokens are estimated as characters / 4.
+
+Run standalone:
+    python scripts/stub_llm_server.py --port 8089 --latency 0.5
+
+Or embed it in a script:
+    with StubLLMServer(latency=0.2) as stub:
+        ... stub.base_url ...
+"""
+import argparse
+import asyncio
+import json
+import threading
+from hashlib import sha256
+from typing import Any, Dict, List, Optional, Set
+
+# The API allows at most this many cache_control markers per request
+MAX_CACHE_BREAKPOINTS = 4
+# How far before a marker the API looks for an earlier cached prefix
+CACHE_LOOKBACK_BLOCKS = 20
+
+
+class StubLLMServer:
+    """Minimal keep-alive HTTP/1.1 server running on its own thread and loop."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.1,
+        reply: str = "Lisbon is lovely in late spring.",
+        token_latency: float = 0.01,
+    ):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.reply = reply
+        self.token_latency = token_latency
+        self.cancelled_streams = 0
+        self.requests: List[Dict[str, Any]] = []
+        self.request_headers: List[Dict[str, str]] = []
+        self.cached_prefixes: Set[str] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None and self._loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _run(self) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        handlers = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        self._loop.stop()
+
+    async def _handle(self, reader, writer) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                payload = json.loads(body or b"{}")
+                self.requests.append(payload)
+                self.request_headers.append(headers)
+
+                error = self._check_cache_control(payload)
+                if error is not None:
+                    await self._write_json(
+                        writer,
+                        {
+                            "type": "error",
+                            "error": {
+                                "type": "invalid_request_error",
+                                "message": error,
+                            },
+                        },
+                        status="400 Bad Request",
+                    )
+                    continue
+
+                await asyncio.sleep(self.latency)
+                if payload.get("stream"):
+                    await self._write_stream(writer, self._message(payload))
+                    break
+                await self._write_json(writer, self._message(payload))
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _message(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"msg_stub_{len(self.requests)}",
+            "type": "message",
+            "role": "assistant",
+            "model": payload.get("model", "stub"),
+            "content": [{"type": "text", "text": self.reply}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {
+                **self._prompt_usage(payload),
+                "output_tokens": len(self.reply) // 4,
+            },
+        }
+
+    @staticmethod
+    def _prompt_blocks(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """The prompt as content blocks in cache order: system, then messages."""
+        system = payload.get("system") or []
+        blocks = [{"type": "text", "text": system}] if isinstance(system, str) else []
+        blocks += system if isinstance(system, list) else []
+        for message in payload.get("messages", []):
+            content = message["content"]
+            if isinstance(content, str):
+                content = [{"type": "text", "text": content}]
+            blocks += [{"role": message["role"], **block} for block in content]
+        return blocks
+
+    def _check_cache_control(self, payload: Dict[str, Any]) -> Optional[str]:
+        for message in payload.get("messages", []):
+            if "cache_control" in message:
+                return "cache_control belongs on content blocks, not messages"
+        markers = [
+            block["cache_control"]
+            for block in self._prompt_blocks(payload)
+            if "cache_control" in block
+        ]
+        if len(markers) > MAX_CACHE_BREAKPOINTS:
+            return f"At most {MAX_CACHE_BREAKPOINTS} cache_control blocks are allowed"
+        if any(marker != {"type": "ephemeral"} for marker in markers):
+            return "cache_control must be {'type': 'ephemeral'}"
+        return None
+
+    def _prompt_usage(self, payload: Dict[str, Any]) -> Dict[str, int]:
+        """Split prompt tokens into uncached, cache-read and cache-written."""
+        blocks = self._prompt_blocks(payload)
+        tokens, keys, prefix = [], [], sha256(str(payload.get("model")).encode())
+        for block in blocks:
+            clean = {k: v for k, v in block.items() if k != "cache_control"}
+            prefix.update(json.dumps(clean, sort_keys=True).encode())
+            keys.append(prefix.hexdigest())
+            tokens.append((tokens[-1] if tokens else 0) + len(clean["text"]) // 4)
+        markers = [i for i, block in enumerate(blocks) if "cache_control" in block]
+
+        read = written = 0
+        if markers:
+            last = markers[-1]
+            for i in range(last, max(last - CACHE_LOOKBACK_BLOCKS, -1), -1):
+                if keys[i] in self.cached_prefixes:
+                    read = tokens[i]
+                    break
+            written = tokens[last] - read
+            self.cached_prefixes.update(keys[i] for i in markers)
+        total = tokens[-1] if tokens else 0
+        return {
+            "input_tokens": total - read - written,
+            "cache_creation_input_tokens": written,
+            "cache_read_input_tokens": read,
+        }
+
+    @staticmethod
+    async def _write_json(writer, data: Dict[str, Any], status: str = "200 OK") -> None:
+        body = json.dumps(data).encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\n".encode()
+            + b"Content-Type: application/json\r\n"
+            + f"Content-Length: {len(body)}\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+
+    async def _write_stream(self, writer, message: Dict[str, Any]) -> None:
+        """Send the message as Anthropic streaming events, word by word."""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        text = message["content"][0]["text"]
+        events = [
+            ("message_start", {"message": {**message, "content": []}}),
+            (
+                "content_block_start",
+                {"index": 0, "content_block": {"type": "text", "text": ""}},
+            ),
+        ]
+        for word in text.split(" "):
+            delta = {"type": "text_delta", "text": word + " "}
+            events.append(("content_block_delta", {"index": 0, "delta": delta}))
+        events += [
+            ("content_block_stop", {"index": 0}),
+            (
+                "message_delta",
+                {
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": message["usage"]["output_tokens"]},
+                },
+            ),
+            ("message_stop", {}),
+        ]
+        try:
+            for event, data in events:
+                frame = json.dumps({"type": event, **data})
+                writer.write(f"event: {event}\ndata: {frame}\n\n".encode())
+                await writer.drain()
+                if event == "content_block_delta":
+                    await asyncio.sleep(self.token_latency)
+        except ConnectionError:
+            self.cancelled_streams += 1
+            raise
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    server = StubLLMServer(args.host, args.port, args.latency).start()
+    print(f"Stub LLM listening on {server.base_url} (latency {args.latency}s)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
@@ -3,10 +3,17 @@ Configuration file for pytest.
 This file is automatically recognized by pytest and used for configuration.
 """
 
+from contextlib import asynccontextmanager, contextmanager
+
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
+from sqlalchemy import delete, event, text
 
+from app.db.base import AsyncSessionLocal, engine
 from app.main import app
+from app.models.conversation import Conversation
+from app.models.message import Message
 
 
 @pytest.fixture
@@ -15,6 +22,114 @@ def client():
     return TestClient(app)
 
 
+class FakeResult:
+    """Result of a ``FakeSession`` statement, returning the same rows however read."""
+
+    def __init__(self, rows=(), rowcount=None):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+
+    def all(self):
+        return self.rows
+
+    def tuples(self):
+        return iter(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeSession:
+    """
+    Session that records statements instead of running them.
+    For asserting the shape of the SQL a service builds, or standing in for
+    ``AsyncSessionLocal`` where the services themselves are faked. What the
+    SQL does belongs in a test against the ``database`` fixture.
+    """
+
+    def __init__(self, rows=(), rowcount=None):
+        self.rows = rows
+        self.rowcount = rowcount
+        self.statements = []
+        self.commits = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.statements.append(statement)
+        return FakeResult(self.rows, self.rowcount)
+
+    async def commit(self):
+        self.commits += 1
+
+    async def rollback(self):
+        pass
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        yield
+
+
+@pytest_asyncio.fixture
+async def database():
+    """The configured database's engine; skips the test when it is not reachable."""
+    # Drop connections pooled by other tests' (closed) event loops
+    await engine.dispose(close=False)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    except Exception:
+        await engine.dispose()
+        pytest.skip("database not reachable")
+    try:
+        yield engine
+    finally:
+        # Connections are bound to this test's event loop
+        await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def conversation_id(database):
+    """A new conversation, deleted afterwards with its messages and jobs."""
+    async with AsyncSessionLocal() as session:
+        conversation = Conversation(title="Test conversation")
+        session.add(conversation)
+        await session.commit()
+    try:
+        yield conversation.id
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(Message).where(Message.conversation_id == conversation.id)
+            )
+            await session.execute(
+                delete(Conversation).where(Conversation.id == conversation.id)
+            )
+            await session.commit()
+
+
+@contextmanager
+def count_round_trips():
+    """Count statements, BEGINs and COMMITs sent on the engine's connections."""
+    counts = {"round_trips": 0}
+
+    def count(*args, **kwargs):
+        counts["round_trips"] += 1
+
+    events = ["before_cursor_execute", "begin", "commit", "rollback"]
+    for name in events:
+        event.listen(engine.sync_engine, name, count)
+    try:
+        yield counts
+    finally:
+        for name in events:
+            event.remove(engine.sync_engine, name, count)
+
+
 def pytest_ignore_collect(path, config):
     """
     Return True to prevent pytest from collecting a file as a test module.
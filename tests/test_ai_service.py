@@ -0,0 +1,147 @@
+import asyncio
+import json
+import time
+
+import anthropic
+import httpx
+import pytest
+
+from app.services.ai_service import AIService, get_ai_service
+from app.services.llm_scheduler import Priority
+
+HISTORY = [{"message_type": "user", "content": "When should I visit Lisbon?"}]
+
+
+def make_service(latency: float = 0.0) -> AIService:
+    """Build an AIService whose async client talks to an in-memory transport."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        return httpx.Response(
+            200,
+            json={
+                "id": "msg_test",
+                "type": "message",
+                "role": "assistant",
+                "model": "claude-3-opus-20240229",
+                "content": [{"type": "text", "text": "Try May or June."}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 5},
+            },
+        )
+
+    client = anthropic.AsyncAnthropic(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return AIService(anthropic_client=client)
+
+
+def test_get_ai_service_is_singleton():
+    """The shared service (and its connection pool) is reused across requests."""
+    assert get_ai_service() is get_ai_service()
+
+
+@pytest.mark.asyncio
+async def test_generate_response_uses_async_client():
+    ai_service = make_service()
+    assert await ai_service.generate_response(HISTORY) == "Try May or June."
+    await ai_service.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "history", [[], [{"message_type": "ai", "content": "Anything else?"}]]
+)
+async def test_invalid_history_raises_instead_of_apologizing(history):
+    ai_service = make_service()
+    assert ai_service.model_router is not None  # Routing runs after validation
+    with pytest.raises(ValueError, match="Last message must be from the user"):
+        await ai_service.generate_response(history)
+    await ai_service.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_do_not_block_each_other():
+    """Ten 0.2s upstream calls overlap instead of running back to back."""
+    ai_service = make_service(latency=0.2)
+    histories = [
+        [{"message_type": "user", "content": f"Day {i} in Lisbon?"}] for i in range(10)
+    ]
+    started = time.perf_counter()
+    await asyncio.gather(*(ai_service.generate_response(h) for h in histories))
+    assert time.perf_counter() - started < 1.0
+    await ai_service.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_response_yields_text_deltas():
+    events = [
+        (
+            "message_start",
+            {
+                "message": {
+                    "id": "msg_test",
+                    "type": "message",
+                    "role": "assistant",
+                    "content": [],
+                    "model": "claude-3-opus-20240229",
+                    "stop_reason": None,
+                    "stop_sequence": None,
+                    "usage": {"input_tokens": 10, "output_tokens": 0},
+                }
+            },
+        ),
+        (
+            "content_block_start",
+            {"index": 0, "content_block": {"type": "text", "text": ""}},
+        ),
+        (
+            "content_block_delta",
+            {"index": 0, "delta": {"type": "text_delta", "text": "Try "}},
+        ),
+        (
+            "content_block_delta",
+            {"index": 0, "delta": {"type": "text_delta", "text": "May."}},
+        ),
+        ("content_block_stop", {"index": 0}),
+        ("message_stop", {}),
+    ]
+    body = "".join(
+        f"event: {name}\ndata: {json.dumps({'type': name, **data})}\n\n"
+        for name, data in events
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(
+            200, text=body, headers={"content-type": "text/event-stream"}
+        )
+
+    client = anthropic.AsyncAnthropic(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    ai_service = AIService(anthropic_client=client)
+    chunks = [text async for text in ai_service.stream_response(HISTORY)]
+    assert chunks == ["Try ", "May."]
+    await ai_service.close()
+
+
+@pytest.mark.asyncio
+async def test_summary_runs_at_the_callers_priority(monkeypatch):
+    service = make_service()
+    priorities = []
+
+    async def create(params, priority, router, tier, usage=None):
+        priorities.append(priority)
+        return "Wants Lisbon in May."
+
+    monkeypatch.setattr(service, "_create", create)
+
+    assert await service.summarize(None, HISTORY) == "Wants Lisbon in May."
+    await service.summarize(None, HISTORY, priority=Priority.INTERACTIVE)
+
+    assert priorities == [Priority.BACKGROUND, Priority.INTERACTIVE]
+    await service.close()
@@ -0,0 +1,135 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import context_builder
+from app.services.context_builder import ContextBuilder, message_tokens
+from app.services.llm_scheduler import Priority
+from tests.conftest import FakeSession
+
+
+class FakeConversationService:
+    def __init__(self):
+        self.summary = None
+        self.summarized_through = None
+
+    async def get_summary(self, conversation_id):
+        return self.summary, self.summarized_through
+
+    async def update_summary(
+        self, conversation_id, summary, summary_message_id, summary_message_created_at
+    ):
+        self.summary = summary
+        self.summarized_through = (summary_message_created_at, summary_message_id)
+
+
+class FakeAIService:
+    def __init__(self):
+        self.summarized = []
+        self.priorities = []
+
+    async def summarize(self, previous_summary, message_history, priority):
+        self.summarized.append([msg["id"] for msg in message_history])
+        self.priorities.append(priority)
+        return f"summary through {message_history[-1]['id']}"
+
+
+@pytest.fixture
+def conversation_service(monkeypatch):
+    """The conversation's stored summary, whichever session reads or writes it."""
+    service = FakeConversationService()
+    monkeypatch.setattr(context_builder, "ConversationService", lambda db: service)
+    return service
+
+
+def make_builder(ai_service, **kwargs):
+    return ContextBuilder(ai_service, session_factory=FakeSession, **kwargs)
+
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def make_history(turns: int, words: int = 40):
+    content = " ".join(["word"] * words)
+    return [
+        {
+            "id": i + 1,
+            "message_type": "user" if i % 2 == 0 else "ai",
+            "content": content,
+            "created_at": START + timedelta(minutes=i),
+        }
+        for i in range(turns)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_short_history_is_sent_verbatim(conversation_service):
+    ai_service = FakeAIService()
+    builder = make_builder(ai_service, token_budget=1000)
+    history = make_history(3)
+
+    window = await builder.build(1, history)
+
+    assert window.messages == history
+    assert window.summary is None
+    assert window.tokens_saved == 0
+    assert ai_service.summarized == []
+
+
+@pytest.mark.asyncio
+async def test_long_history_is_folded_into_summary(conversation_service):
+    ai_service = FakeAIService()
+    builder = make_builder(ai_service, token_budget=500, low_water_ratio=0.5)
+    history = make_history(21)
+
+    window = await builder.build(1, history)
+
+    assert sum(message_tokens(msg) for msg in window.messages) <= 250
+    assert window.messages[0]["message_type"] == "user"
+    assert window.messages[-1] == history[-1]
+    _, summary_message_id = conversation_service.summarized_through
+    assert summary_message_id == window.messages[0]["id"] - 1
+    assert window.system_prompt.endswith(conversation_service.summary)
+    assert window.tokens_saved > 0
+    # The reply waits for the summary, so it is not queued as background work
+    assert ai_service.priorities == [Priority.INTERACTIVE]
+
+
+@pytest.mark.asyncio
+async def test_summary_is_not_rewritten_until_budget_is_exceeded_again(
+    conversation_service,
+):
+    ai_service = FakeAIService()
+    builder = make_builder(ai_service, token_budget=500, low_water_ratio=0.5)
+    history = make_history(21)
+    await builder.build(1, history)
+
+    # Two more turns still fit between the low-water mark and the budget
+    window = await builder.build(1, make_history(23))
+
+    assert len(ai_service.summarized) == 1
+    _, summary_message_id = conversation_service.summarized_through
+    assert window.messages[0]["id"] == summary_message_id + 1
+
+
+@pytest.mark.asyncio
+async def test_summary_mark_follows_history_order_not_ids(conversation_service):
+    ai_service = FakeAIService()
+    builder = make_builder(ai_service, token_budget=500, low_water_ratio=0.5)
+    history = make_history(21)
+    await builder.build(1, history)
+    [folded] = ai_service.summarized
+
+    # Turns imported later with their original timestamps get higher ids but
+    # sort among the already-summarized turns
+    imported = [
+        dict(msg, id=100 + i, created_at=msg["created_at"] + timedelta(seconds=1))
+        for i, msg in enumerate(history[:2])
+    ]
+    history = sorted(history + imported, key=lambda m: (m["created_at"], m["id"]))
+    window = await builder.build(1, history)
+
+    assert len(ai_service.summarized) == 1
+    assert [msg["id"] for msg in window.messages] == [
+        msg["id"] for msg in history[len(folded) + 2 :]
+    ]
@@ -0,0 +1,51 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+from app.services import conversation_lock
+from app.services.conversation_lock import ConversationLocks
+
+
+@pytest.fixture(autouse=True)
+def no_advisory_lock(monkeypatch):
+    held = []
+
+    @asynccontextmanager
+    async def fake_advisory_lock(conversation_id):
+        held.append(conversation_id)
+        yield
+
+    monkeypatch.setattr(conversation_lock, "_advisory_lock", fake_advisory_lock)
+    return held
+
+
+@pytest.mark.asyncio
+async def test_replies_to_one_conversation_run_one_at_a_time(no_advisory_lock):
+    locks = ConversationLocks()
+    events = []
+
+    async def reply(name):
+        async with locks.hold(1):
+            events.append(("start", name))
+            await asyncio.sleep(0.01)
+            events.append(("end", name))
+
+    await asyncio.gather(reply("a"), reply("b"))
+
+    assert events == [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b")]
+    assert no_advisory_lock == [1, 1]
+    assert locks._locks == {}
+
+
+@pytest.mark.asyncio
+async def test_other_conversations_are_not_blocked():
+    locks = ConversationLocks()
+
+    async with locks.hold(1):
+        await asyncio.wait_for(_enter(locks, 2), timeout=1)
+
+
+async def _enter(locks, conversation_id):
+    async with locks.hold(conversation_id):
+        pass
@@ -24,3 +24,13 @@ def test_get_conversations(client):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
+
+
+def test_message_for_another_conversation_is_rejected(client):
+    """The body's conversation_id must match the URL's."""
+    message = {"content": "Hello", "message_type": "user", "conversation_id": 2}
+    for path in ("messages", "messages/stream"):
+        response = client.post(
+            f"{settings.API_V1_STR}/conversations/1/{path}", json=message
+        )
+        assert response.status_code == 400
@@ -0,0 +1,50 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from app.core import database
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import base, session
+
+
+def test_single_engine_shared():
+    """All session modules share the one configured engine."""
+    assert base.engine is database.engine
+    assert session.engine is database.engine
+    assert base.AsyncSessionLocal is database.AsyncSessionLocal
+
+
+def test_pool_settings_applied():
+    pool = database.engine.pool
+    assert isinstance(pool, database.InstrumentedQueuePool)
+    assert pool.size() == settings.DATABASE_POOL_SIZE
+    assert pool._max_overflow == settings.DATABASE_MAX_OVERFLOW
+    assert pool.timeout() == settings.DATABASE_POOL_TIMEOUT
+    assert pool._pre_ping == settings.DATABASE_POOL_PRE_PING
+
+
+@pytest.mark.asyncio
+async def test_pool_reports_saturation_and_wait_time():
+    metrics.reset()
+    pool = database.InstrumentedQueuePool(
+        lambda: mock.Mock(), pool_size=1, max_overflow=0, timeout=0.05
+    )
+
+    def exhaust_pool():
+        held = pool.connect()
+        with pytest.raises(exc.TimeoutError):
+            pool.connect()
+        held.close()
+
+    await greenlet_spawn(exhaust_pool)
+
+    snapshot = metrics.snapshot()
+    assert snapshot["counters"]["db.pool.saturated"] == 1
+    assert snapshot["counters"]["db.pool.timeouts"] == 1
+    assert snapshot["gauges"]["db.pool.checked_out"] == 0
+    waits = snapshot["summaries"]["db.pool.checkout_wait_seconds"]
+    assert waits["count"] == 2
+    assert waits["max"] >= 0.05
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.deadline import CLIENT_CLOSED_REQUEST, Deadline, cancel_on_disconnect
+from app.core.metrics import metrics
+
+
+class FakeRequest:
+    """Reports a disconnect after ``disconnect_after`` seconds."""
+
+    def __init__(self, disconnect_after: float):
+        self.disconnect_after = disconnect_after
+
+    async def receive(self):
+        await asyncio.sleep(self.disconnect_after)
+        return {"type": "http.disconnect"}
+
+
+@pytest.mark.asyncio
+async def test_stage_past_its_share_of_the_budget_is_a_504():
+    metrics.reset()
+    deadline = Deadline("test", budget=0.2)
+
+    with pytest.raises(HTTPException) as exc_info:
+        async with deadline.stage("llm", share=0.25):
+            await asyncio.sleep(1)
+
+    assert exc_info.value.status_code == 504
+    counters = metrics.snapshot()["counters"]
+    assert counters["requests.deadline_exceeded{route=test,stage=llm}"] == 1
+    # The overrun stage only used its share; the rest is left for later stages
+    assert deadline.remaining() > 0.1
+
+
+@pytest.mark.asyncio
+async def test_route_without_a_budget_has_no_deadline():
+    deadline = Deadline("unlisted")
+
+    async with deadline.stage("db", share=0.1):
+        await asyncio.sleep(0.01)
+
+    assert deadline.remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cancels_the_work():
+    metrics.reset()
+    cleaned_up = asyncio.Event()
+
+    async def handler():
+        try:
+            await asyncio.sleep(10)
+        finally:
+            cleaned_up.set()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await cancel_on_disconnect(FakeRequest(0.01), "test", handler)
+
+    assert exc_info.value.status_code == CLIENT_CLOSED_REQUEST
+    assert cleaned_up.is_set()
+    assert metrics.snapshot()["counters"]["requests.disconnected{route=test}"] == 1
+
+
+@pytest.mark.asyncio
+async def test_work_finishing_first_returns_its_result():
+    async def handler():
+        return "reply"
+
+    assert await cancel_on_disconnect(FakeRequest(10), "test", handler) == "reply"
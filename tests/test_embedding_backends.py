@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.embedding_backends import (
+    HashingEmbeddingBackend,
+    OpenAIEmbeddingBackend,
+)
+
+TEXTS = [
+    "Best day trips from Lisbon by train",
+    "best day trips from LISBON by train!",
+    "What should I pack for Iceland in winter?",
+    "👍",
+    "",
+]
+
+
+def test_hashing_backend_is_deterministic_and_normalized():
+    embeddings = HashingEmbeddingBackend(256).encode(TEXTS)
+
+    assert embeddings.shape == (5, 256)
+    assert embeddings.dtype == np.float32
+    # Featureless text still gets a direction, so cosine distance stays finite
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    # Same vectors from a fresh instance and from a batch of one
+    assert np.array_equal(HashingEmbeddingBackend(256).encode(TEXTS), embeddings)
+    assert np.allclose(HashingEmbeddingBackend(256).encode(TEXTS[2:3]), embeddings[2])
+
+
+def test_hashing_backend_tells_punctuation_only_texts_apart():
+    thumbs, thumbs_again, bangs, question = HashingEmbeddingBackend(256).encode(
+        ["👍", " 👍 ", "!!!", "?"]
+    )
+
+    assert thumbs @ thumbs_again > 0.99
+    assert thumbs @ bangs < 0.5
+    assert bangs @ question < 0.5
+
+
+def test_hashing_backend_ranks_related_texts_closer():
+    query, duplicate, related, unrelated = HashingEmbeddingBackend(1536).encode(
+        [TEXTS[0], TEXTS[1], "Train tickets from Lisbon to Sintra", TEXTS[2]]
+    )
+
+    assert query @ duplicate > 0.99
+    assert query @ related > query @ unrelated
+
+
+@pytest.mark.asyncio
+async def test_openai_backend_keeps_input_order():
+    calls = {}
+
+    class FakeEmbeddings:
+        async def create(self, **kwargs):
+            calls.update(kwargs)
+            return SimpleNamespace(
+                data=[
+                    SimpleNamespace(index=1, embedding=[0.0, 1.0]),
+                    SimpleNamespace(index=0, embedding=[1.0, 0.0]),
+                ]
+            )
+
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+    backend = OpenAIEmbeddingBackend(2, "text-embedding-3-small", client=client)
+
+    embeddings = await backend.embed(["a", "b"])
+
+    assert embeddings.tolist() == [[1.0, 0.0], [0.0, 1.0]]
+    assert calls == {
+        "model": "text-embedding-3-small",
+        "input": ["a", "b"],
+        "dimensions": 2,
+    }
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from app.core.metrics import metrics
+from app.services import embedding_cache as cache_module
+from app.services.embedding_backends import HashingEmbeddingBackend
+from app.services.embedding_cache import EmbeddingCache, LRUCache, normalize_text
+from tests.conftest import FakeSession
+
+
+class CountingBackend(HashingEmbeddingBackend):
+    def __init__(self):
+        super().__init__(dimensions=64)
+        self.calls = []
+
+    async def embed(self, texts):
+        self.calls.append(list(texts))
+        return await super().embed(texts)
+
+
+def fake_store(monkeypatch):
+    """Swap the persistent tier for a dict shared by every EmbeddingCache."""
+    rows = {}
+
+    class FakeCacheService:
+        def __init__(self, db):
+            pass
+
+        async def get_embeddings(self, keys):
+            return {key: rows[key] for key in keys if key in rows}
+
+        async def store_embeddings(self, model, embeddings):
+            rows.update(embeddings)
+
+    monkeypatch.setattr(cache_module, "EmbeddingCacheService", FakeCacheService)
+    return rows
+
+
+def test_normalize_text_folds_trivial_variants():
+    assert normalize_text("  Thanks  SO much ") == normalize_text("thanks so much")
+
+
+def test_lru_evicts_least_recent_and_expired(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # Evicts "b", the least recently used
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+    now[0] = 11
+    assert cache.get("a") is None and len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_texts_embedded_once():
+    metrics.reset()
+    backend = CountingBackend()
+    cache = EmbeddingCache(maxsize=10, ttl=60, persist=False)
+
+    first = await cache.embed(["Thanks!", "thanks!", "Hotels in Porto?"], backend)
+    second = await cache.embed(["hotels in porto?"], backend)
+
+    assert backend.calls == [["thanks!", "hotels in porto?"]]
+    assert np.array_equal(first[0], first[1])
+    assert np.array_equal(second[0], first[2])
+    counters = metrics.snapshot()["counters"]
+    assert counters["embedding_cache.misses"] == 2
+    assert counters["embedding_cache.hits{tier=memory}"] == 1
+    assert metrics.snapshot()["gauges"]["embedding_cache.hit_rate"] == 1 / 3
+
+
+@pytest.mark.asyncio
+async def test_persistent_tier_shared_between_processes(monkeypatch):
+    rows = fake_store(monkeypatch)
+    backend = CountingBackend()
+    worker_a = EmbeddingCache(maxsize=10, ttl=60, session_factory=FakeSession)
+    worker_b = EmbeddingCache(maxsize=10, ttl=60, session_factory=FakeSession)
+
+    embedded = await worker_a.embed(["What about hotels?"], backend)
+    reused = await worker_b.embed(["what about hotels?"], backend)
+
+    assert len(backend.calls) == 1 and len(rows) == 1
+    assert np.array_equal(embedded, reused)
+    assert len(worker_b.memory) == 1  # Promoted into the local tier
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.models.message import Message
+from app.schemas.message import MessageCreate
+from app.services.embedding_pipeline import EmbeddingPipeline, embedding_pipeline
+from app.services.message_service import MessageService
+from tests.conftest import count_round_trips
+
+
+def running_pipeline(**kwargs) -> EmbeddingPipeline:
+    pipeline = EmbeddingPipeline(**kwargs)
+    pipeline.queue = asyncio.Queue(maxsize=pipeline.queue_size)
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_submit_skips_duplicates_and_drops_when_full():
+    metrics.reset()
+    pipeline = running_pipeline(queue_size=2)
+
+    for message_id in (1, 1, 2, 3):
+        pipeline.submit(message_id)
+
+    assert pipeline.queue.qsize() == 2
+    assert pipeline.pending == {1, 2}
+    assert metrics.snapshot()["counters"]["embeddings.dropped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_next_batch_caps_size_and_waits_briefly():
+    pipeline = running_pipeline(batch_size=3, max_wait=0.01)
+    for message_id in range(5):
+        pipeline.submit(message_id)
+
+    assert await pipeline._next_batch() == [0, 1, 2]
+    assert await pipeline._next_batch() == [3, 4]
+    assert not pipeline.pending
+
+
+async def add_messages(session, conversation_id, count):
+    service = MessageService(session)
+    return [
+        (
+            await service.create_message(
+                MessageCreate(
+                    content=f"message {i}",
+                    message_type="user",
+                    conversation_id=conversation_id,
+                )
+            )
+        ).id
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_embeddings_written_with_one_bulk_update(conversation_id):
+    vectors = [[0.0] * settings.EMBEDDING_DIMENSIONS for _ in range(2)]
+    vectors[0][0], vectors[1][1] = 1.0, 1.0
+    async with AsyncSessionLocal() as session:
+        ids = await add_messages(session, conversation_id, 2)
+
+        with count_round_trips() as counts:
+            updated = await MessageService(session).update_message_embeddings(
+                dict(zip(ids, vectors))
+            )
+        assert updated == 2
+        assert counts["round_trips"] == 1
+
+        result = await session.execute(
+            select(Message.embedding).where(Message.id.in_(ids)).order_by(Message.id)
+        )
+        assert [list(e) for e in result.scalars()] == vectors
+        await session.rollback()
+
+
+@pytest.mark.asyncio
+async def test_messages_are_queued_only_once_committed(conversation_id, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(embedding_pipeline, "submit", submitted.append)
+
+    async with AsyncSessionLocal() as session:
+        await add_messages(session, conversation_id, 1)
+        await session.rollback()
+
+        [committed] = await add_messages(session, conversation_id, 1)
+        # Releasing a savepoint does not commit the transaction
+        async with session.begin_nested():
+            pass
+        assert submitted == []
+        await session.commit()
+
+    assert submitted == [committed]
@@ -0,0 +1,48 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import conversations as conversations_endpoint
+from app.api.fields import parse_fields
+from app.core.config import settings
+from app.core.pagination import Page
+from app.schemas.message import MESSAGE_DEFAULT_FIELDS, MESSAGE_FIELDS
+
+
+def test_embedding_excluded_by_default():
+    assert "embedding" in MESSAGE_FIELDS
+    assert parse_fields(None, MESSAGE_FIELDS, MESSAGE_DEFAULT_FIELDS) == list(
+        MESSAGE_DEFAULT_FIELDS
+    )
+
+
+def test_parse_fields_dedupes_and_rejects_unknown():
+    assert parse_fields("id, content,id", MESSAGE_FIELDS, ()) == ["id", "content"]
+    with pytest.raises(HTTPException) as exc:
+        parse_fields("id,password", MESSAGE_FIELDS, ())
+    assert exc.value.status_code == 400
+
+
+def test_fields_pushed_down_to_service(client, monkeypatch):
+    requested = {}
+
+    class FakeMessageService:
+        def __init__(self, db):
+            pass
+
+        async def get_conversation_messages(
+            self, conversation_id, limit, cursor, fields
+        ):
+            requested["fields"] = fields
+            return Page(items=[SimpleNamespace(id=1, content="hi", created_at=None)])
+
+    monkeypatch.setattr(conversations_endpoint, "MessageService", FakeMessageService)
+
+    response = client.get(
+        f"{settings.API_V1_STR}/conversations/1/messages", params={"fields": "content"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [{"content": "hi"}]
+    assert requested["fields"] == ["content"]
@@ -0,0 +1,164 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import idempotency
+from app.api.idempotency import REPLAYED_HEADER, request_hash, run_idempotent
+from app.core.config import settings
+from app.models.idempotency_key import IdempotencyStatus
+from app.schemas.message import MessageResponse
+from tests.conftest import FakeSession
+
+MESSAGE = {
+    "id": 7,
+    "conversation_id": 1,
+    "content": "Try Sintra.",
+    "message_type": "ai",
+    "created_at": "2024-05-01T00:00:00Z",
+}
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Replace the idempotency_keys table with a dict."""
+    rows = {}
+
+    class FakeIdempotencyService:
+        def __init__(self, db):
+            pass
+
+        async def claim(self, key, request_hash):
+            if key in rows:
+                return False
+            rows[key] = SimpleNamespace(
+                request_hash=request_hash,
+                status=IdempotencyStatus.PENDING,
+                response_status=None,
+                response_body=None,
+            )
+            return True
+
+        async def get(self, key):
+            return rows.get(key)
+
+        async def complete(self, key, status_code, body):
+            rows[key].status = IdempotencyStatus.DONE
+            rows[key].response_status = status_code
+            rows[key].response_body = body
+
+        async def release(self, key):
+            del rows[key]
+
+    monkeypatch.setattr(idempotency, "IdempotencyService", FakeIdempotencyService)
+    monkeypatch.setattr(idempotency, "AsyncSessionLocal", FakeSession)
+    return rows
+
+
+def counting_handler():
+    calls = []
+
+    async def handler():
+        calls.append(1)
+        return MessageResponse.model_validate(MESSAGE)
+
+    return handler, calls
+
+
+@pytest.mark.asyncio
+async def test_retry_replays_stored_response(keys):
+    handler, calls = counting_handler()
+    payload = (1, {"content": "hi"})
+
+    first = await run_idempotent(
+        "k1", "test", payload, handler, MessageResponse, FakeSession()
+    )
+    replay = await run_idempotent(
+        "k1", "test", payload, handler, MessageResponse, FakeSession()
+    )
+
+    assert first.id == 7
+    assert len(calls) == 1
+    assert replay.headers[REPLAYED_HEADER] == "true"
+    assert b'"id":7' in replay.body
+
+
+@pytest.mark.asyncio
+async def test_key_reused_for_other_request_is_rejected(keys):
+    handler, calls = counting_handler()
+    await run_idempotent(
+        "k1", "test", (1, "hi"), handler, MessageResponse, FakeSession()
+    )
+
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(
+            "k1", "test", (1, "bye"), handler, MessageResponse, FakeSession()
+        )
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_failed_request_releases_key(keys):
+    async def fail():
+        raise HTTPException(status_code=404)
+
+    with pytest.raises(HTTPException):
+        await run_idempotent(
+            "k1", "test", (1, "hi"), fail, MessageResponse, FakeSession()
+        )
+
+    assert "k1" not in keys
+    handler, calls = counting_handler()
+    await run_idempotent(
+        "k1", "test", (1, "hi"), handler, MessageResponse, FakeSession()
+    )
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_in_progress_request_times_out_with_conflict(keys, monkeypatch):
+    monkeypatch.setattr(settings, "IDEMPOTENCY_WAIT_TIMEOUT", 0.05)
+    monkeypatch.setattr(settings, "IDEMPOTENCY_POLL_INTERVAL", 0.01)
+    keys["k1"] = SimpleNamespace(
+        request_hash=request_hash("test", (1, "hi")),
+        status=IdempotencyStatus.PENDING,
+    )
+    handler, calls = counting_handler()
+
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(
+            "k1", "test", (1, "hi"), handler, MessageResponse, FakeSession()
+        )
+
+    assert exc.value.status_code == 409
+    assert not calls
+
+
+@pytest.mark.asyncio
+async def test_without_key_handler_always_runs(keys):
+    handler, calls = counting_handler()
+    for _ in range(2):
+        await run_idempotent(
+            None, "test", (1, "hi"), handler, MessageResponse, FakeSession()
+        )
+    assert len(calls) == 2 and not keys
+
+
+@pytest.mark.asyncio
+async def test_response_is_stored_only_after_the_data_commits(keys):
+    class FailingCommit(FakeSession):
+        async def commit(self):
+            raise ConnectionError("connection lost")
+
+    handler, calls = counting_handler()
+    with pytest.raises(ConnectionError):
+        await run_idempotent(
+            "k1", "test", (1, "hi"), handler, MessageResponse, FailingCommit()
+        )
+
+    # Nothing to replay: a retry runs the request again
+    assert "k1" not in keys
+    await run_idempotent(
+        "k1", "test", (1, "hi"), handler, MessageResponse, FakeSession()
+    )
+    assert len(calls) == 2
@@ -0,0 +1,134 @@
+"""
+The job queue's SQL, against the configured database.
+
+Skipped when the database is not reachable.
+"""
+
+import asyncio
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.models.job import Job, JobStatus, JobType
+from app.services.job_service import JobService
+
+
+async def jobs_for(conversation_id):
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(Job).where(Job.conversation_id == conversation_id)
+        )
+        return list(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_enqueue_commits_with_the_callers_transaction(conversation_id):
+    async with AsyncSessionLocal() as session:
+        await JobService(session).enqueue(
+            JobType.AI_RESPONSE, conversation_id=conversation_id
+        )
+        await session.rollback()
+    assert await jobs_for(conversation_id) == []
+
+    async with AsyncSessionLocal() as session:
+        await JobService(session).enqueue(
+            JobType.AI_RESPONSE, conversation_id=conversation_id, debounce=5
+        )
+        await session.commit()
+        # A coalesced enqueue is rolled back with its caller, too
+        await JobService(session).enqueue(
+            JobType.AI_RESPONSE, conversation_id=conversation_id, debounce=60
+        )
+        await session.rollback()
+
+    [job] = await jobs_for(conversation_id)
+    assert job.status == JobStatus.QUEUED
+    assert (job.run_after - job.created_at).total_seconds() < 30
+
+
+async def enqueue(conversation_id, debounce, max_delay=None):
+    async with AsyncSessionLocal() as session:
+        job = await JobService(session).enqueue(
+            JobType.AI_RESPONSE,
+            conversation_id=conversation_id,
+            debounce=debounce,
+            max_delay=max_delay,
+        )
+        await session.commit()
+        return job.id
+
+
+@pytest.mark.asyncio
+async def test_rapid_enqueues_coalesce_into_one_pushed_back_job(conversation_id):
+    # Concurrent enqueues serialize on the conversation's advisory lock, so
+    # only the first inserts a job
+    ids = await asyncio.gather(
+        *(enqueue(conversation_id, debounce=30) for _ in range(5))
+    )
+    assert len(set(ids)) == 1
+    [job] = await jobs_for(conversation_id)
+    assert job.status == JobStatus.QUEUED
+    first_run_after = job.run_after
+
+    # Each later message pushes the pending job back
+    assert await enqueue(conversation_id, debounce=50) == job.id
+    [job] = await jobs_for(conversation_id)
+    assert job.run_after > first_run_after
+    assert 45 < (job.run_after - job.created_at).total_seconds() < 60
+
+    # ... but never beyond max_delay after the first enqueue
+    await enqueue(conversation_id, debounce=300, max_delay=70)
+    [job] = await jobs_for(conversation_id)
+    assert (job.run_after - job.created_at).total_seconds() == pytest.approx(70)
+
+
+@pytest.mark.asyncio
+async def test_conversation_with_a_running_job_is_not_claimed(conversation_id):
+    await enqueue(conversation_id, debounce=0)
+    async with AsyncSessionLocal() as session:
+        claimed = await JobService(session).claim("worker-1", limit=100)
+    [running] = [job for job in claimed if job.conversation_id == conversation_id]
+    assert running.status == JobStatus.RUNNING
+    assert running.locked_by == "worker-1"
+
+    # The next reply for the conversation waits for the running one
+    await enqueue(conversation_id, debounce=0)
+    async with AsyncSessionLocal() as session:
+        claimed = await JobService(session).claim("worker-2", limit=100)
+    assert all(job.conversation_id != conversation_id for job in claimed)
+
+    async with AsyncSessionLocal() as session:
+        await JobService(session).complete(running.id)
+        claimed = await JobService(session).claim("worker-2", limit=100)
+    [queued] = [job for job in claimed if job.conversation_id == conversation_id]
+    assert queued.id != running.id
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_keeps_a_slow_job_from_being_requeued(
+    conversation_id, monkeypatch
+):
+    await enqueue(conversation_id, debounce=0)
+    async with AsyncSessionLocal() as session:
+        claimed = await JobService(session).claim("worker-1", limit=100)
+    [job] = [job for job in claimed if job.conversation_id == conversation_id]
+
+    # The job has been running longer than the stale timeout
+    async with AsyncSessionLocal() as session:
+        await session.execute(
+            update(Job)
+            .where(Job.id == job.id)
+            .values(locked_at=func.now() - timedelta(minutes=10))
+        )
+        await session.commit()
+    monkeypatch.setattr(settings, "JOB_STALE_TIMEOUT", 60)
+
+    async with AsyncSessionLocal() as session:
+        assert not await JobService(session).heartbeat(job.id, "worker-2")
+        assert await JobService(session).heartbeat(job.id, "worker-1")
+        await JobService(session).requeue_stale()
+    [job] = await jobs_for(conversation_id)
+    assert job.status == JobStatus.RUNNING
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import time
+
+import anthropic
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.llm_providers import (
+    PROMPT_CACHING_BETA,
+    AnthropicProvider,
+    CircuitBreaker,
+    LLMProvider,
+    ProviderRouter,
+    ProviderUnavailableError,
+    with_cache_breakpoints,
+)
+from app.services.llm_scheduler import LLMScheduler
+
+PARAMS = {
+    "model": "primary",
+    "max_tokens": 16,
+    "messages": [{"role": "user", "content": "Lisbon?"}],
+}
+
+
+class FakeProvider(LLMProvider):
+    def __init__(self, model, latency=0.0, fail=False):
+        super().__init__(model)
+        self.latency_s = latency
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    @property
+    def name(self):
+        return self.model
+
+    async def complete(self, params, usage=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency_s)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+        self._record_usage({"input_tokens": 10, "output_tokens": 3}, usage)
+        return f"reply from {self.model}"
+
+    async def stream(self, params, usage=None):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError(f"{self.model} is down")
+        for word in ["reply", "from", self.model]:
+            yield word
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(settings, "AI_HEDGE_MIN_DELAY", 0.01)
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    primary = FakeProvider("primary", latency=5)
+    fallback = FakeProvider("fallback", latency=0.01)
+    router = ProviderRouter([primary, fallback], hedge=True)
+
+    started = time.perf_counter()
+    assert await router.complete(PARAMS) == "reply from fallback"
+    await asyncio.sleep(0)
+
+    assert time.perf_counter() - started < 1
+    assert primary.cancelled == 1
+    # Losing a hedge race is not a failure
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_hedge_takes_its_own_scheduler_slot():
+    scheduler = LLMScheduler(max_concurrency=2, tokens_per_minute=600)
+    primary = FakeProvider("primary", latency=5)
+    fallback = FakeProvider("fallback", latency=0.01)
+    router = ProviderRouter([primary, fallback], hedge=True)
+
+    async with scheduler.slot(tokens=100):
+        reply = await router.complete(PARAMS, scheduler=scheduler, tokens=100)
+        await asyncio.sleep(0)
+        assert reply == "reply from fallback"
+        assert scheduler.active == 1  # The hedge's slot is back
+        assert scheduler.bucket.tokens < 450  # Both calls were paid for
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_while_scheduler_is_throttled():
+    metrics.reset()
+    scheduler = LLMScheduler(max_concurrency=4)
+    primary = FakeProvider("primary", latency=0.2)
+    fallback = FakeProvider("fallback")
+    router = ProviderRouter([primary, fallback], hedge=True)
+
+    async with scheduler.slot():
+        scheduler.observe(httpx.Response(429, headers={"retry-after": "5"}))
+        reply = await router.complete(PARAMS, scheduler=scheduler)
+
+    assert reply == "reply from primary"
+    assert fallback.calls == 0
+    assert metrics.snapshot()["counters"]["ai.hedge.skipped{provider=fallback}"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    primary = FakeProvider("primary")
+    fallback = FakeProvider("fallback")
+    router = ProviderRouter([primary, fallback], hedge=True)
+
+    assert await router.complete(PARAMS) == "reply from primary"
+    assert fallback.calls == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_fails_over_without_waiting_for_hedge_delay(monkeypatch):
+    monkeypatch.setattr(settings, "AI_HEDGE_DEFAULT_DELAY", 5)
+    router = ProviderRouter(
+        [FakeProvider("primary", fail=True), FakeProvider("fallback")], hedge=True
+    )
+
+    started = time.perf_counter()
+    assert await router.complete(PARAMS) == "reply from fallback"
+    assert time.perf_counter() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_is_skipped_until_reset_timeout():
+    primary = FakeProvider("primary", fail=True)
+    primary.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    fallback = FakeProvider("fallback")
+    router = ProviderRouter([primary, fallback], hedge=False)
+
+    for _ in range(3):
+        assert await router.complete(PARAMS) == "reply from fallback"
+    assert primary.calls == 2  # Skipped once its circuit opened
+
+    await asyncio.sleep(0.06)
+    primary.fail = False
+    assert await router.complete(PARAMS) == "reply from primary"
+    assert primary.breaker.state == CircuitBreaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_all_circuits_open_raises():
+    primary = FakeProvider("primary", fail=True)
+    primary.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    router = ProviderRouter([primary])
+
+    with pytest.raises(RuntimeError):
+        await router.complete(PARAMS)
+    with pytest.raises(ProviderUnavailableError):
+        await router.complete(PARAMS)
+
+
+@pytest.mark.asyncio
+async def test_stream_fails_over_before_first_token():
+    router = ProviderRouter(
+        [FakeProvider("primary", fail=True), FakeProvider("fallback")]
+    )
+    assert [text async for text in router.stream(PARAMS)] == [
+        "reply",
+        "from",
+        "fallback",
+    ]
+
+
+def conversation(turns):
+    roles = ["user", "assistant"]
+    return [
+        {"role": roles[i % 2], "content": f"turn {i} " + "x" * 400}
+        for i in range(turns)
+    ]
+
+
+def test_cache_breakpoints_on_system_and_last_two_user_turns():
+    params = {**PARAMS, "system": "Summary", "messages": conversation(5)}
+    cached = with_cache_breakpoints(params, min_tokens=100)
+
+    assert cached["system"] == [
+        {"type": "text", "text": "Summary", "cache_control": {"type": "ephemeral"}}
+    ]
+    marked = [
+        i
+        for i, msg in enumerate(cached["messages"])
+        if isinstance(msg["content"], list) and "cache_control" in msg["content"][-1]
+    ]
+    assert marked == [2, 4]
+    # The caller's params are left untouched
+    assert isinstance(params["messages"][4]["content"], str)
+
+
+def test_short_prompts_get_no_breakpoints():
+    params = {**PARAMS, "messages": conversation(1)}
+    assert with_cache_breakpoints(params, min_tokens=1024) is params
+
+
+@pytest.mark.asyncio
+async def test_anthropic_provider_reports_cache_usage(monkeypatch):
+    monkeypatch.setattr(settings, "AI_PROMPT_CACHE_MIN_TOKENS", 100)
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(
+            200,
+            json={
+                "id": "msg_test",
+                "type": "message",
+                "role": "assistant",
+                "model": "claude-3-opus-20240229",
+                "content": [{"type": "text", "text": "Day 1: Alfama."}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {
+                    "input_tokens": 12,
+                    "output_tokens": 5,
+                    "cache_creation_input_tokens": 100,
+                    "cache_read_input_tokens": 300,
+                },
+            },
+        )
+
+    client = anthropic.AsyncAnthropic(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    provider = AnthropicProvider(client, "claude-3-opus-20240229", prompt_caching=True)
+    usage = {}
+
+    await provider.complete({**PARAMS, "messages": conversation(3)}, usage)
+
+    body = json.loads(requests[0].content)
+    assert requests[0].headers["anthropic-beta"] == PROMPT_CACHING_BETA
+    assert body["messages"][2]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert usage == {
+        "input_tokens": 12,
+        "output_tokens": 5,
+        "cache_creation_input_tokens": 100,
+        "cache_read_input_tokens": 300,
+    }
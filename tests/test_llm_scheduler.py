@@ -0,0 +1,92 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.services.llm_scheduler import LLMScheduler, Priority
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped():
+    scheduler = LLMScheduler(max_concurrency=2)
+    running, peak = 0, 0
+
+    async def call():
+        nonlocal running, peak
+        async with scheduler.slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+    await asyncio.gather(*(call() for _ in range(6)))
+    assert peak == 2
+    assert scheduler.active == 0
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_are_admitted_before_background():
+    scheduler = LLMScheduler(max_concurrency=1)
+    order = []
+
+    async def call(priority, name):
+        async with scheduler.slot(priority):
+            order.append(name)
+
+    async with scheduler.slot():
+        tasks = [
+            asyncio.create_task(call(Priority.BACKGROUND, "summary")),
+            asyncio.create_task(call(Priority.INTERACTIVE, "reply")),
+        ]
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+    assert order == ["reply", "summary"]
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_halves_limit_and_pauses_new_calls():
+    scheduler = LLMScheduler(max_concurrency=8)
+    scheduler.observe(httpx.Response(429, headers={"retry-after": "0.1"}))
+    scheduler.observe(httpx.Response(429, headers={"retry-after": "0.1"}))
+
+    # One cut per throttling episode
+    assert scheduler.limit == 4
+    started = time.monotonic()
+    async with scheduler.slot():
+        pass
+    assert time.monotonic() - started >= 0.09
+
+    # Successful calls grow the limit back additively
+    for _ in range(3):
+        async with scheduler.slot():
+            pass
+    assert 4 < scheduler.limit < 5
+
+
+@pytest.mark.asyncio
+async def test_token_budget_delays_calls():
+    scheduler = LLMScheduler(tokens_per_minute=600)  # 10 tokens per second
+    async with scheduler.slot(tokens=600):
+        pass
+
+    started = time.monotonic()
+    async with scheduler.slot(tokens=2):
+        pass
+    assert time.monotonic() - started >= 0.15
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(max_concurrency=1)
+    async with scheduler.slot():
+        waiter = asyncio.create_task(scheduler.slot().__aenter__())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    async with scheduler.slot():
+        assert scheduler.active == 1
+    assert scheduler.active == 0
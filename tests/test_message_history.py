@@ -0,0 +1,32 @@
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import inspect
+
+from app.models.message import Message, MessageType
+from app.services.message_service import MessageService
+from tests.conftest import FakeSession
+
+
+def test_heavy_columns_deferred():
+    columns = inspect(Message).column_attrs
+    assert columns["embedding"].deferred
+    assert columns["message_metadata"].deferred
+    assert not columns["content"].deferred
+
+
+@pytest.mark.asyncio
+async def test_history_selects_only_prompt_columns():
+    at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    session = FakeSession(
+        [(1, MessageType.USER, "hi", at), (2, MessageType.AI, "hello", at)]
+    )
+
+    history = await MessageService(session).get_message_history(7)
+
+    assert history == [
+        {"id": 1, "message_type": "user", "content": "hi", "created_at": at},
+        {"id": 2, "message_type": "ai", "content": "hello", "created_at": at},
+    ]
+    selected = [c.name for c in session.statements[0].selected_columns]
+    assert selected == ["id", "message_type", "content", "created_at"]
@@ -0,0 +1,48 @@
+"""Tests for bulk message import: line splitting and batch validation."""
+
+import pytest
+
+from app.models.message import MessageType
+from app.services.message_import import MessageImportError, _validate, iter_lines
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+@pytest.mark.asyncio
+async def test_iter_lines_rejoins_lines_split_across_chunks():
+    lines = [line async for line in iter_lines(chunks(b'{"a"', b": 1}\n{", b"}"))]
+    assert lines == [b'{"a": 1}', b"{}"]
+
+
+def test_validate_parses_a_batch():
+    records = _validate(
+        [
+            b'{"content": "Hi", "message_type": "user"}',
+            b'{"content": "Hello", "message_type": "ai", "message_metadata": {"k": 1}}',
+        ],
+        [1, 2],
+    )
+    assert [r.message_type for r in records] == [MessageType.USER, MessageType.AI]
+    assert records[1].message_metadata == {"k": 1}
+
+
+def test_validate_reports_the_line_of_an_invalid_record():
+    with pytest.raises(MessageImportError) as e:
+        _validate(
+            [
+                b'{"content": "Hi", "message_type": "user"}',
+                b'{"content": "Hi", "message_type": "robot"}',
+            ],
+            [3, 5],
+        )
+    assert e.value.line == 5
+    assert e.value.errors[0]["loc"] == ("message_type",)
+
+
+def test_validate_reports_the_line_of_malformed_json():
+    with pytest.raises(MessageImportError) as e:
+        _validate([b'{"content": "Hi", "message_type": "user"}', b'{"content"'], [1, 2])
+    assert e.value.line == 2
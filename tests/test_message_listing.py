@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.db.base import AsyncSessionLocal
+from app.schemas.message import MessageCreate
+from app.services.message_service import MessageService
+from tests.conftest import FakeSession
+
+
+def row(id):
+    return SimpleNamespace(id=id, created_at=None, content="hi")
+
+
+@pytest.mark.asyncio
+async def test_listing_is_one_statement_joined_to_the_conversation():
+    session = FakeSession([row(1), row(2)])
+
+    page = await MessageService(session).get_conversation_messages(7, limit=10)
+
+    assert [r.id for r in page.items] == [1, 2]
+    assert len(session.statements) == 1
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "FROM conversations LEFT OUTER JOIN" in sql
+
+
+@pytest.mark.asyncio
+async def test_missing_conversation_is_none_and_empty_one_is_an_empty_page(
+    conversation_id,
+):
+    async with AsyncSessionLocal() as session:
+        service = MessageService(session)
+        assert await service.get_conversation_messages(-1) is None
+
+        page = await service.get_conversation_messages(conversation_id)
+        assert page.items == []
+        assert page.next_cursor is None
+
+        for content in ("Hi", "Hello!", "Any tips?"):
+            await service.create_message(
+                MessageCreate(
+                    content=content,
+                    message_type="user",
+                    conversation_id=conversation_id,
+                )
+            )
+        page = await service.get_conversation_messages(conversation_id, limit=2)
+        assert [r.content for r in page.items] == ["Hi", "Hello!"]
+        assert page.next_cursor is not None
+        await session.rollback()
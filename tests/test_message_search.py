@@ -0,0 +1,126 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.api.endpoints import messages as messages_endpoint
+from app.api.fields import project
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.main import app
+from app.models.message import Message, MessageType
+from app.schemas.message import (
+    MESSAGE_DEFAULT_FIELDS,
+    MessageCreate,
+    MessageFieldsResponse,
+)
+from app.services.ai_service import get_ai_service
+from app.services.message_service import MessageService
+
+SEARCH_URL = f"{settings.API_V1_STR}/messages/search"
+
+
+class FakeAIService:
+    async def generate_embedding(self, text):
+        return [0.1] * settings.EMBEDDING_DIMENSIONS
+
+
+@pytest.fixture
+def fake_ai():
+    app.dependency_overrides[get_ai_service] = FakeAIService
+    yield
+    app.dependency_overrides.pop(get_ai_service, None)
+
+
+def make_message(id, embedding=None):
+    return Message(
+        id=id,
+        conversation_id=1,
+        content=f"message {id}",
+        message_type=MessageType.USER,
+        created_at=datetime(2024, 5, 1, tzinfo=timezone.utc),
+        embedding=embedding,
+    )
+
+
+def test_response_accepts_pgvector_arrays():
+    message = make_message(1, embedding=np.array([0.5, 0.25], dtype=np.float32))
+    response = MessageFieldsResponse.model_validate(project(message, ["embedding"]))
+    assert response.embedding == [0.5, 0.25]
+
+
+def test_search_returns_nearest_messages(client, fake_ai, monkeypatch):
+    calls = {}
+
+    class FakeMessageService:
+        def __init__(self, db):
+            pass
+
+        async def search_similar(self, embedding, k, conversation_id):
+            calls.update(k=k, conversation_id=conversation_id)
+            return [
+                SimpleNamespace(
+                    **project(make_message(3), MESSAGE_DEFAULT_FIELDS), distance=0.1
+                ),
+                SimpleNamespace(
+                    **project(make_message(9), MESSAGE_DEFAULT_FIELDS), distance=0.4
+                ),
+            ]
+
+    monkeypatch.setattr(messages_endpoint, "MessageService", FakeMessageService)
+
+    response = client.get(
+        SEARCH_URL, params={"q": "hotels", "k": 2, "conversation_id": 1}
+    )
+
+    assert response.status_code == 200
+    assert [(m["id"], m["distance"]) for m in response.json()] == [(3, 0.1), (9, 0.4)]
+    assert calls == {"k": 2, "conversation_id": 1}
+    assert "embedding" not in response.json()[0]
+
+
+def test_search_disabled(client, fake_ai, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_VECTOR_SEARCH", False)
+    response = client.get(SEARCH_URL, params={"q": "hotels"})
+    assert response.status_code == 404
+
+
+def test_search_rejects_query_without_direction(client, monkeypatch):
+    class ZeroAIService:
+        async def generate_embedding(self, text):
+            return [0.0] * settings.EMBEDDING_DIMENSIONS
+
+    app.dependency_overrides[get_ai_service] = ZeroAIService
+    try:
+        response = client.get(SEARCH_URL, params={"q": "!!!"})
+    finally:
+        app.dependency_overrides.pop(get_ai_service, None)
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_search_skips_messages_with_zero_embeddings(conversation_id):
+    direction = [1.0] + [0.0] * (settings.EMBEDDING_DIMENSIONS - 1)
+    async with AsyncSessionLocal() as session:
+        service = MessageService(session)
+        ids = []
+        for content in ("Hotels in Porto", "!!!"):
+            message = await service.create_message(
+                MessageCreate(
+                    content=content,
+                    message_type="user",
+                    conversation_id=conversation_id,
+                )
+            )
+            ids.append(message.id)
+        # pgvector's cosine distance to a zero vector is NaN, which sorts first
+        await service.update_message_embeddings(
+            {ids[0]: direction, ids[1]: [0.0] * settings.EMBEDDING_DIMENSIONS}
+        )
+
+        matches = await service.search_similar(
+            direction, k=2, conversation_id=conversation_id
+        )
+        assert [m.id for m in matches] == [ids[0]]
+        await session.rollback()
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services.model_router import ModelRouter, ModelTier
+
+TIERS = {"simple": "claude-3-sonnet-20240229", "complex": "claude-3-opus-20240229"}
+
+
+def router(**kwargs) -> ModelRouter:
+    options = {
+        "tiers": TIERS,
+        "keywords": {"itinerary": "complex"},
+        "simple_max_chars": 80,
+        "simple_max_history": 4,
+    }
+    return ModelRouter(**{**options, **kwargs})
+
+
+def turns(*contents):
+    return [{"message_type": "user", "content": content} for content in contents]
+
+
+def test_short_follow_up_is_simple():
+    tier = router().choose(turns("Where should I go in Portugal?", "ok, and in July?"))
+    assert tier == ModelTier("simple", "claude-3-sonnet-20240229")
+    assert tier.reply_metadata() == {
+        "model_tier": "simple",
+        "model": "claude-3-sonnet-20240229",
+    }
+    assert tier.reply_metadata({"input_tokens": 5})["usage"] == {"input_tokens": 5}
+
+
+@pytest.mark.parametrize(
+    "history, reason",
+    [
+        (turns("Plan my Itinerary please"), "keyword"),
+        (turns("x" * 81), "length"),
+        (turns("a", "b", "c", "d", "e"), "history"),
+    ],
+)
+def test_complex_turns(history, reason):
+    assert router().classify(history) == ("complex", reason)
+
+
+def test_keyword_matches_whole_words_only():
+    assert router().classify(turns("itineraryless"))[0] == "simple"
+
+
+def test_keyword_rules_must_name_configured_tiers():
+    with pytest.raises(ValueError):
+        router(keywords={"visa": "expert"})
+
+
+def test_empty_history_is_simple():
+    assert router().classify([]) == ("simple", "short")
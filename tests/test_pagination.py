@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.future import select
+
+from app.core.pagination import decode_cursor, encode_cursor, keyset_page, to_page
+from app.models.conversation import Conversation
+from app.models.message import Message
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(created_at, 42)
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+def test_invalid_cursor_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_keyset_query_seeks_past_cursor():
+    cursor = encode_cursor(datetime(2024, 5, 1, tzinfo=timezone.utc), 7)
+    query = keyset_page(select(Message), Message, 10, cursor, descending=False)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert "(messages.created_at, messages.id) > (" in sql
+    assert "ORDER BY messages.created_at, messages.id" in sql
+    assert "OFFSET" not in sql
+
+
+def test_keyset_query_sorts_by_last_activity():
+    cursor = encode_cursor(datetime(2024, 5, 1, tzinfo=timezone.utc), 7)
+    query = keyset_page(
+        select(Conversation.id, Conversation.last_activity_at),
+        Conversation,
+        10,
+        cursor,
+        descending=True,
+        sort_column=Conversation.last_activity_at,
+    )
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    # Same expression as ix_conversations_last_activity_at_id
+    activity = "coalesce(conversations.last_message_at, conversations.created_at)"
+    assert f"({activity}, conversations.id) < (" in sql
+    assert "ORDER BY last_activity_at DESC, conversations.id DESC" in sql
+
+
+def test_to_page_sets_cursor_only_when_more_rows():
+    rows = [
+        SimpleNamespace(id=i, created_at=datetime(2024, 5, i, tzinfo=timezone.utc))
+        for i in range(1, 5)
+    ]
+
+    page = to_page(rows, limit=3)
+    assert [r.id for r in page.items] == [1, 2, 3]
+    assert decode_cursor(page.next_cursor) == (rows[2].created_at, 3)
+
+    last_page = to_page(rows[3:], limit=3)
+    assert last_page.next_cursor is None
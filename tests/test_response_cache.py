@@ -0,0 +1,175 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.models.message import Message
+from app.models.response_cache import CachedResponse
+from app.schemas.message import MessageCreate
+from app.services.ai_service import FALLBACK_RESPONSE
+from app.services.context_builder import ContextWindow
+from app.services.message_service import MessageService
+from app.services.model_router import ModelTier
+from app.services.response_cache import ResponseCacheService, context_fingerprint
+from tests.conftest import FakeSession
+
+SIMPLE = ModelTier("simple", "claude-simple")
+COMPLEX = ModelTier("complex", "claude-complex")
+
+
+class FakeAIService:
+    model = "claude-test"
+    embedding_backend = SimpleNamespace(model_id="hashing:test")
+
+    async def generate_embedding(self, text):
+        if not any(c.isalnum() for c in text):
+            return [0.0] * settings.EMBEDDING_DIMENSIONS  # No features to embed
+        return [0.5] * settings.EMBEDDING_DIMENSIONS
+
+
+def window(*contents, summary=None):
+    messages = [
+        {"id": i, "message_type": "user" if i % 2 == 0 else "ai", "content": c}
+        for i, c in enumerate(contents)
+    ]
+    return ContextWindow(messages, summary, tokens_total=0, tokens_sent=0)
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RESPONSE_CACHE", True)
+    metrics.reset()
+    return ResponseCacheService(FakeSession(), FakeAIService())
+
+
+def nearest(distance):
+    async def _nearest(context, tier):
+        return SimpleNamespace(
+            response="Spring or autumn.", generation_seconds=2.0, distance=distance
+        )
+
+    return _nearest
+
+
+def test_fingerprint_covers_preceding_context_only():
+    base = context_fingerprint(window("Hi", "Hello!", "Best time to visit Lisbon?"))
+
+    assert base == context_fingerprint(window("hi ", "hello!", "And Porto?"))
+    assert base != context_fingerprint(window("Hi", "Hey!", "Best time?"))
+    assert base != context_fingerprint(window("Hi", "Hello!", "Best?", summary="x"))
+
+
+@pytest.mark.asyncio
+async def test_similar_prompt_served_from_cache(cache, monkeypatch):
+    monkeypatch.setattr(cache, "_nearest", nearest(0.01))
+
+    cached = await cache.lookup(window("Best time to visit Lisbon?"), SIMPLE, "test")
+
+    assert cached.response == "Spring or autumn."
+    # No model was called for the reply
+    assert cached.reply_metadata() == {"response_cache": {"similarity": 0.99}}
+    counters = metrics.snapshot()["counters"]
+    assert counters["response_cache.hits{route=test}"] == 1
+    assert 0 < counters["response_cache.seconds_saved{route=test}"] <= 2.0
+
+
+@pytest.mark.asyncio
+async def test_miss_is_stored_for_the_tier_model(cache, monkeypatch):
+    monkeypatch.setattr(cache, "_nearest", nearest(0.3))
+    context = window("Best time to visit Porto?")
+
+    assert await cache.lookup(context, COMPLEX, "test") is None
+    await cache.store(context, COMPLEX, "Late spring.", 2.0)
+
+    assert metrics.snapshot()["counters"]["response_cache.misses{route=test}"] == 1
+    stored = cache.db.statements[0].compile().params
+    assert stored["prompt"] == "Best time to visit Porto?"
+    assert stored["model"] == "claude-complex"
+    assert stored["embedding_model"] == "hashing:test"
+
+
+@pytest.mark.asyncio
+async def test_fallbacks_and_long_conversations_not_cached(cache):
+    await cache.store(
+        window("Best time to visit Lisbon?"), SIMPLE, FALLBACK_RESPONSE, 1.0
+    )
+    long_context = window("a", "b", "c", "d", "e")
+    assert not cache.eligible(long_context)
+    assert await cache.lookup(long_context, SIMPLE, "test") is None
+
+    assert cache.db.statements == []
+
+
+@pytest.mark.asyncio
+async def test_punctuation_only_prompts_never_hit_or_store(cache, monkeypatch):
+    # pgvector's cosine distance to a zero vector is NaN
+    monkeypatch.setattr(cache, "_nearest", nearest(float("nan")))
+
+    assert await cache.lookup(window("👍"), SIMPLE, "test") is None
+    await cache.store(window("!!!"), SIMPLE, "Glad to help!", 1.0)
+
+    assert metrics.snapshot()["counters"]["response_cache.misses{route=test}"] == 1
+    assert cache.db.statements == []
+
+
+@pytest.mark.asyncio
+async def test_stored_reply_is_only_found_for_its_tier_model(database, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RESPONSE_CACHE", True)
+    # A preceding turn of its own keeps other entries out of the lookup
+    context = window(f"Hi {uuid4()}", "Hello!", "Best time to visit Lisbon?")
+    try:
+        async with AsyncSessionLocal() as session:
+            cache = ResponseCacheService(session, FakeAIService())
+            assert await cache.lookup(context, SIMPLE, "test") is None
+            await cache.store(context, SIMPLE, "Spring or autumn.", 2.0)
+            await session.commit()
+
+            # A turn routed to another tier is not answered by this one's model
+            assert await cache.lookup(context, COMPLEX, "test") is None
+            cached = await cache.lookup(context, SIMPLE, "test")
+            assert cached.response == "Spring or autumn."
+            assert cached.similarity == pytest.approx(1.0)
+    finally:
+        async with AsyncSessionLocal() as session:
+            await session.execute(
+                delete(CachedResponse).where(
+                    CachedResponse.context_fingerprint == context_fingerprint(context)
+                )
+            )
+            await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_failed_write_keeps_the_callers_transaction(conversation_id, monkeypatch):
+    monkeypatch.setattr(settings, "ENABLE_RESPONSE_CACHE", True)
+
+    class NaNAIService(FakeAIService):
+        async def generate_embedding(self, text):
+            return [
+                float("nan")
+            ] * settings.EMBEDDING_DIMENSIONS  # Rejected by pgvector
+
+    ai_service = NaNAIService()
+
+    async with AsyncSessionLocal() as session:
+        message = await MessageService(session).create_message(
+            MessageCreate(
+                content="Best time to visit Lisbon?",
+                message_type="user",
+                conversation_id=conversation_id,
+            )
+        )
+        await ResponseCacheService(session, ai_service).store(
+            window("Best time to visit Lisbon?"), SIMPLE, "Spring or autumn.", 2.0
+        )
+        await session.commit()
+
+    async with AsyncSessionLocal() as session:
+        stored = await session.scalar(
+            select(Message.id).where(Message.id == message.id)
+        )
+    assert stored == message.id
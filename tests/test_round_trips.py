@@ -0,0 +1,439 @@
+"""
+Database round trips per endpoint, counted against the configured database.
+
+Each write endpoint should flush its changes with RETURNING and commit once
+(an inline AI reply commits the user turn before the LLM call, then the
+reply), so an extra refresh, commit or lazy load shows up here as a failure.
+Skipped when the database is not reachable.
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal, engine
+from app.main import app
+from app.services.ai_service import get_ai_service
+from app.services.model_router import ModelTier
+from app.services.reply_service import ReplyService
+from app.services.response_cache import ResponseCacheService
+from tests.conftest import count_round_trips
+
+API = settings.API_V1_STR
+
+
+class FakeAIService:
+    model = "fake"
+
+    def choose_tier(self, message_history):
+        return ModelTier("default", self.model)
+
+    async def generate_response(self, message_history, **kwargs):
+        return "Try Lisbon in May."
+
+    async def stream_response(self, message_history, **kwargs):
+        yield "Try Lisbon in May."
+
+
+@pytest_asyncio.fixture
+async def client(database):
+    app.dependency_overrides[get_ai_service] = FakeAIService
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+async def round_trips(client, method, url, **kwargs):
+    with count_round_trips() as counts:
+        response = await client.request(method, API + url, **kwargs)
+    assert response.status_code == 200, response.text
+    return counts["round_trips"], response.json()
+
+
+@pytest.mark.asyncio
+async def test_round_trips_per_endpoint(client):
+    # BEGIN, INSERT ... RETURNING, COMMIT
+    trips, conversation = await round_trips(
+        client, "POST", "/conversations/", json={"title": "Round trips"}
+    )
+    assert trips == 3
+    conversation_id = conversation["id"]
+
+    trips, _ = await round_trips(
+        client,
+        "PUT",
+        f"/conversations/{conversation_id}",
+        json={"title": "Renamed"},
+    )
+    assert trips == 3
+
+    # BEGIN, INSERT user message, history, COMMIT; BEGIN, summary, ROLLBACK
+    # (the context builder's own session); BEGIN, INSERT reply, COMMIT
+    trips, reply = await round_trips(
+        client,
+        "POST",
+        f"/messages/{conversation_id}/messages",
+        json={
+            "content": "Where should I go in spring?",
+            "message_type": "user",
+            "conversation_id": conversation_id,
+        },
+    )
+    assert trips == 10
+
+    trips, _ = await round_trips(
+        client, "PUT", f"/messages/{reply['id']}", json={"content": "Edited"}
+    )
+    assert trips == 3
+
+    trips, messages = await round_trips(
+        client, "GET", f"/conversations/{conversation_id}/messages"
+    )
+    assert trips == 3  # BEGIN, page joined to the conversation, COMMIT
+
+    # Exported through a server-side cursor, one JSON object per line
+    export = await client.get(f"{API}/conversations/{conversation_id}/messages/export")
+    assert export.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in export.text.splitlines()]
+    assert [m["id"] for m in lines] == [m["id"] for m in messages]
+
+    for message in messages:
+        trips, _ = await round_trips(client, "DELETE", f"/messages/{message['id']}")
+        assert trips == 3
+
+    trips, _ = await round_trips(client, "DELETE", f"/conversations/{conversation_id}")
+    assert trips == 3
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_is_all_or_nothing(client):
+    conversation = (
+        await client.post(f"{API}/conversations/", json={"title": "Import"})
+    ).json()
+    url = f"{API}/conversations/{conversation['id']}/messages:bulk"
+    records = [
+        {"content": f"Message {i}", "message_type": "user" if i % 2 else "ai"}
+        for i in range(10)
+    ]
+    body = "\n".join(json.dumps(r) for r in records)
+
+    # A bad record on line 11 rejects the lines before it too
+    response = await client.post(url, content=body + '\n{"content": "x"}\n')
+    assert response.status_code == 422
+    assert response.json()["detail"]["line"] == 11
+
+    with count_round_trips() as counts:
+        response = await client.post(url, content=body)
+    assert response.json() == {"imported": 10}
+    # BEGIN, conversation check, COPY, COMMIT: independent of the batch size
+    assert counts["round_trips"] == 3
+
+    messages = (
+        await client.get(f"{API}/conversations/{conversation['id']}/messages")
+    ).json()
+    assert [m["content"] for m in messages] == [r["content"] for r in records]
+
+    missing = await client.post(f"{API}/conversations/0/messages:bulk", content=body)
+    assert missing.status_code == 404
+
+    for message in messages:
+        await client.delete(f"{API}/messages/{message['id']}")
+    await client.delete(f"{API}/conversations/{conversation['id']}")
+
+
+@pytest.mark.asyncio
+async def test_inbox_counters_follow_every_write_path(client):
+    older, newer = [
+        (await client.post(f"{API}/conversations/", json={"title": title})).json()
+        for title in ("Older", "Newer")
+    ]
+
+    async def inbox():
+        trips, rows = await round_trips(
+            client, "GET", "/conversations/", params={"sort": "last_activity_at"}
+        )
+        assert trips == 3  # BEGIN, one indexed query, COMMIT
+        return {row["id"]: row for row in rows}
+
+    # Empty conversations sort by creation
+    ids = list(await inbox())
+    assert ids.index(newer["id"]) < ids.index(older["id"])
+
+    # A message turn (user message and reply) moves the older one to the top
+    await client.post(
+        f"{API}/messages/{older['id']}/messages",
+        json={
+            "content": "Where should I go in spring?",
+            "message_type": "user",
+            "conversation_id": older["id"],
+        },
+    )
+    rows = await inbox()
+    assert list(rows)[0] == older["id"]
+    assert rows[older["id"]]["message_count"] == 2
+    assert rows[older["id"]]["last_message_preview"] == "Try Lisbon in May."
+
+    # COPY counts too; a backdated import does not become the latest message
+    body = "\n".join(
+        json.dumps(
+            {"content": "x" * 500, "message_type": "user", "created_at": "2020-01-01"}
+        )
+        for _ in range(3)
+    )
+    await client.post(f"{API}/conversations/{older['id']}/messages:bulk", content=body)
+    await client.post(f"{API}/conversations/{newer['id']}/messages:bulk", content=body)
+    rows = await inbox()
+    assert rows[older["id"]]["message_count"] == 5
+    assert rows[older["id"]]["last_message_preview"] == "Try Lisbon in May."
+    assert rows[newer["id"]]["last_message_preview"] == "x" * 200
+
+    # Editing and deleting the latest message update the preview
+    messages = (await client.get(f"{API}/conversations/{older['id']}/messages")).json()
+    await client.put(f"{API}/messages/{messages[-1]['id']}", json={"content": "Porto"})
+    assert (await inbox())[older["id"]]["last_message_preview"] == "Porto"
+    await client.delete(f"{API}/messages/{messages[-1]['id']}")
+    rows = await inbox()
+    assert rows[older["id"]]["message_count"] == 4
+    assert rows[older["id"]]["last_message_preview"] == messages[-2]["content"]
+
+    for conversation in (older, newer):
+        messages = (
+            await client.get(f"{API}/conversations/{conversation['id']}/messages")
+        ).json()
+        for message in messages:
+            await client.delete(f"{API}/messages/{message['id']}")
+        row = (await inbox())[conversation["id"]]
+        assert (row["message_count"], row["last_message_at"]) == (0, None)
+        await client.delete(f"{API}/conversations/{conversation['id']}")
+
+
+@pytest.mark.asyncio
+async def test_slow_cache_write_does_not_cost_the_reply(client, monkeypatch):
+    async def slow_store(self, context, tier, response, generation_seconds):
+        await asyncio.sleep(0.6)
+
+    monkeypatch.setattr(ResponseCacheService, "store", slow_store)
+    monkeypatch.setitem(settings.REQUEST_DEADLINES, "messages.create", 0.5)
+    conversation = (
+        await client.post(f"{API}/conversations/", json={"title": "Deadline"})
+    ).json()
+
+    response = await client.post(
+        f"{API}/messages/{conversation['id']}/messages",
+        json={
+            "content": "Where should I go in spring?",
+            "message_type": "user",
+            "conversation_id": conversation["id"],
+        },
+    )
+
+    assert response.status_code == 200, response.text
+    assert response.json()["content"] == "Try Lisbon in May."
+    messages = (
+        await client.get(f"{API}/conversations/{conversation['id']}/messages")
+    ).json()
+    for message in messages:
+        await client.delete(f"{API}/messages/{message['id']}")
+    await client.delete(f"{API}/conversations/{conversation['id']}")
+
+
+async def post_turn(client, conversation_id, path=None):
+    return await client.post(
+        API + (path or f"/messages/{conversation_id}/messages"),
+        json={
+            "content": "Where should I go in spring?",
+            "message_type": "user",
+            "conversation_id": conversation_id,
+        },
+    )
+
+
+async def write_concurrently(conversation_id):
+    """Edit the conversation and add a message from another connection.
+
+    Fails with a lock timeout if the request in flight still holds the
+    conversation's row lock. Returns the message count the writer saw.
+    """
+    async with engine.connect() as conn:
+        await conn.execute(text("SET LOCAL lock_timeout = '200ms'"))
+        await conn.execute(
+            text("UPDATE conversations SET title = 'Renamed' WHERE id = :id"),
+            {"id": conversation_id},
+        )
+        count = await conn.scalar(
+            text("SELECT message_count FROM conversations WHERE id = :id"),
+            {"id": conversation_id},
+        )
+        await conn.execute(
+            text(
+                "INSERT INTO messages (conversation_id, content, message_type) "
+                "VALUES (:id, 'From another tab', 'USER')"
+            ),
+            {"id": conversation_id},
+        )
+        await conn.rollback()
+    return count
+
+
+def blocking(result):
+    """An AI service method that waits to be released, and its events."""
+    called, release = asyncio.Event(), asyncio.Event()
+
+    async def method(self, *args, **kwargs):
+        called.set()
+        await release.wait()
+        return result
+
+    return method, called, release
+
+
+async def message_types(client, conversation_id):
+    messages = (
+        await client.get(f"{API}/conversations/{conversation_id}/messages")
+    ).json()
+    return [m["message_type"] for m in messages]
+
+
+@pytest.mark.asyncio
+async def test_inline_reply_holds_no_lock_during_the_llm_call(
+    client, conversation_id, monkeypatch
+):
+    slow_reply, generating, release = blocking("Try Lisbon in May.")
+    monkeypatch.setattr(FakeAIService, "generate_response", slow_reply)
+
+    turn = asyncio.create_task(post_turn(client, conversation_id))
+    try:
+        await asyncio.wait_for(generating.wait(), 5)
+        # Another writer (a title edit, the worker's reply) is not queued
+        # behind the LLM call, and already sees the user message
+        assert await write_concurrently(conversation_id) == 1
+    finally:
+        release.set()
+        response = await turn
+
+    assert response.status_code == 200, response.text
+    assert await message_types(client, conversation_id) == ["user", "ai"]
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "/messages/{id}/messages",
+        "/messages/{id}/messages/stream",
+        "/conversations/{id}/messages/stream",
+    ],
+)
+@pytest.mark.asyncio
+async def test_summary_call_holds_no_lock(client, conversation_id, monkeypatch, path):
+    response = await post_turn(client, conversation_id)
+    assert response.status_code == 200, response.text
+
+    # The second turn folds the first into the summary
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 1)
+    slow_summary, summarizing, release = blocking("Wants to travel in spring.")
+    monkeypatch.setattr(FakeAIService, "summarize", slow_summary, raising=False)
+
+    turn = asyncio.create_task(
+        post_turn(client, conversation_id, path.format(id=conversation_id))
+    )
+    try:
+        await asyncio.wait_for(summarizing.wait(), 5)
+        assert await write_concurrently(conversation_id) == 3
+    finally:
+        release.set()
+        response = await turn
+
+    assert response.status_code == 200, response.text
+    assert await message_types(client, conversation_id) == ["user", "ai"] * 2
+
+
+@pytest.mark.asyncio
+async def test_slow_summary_is_its_own_deadline_stage(
+    client, conversation_id, monkeypatch
+):
+    response = await post_turn(client, conversation_id)
+    assert response.status_code == 200, response.text
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 1)
+    slow_summary, _, _ = blocking("Wants to travel in spring.")
+    monkeypatch.setattr(FakeAIService, "summarize", slow_summary, raising=False)
+    monkeypatch.setitem(settings.REQUEST_DEADLINES, "messages.create", 0.5)
+
+    response = await post_turn(client, conversation_id)
+
+    assert response.status_code == 504
+    assert response.json()["detail"] == "Request deadline exceeded (summary)"
+    # The turn is discarded with its reply
+    assert await message_types(client, conversation_id) == ["user", "ai"]
+
+
+@pytest.mark.asyncio
+async def test_worker_reply_holds_no_lock_during_the_llm_call(
+    client, conversation_id, monkeypatch
+):
+    response = await post_turn(client, conversation_id)
+    assert response.status_code == 200, response.text
+
+    # The reply folds the first turn into the summary before the LLM call
+    monkeypatch.setattr(settings, "CONTEXT_TOKEN_BUDGET", 1)
+
+    async def summarize(self, previous_summary, message_history, **kwargs):
+        return "Wants to travel in spring."
+
+    monkeypatch.setattr(FakeAIService, "summarize", summarize, raising=False)
+    response = await client.post(
+        f"{API}/conversations/{conversation_id}/messages",
+        json={
+            "content": "Where should I go in spring?",
+            "message_type": "user",
+            "conversation_id": conversation_id,
+        },
+    )
+    assert response.status_code == 200, response.text
+    slow_reply, generating, release = blocking("Try Lisbon in May.")
+    monkeypatch.setattr(FakeAIService, "complete", slow_reply, raising=False)
+
+    async def reply():
+        async with AsyncSessionLocal() as session:
+            return await ReplyService(session, FakeAIService()).generate_reply(
+                conversation_id, fallback_on_error=False
+            )
+
+    job = asyncio.create_task(reply())
+    try:
+        await asyncio.wait_for(generating.wait(), 5)
+        assert await write_concurrently(conversation_id) == 3
+    finally:
+        release.set()
+        await job
+
+    assert await message_types(client, conversation_id) == ["user", "ai"] * 2
+
+
+@pytest.mark.asyncio
+async def test_failed_inline_reply_discards_the_user_message(client, monkeypatch):
+    async def failing_reply(self, message_history, **kwargs):
+        raise HTTPException(status_code=500, detail="Error generating AI response")
+
+    monkeypatch.setattr(FakeAIService, "generate_response", failing_reply)
+    conversation = (
+        await client.post(f"{API}/conversations/", json={"title": "Failure"})
+    ).json()
+
+    response = await post_turn(client, conversation["id"])
+
+    assert response.status_code == 500
+    messages = (
+        await client.get(f"{API}/conversations/{conversation['id']}/messages")
+    ).json()
+    assert messages == []
+    await client.delete(f"{API}/conversations/{conversation['id']}")
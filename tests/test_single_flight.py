@@ -0,0 +1,167 @@
+import asyncio
+
+import anthropic
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.core.metrics import metrics
+from app.db.base import AsyncSessionLocal
+from app.services.ai_service import AIService
+from app.services.single_flight import (
+    LLMRequestService,
+    SingleFlight,
+    request_key,
+    shared_call,
+)
+
+HISTORY = [{"message_type": "user", "content": "When should I visit Lisbon?"}]
+
+
+def params(content, **overrides):
+    return {
+        "model": "claude-test",
+        "max_tokens": 1024,
+        "messages": [{"role": "user", "content": content}],
+        **overrides,
+    }
+
+
+def test_request_key_ignores_whitespace_only():
+    key = request_key(params("When should I visit Lisbon?"))
+    assert key == request_key(params("  When should I  visit Lisbon?\n"))
+    assert key != request_key(params("When should I visit Porto?"))
+    assert key != request_key(params("When should I visit Lisbon?", max_tokens=10))
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_result():
+    metrics.reset()
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "Try May."
+
+    results = await asyncio.gather(*(flights.do("key", call) for _ in range(5)))
+
+    assert results == ["Try May."] * 5
+    assert len(calls) == 1
+    assert (
+        metrics.snapshot()["counters"]["ai.single_flight.coalesced{scope=process}"] == 4
+    )
+    assert not flights.flights
+
+
+@pytest.mark.asyncio
+async def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(
+        flights.do("key", fail), flights.do("key", fail), return_exceptions=True
+    )
+    assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+    async def succeed():
+        return "ok"
+
+    assert await flights.do("key", succeed) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_one_waiter_cancelling_does_not_cancel_the_call():
+    flights = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flights.do("key", call))
+    second = asyncio.create_task(flights.do("key", call))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_ai_service_sends_identical_prompts_upstream_once():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        await asyncio.sleep(0.05)
+        return httpx.Response(
+            200,
+            json={
+                "id": "msg_test",
+                "type": "message",
+                "role": "assistant",
+                "model": "claude-3-opus-20240229",
+                "content": [{"type": "text", "text": "Try May or June."}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 5},
+            },
+        )
+
+    ai_service = AIService(
+        anthropic_client=anthropic.AsyncAnthropic(
+            api_key="test",
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        )
+    )
+
+    replies = await asyncio.gather(
+        *(ai_service.generate_response(HISTORY) for _ in range(4))
+    )
+
+    assert replies == ["Try May or June."] * 4
+    assert len(requests) == 1
+    await ai_service.close()
+
+
+@pytest_asyncio.fixture
+async def llm_requests(database):
+    """A request key in the llm_requests table, released afterwards."""
+    key = request_key(params(f"single flight test {id(object())}"))
+    try:
+        yield key
+    finally:
+        async with AsyncSessionLocal() as session:
+            await LLMRequestService(session).release(key)
+
+
+@pytest.mark.asyncio
+async def test_shared_mode_coalesces_only_calls_in_flight(llm_requests):
+    key = llm_requests
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return f"Reply {len(calls)}"
+
+    results = await asyncio.gather(
+        *(shared_call(key, call, ttl=60, poll_interval=0.02) for _ in range(2))
+    )
+    # The caller that lost the claim polled for the winner's response
+    assert results == ["Reply 1", "Reply 1"]
+    assert len(calls) == 1
+
+    # A later identical request is not served the finished response
+    assert await shared_call(key, call, ttl=60, poll_interval=0.02) == "Reply 2"
+
+    # Finished responses are only kept for the grace period
+    async with AsyncSessionLocal() as session:
+        service = LLMRequestService(session)
+        await service.evict_expired(60, grace=0)
+        assert await service.get(key, 60) is None
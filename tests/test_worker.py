@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from app import worker as worker_module
+from app.core.config import settings
+from app.models.job import Job, JobType
+from tests.conftest import FakeSession
+
+
+class FakeJobService:
+    calls = []
+    due_in = None
+
+    def __init__(self, db):
+        self.db = db
+
+    async def complete(self, job_id):
+        self.calls.append(("complete", job_id))
+
+    async def fail(self, job, error):
+        self.calls.append(("fail", job.id, error))
+
+    async def next_due_in(self):
+        return self.due_in
+
+    async def heartbeat(self, job_id, worker_id):
+        self.calls.append(("heartbeat", job_id))
+        return True
+
+
+@pytest.fixture
+def fake_queue(monkeypatch):
+    FakeJobService.calls = []
+    FakeJobService.due_in = None
+    monkeypatch.setattr(worker_module, "JobService", FakeJobService)
+    monkeypatch.setattr(worker_module, "AsyncSessionLocal", FakeSession)
+    return FakeJobService.calls
+
+
+def make_job():
+    return Job(id=7, job_type=JobType.AI_RESPONSE, attempts=1, max_attempts=3)
+
+
+@pytest.mark.asyncio
+async def test_run_job_marks_success(fake_queue, monkeypatch):
+    async def handler(session, job):
+        pass
+
+    monkeypatch.setitem(worker_module.JOB_HANDLERS, JobType.AI_RESPONSE, handler)
+    await worker_module.Worker(concurrency=1)._run_job(make_job())
+
+    assert fake_queue == [("complete", 7)]
+
+
+@pytest.mark.asyncio
+async def test_run_job_records_failure_for_retry(fake_queue, monkeypatch):
+    async def handler(session, job):
+        raise RuntimeError("upstream down")
+
+    monkeypatch.setitem(worker_module.JOB_HANDLERS, JobType.AI_RESPONSE, handler)
+    await worker_module.Worker(concurrency=1)._run_job(make_job())
+
+    assert fake_queue == [("fail", 7, "upstream down")]
+
+
+@pytest.mark.asyncio
+async def test_slow_job_heartbeats_until_it_finishes(fake_queue, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT_INTERVAL", 0.01)
+
+    async def handler(session, job):
+        await asyncio.sleep(0.05)
+
+    monkeypatch.setitem(worker_module.JOB_HANDLERS, JobType.AI_RESPONSE, handler)
+    await worker_module.Worker(concurrency=1)._run_job(make_job())
+    await asyncio.sleep(0.03)
+
+    assert ("heartbeat", 7) in fake_queue
+    # No heartbeat after the job is done
+    assert fake_queue[-1] == ("complete", 7)
+
+
+@pytest.mark.asyncio
+async def test_final_attempt_falls_back_to_apology(monkeypatch):
+    seen = {}
+
+    class FakeReplyService:
+        def __init__(self, db, ai_service):
+            pass
+
+        async def generate_reply(self, conversation_id, fallback_on_error):
+            seen[conversation_id] = fallback_on_error
+
+    monkeypatch.setattr(worker_module, "ReplyService", FakeReplyService)
+    monkeypatch.setattr(worker_module, "get_ai_service", lambda: None)
+
+    await worker_module.handle_ai_response(
+        None, Job(conversation_id=1, attempts=1, max_attempts=3)
+    )
+    await worker_module.handle_ai_response(
+        None, Job(conversation_id=2, attempts=3, max_attempts=3)
+    )
+
+    assert seen == {1: False, 2: True}
+
+
+@pytest.mark.asyncio
+async def test_wait_wakes_up_when_debounced_job_is_due(fake_queue, monkeypatch):
+    FakeJobService.due_in = 0.01
+    worker = worker_module.Worker(poll_interval=30)
+    await asyncio.wait_for(worker._wait_for_work(), timeout=1)